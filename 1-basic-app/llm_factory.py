@@ -0,0 +1,97 @@
+"""
+Single place to build chat model clients.
+
+Every ChatOpenAI made here shares one pooled httpx.Client and one
+httpx.AsyncClient per process. Graphs, Streamlit sessions and the eval grader
+therefore reuse keep-alive connections to the provider instead of each model
+opening its own. Pool settings come from the environment:
+
+    LLM_MAX_CONNECTIONS     (default 64)
+    LLM_MAX_KEEPALIVE       (default 32)
+    LLM_KEEPALIVE_EXPIRY_S  (default 60)
+    LLM_CONNECT_TIMEOUT_S   (default 5)
+    LLM_READ_TIMEOUT_S      (default 60)
+    LLM_HTTP2               (default 1; used only when the h2 package is installed)
+
+The async client belongs to the first event loop that uses it, so async
+callers should share one event loop (as the Discord bot and benchmarks do)
+and close it with aclose_http_clients() on that loop.
+"""
+import importlib.util
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def http_settings() -> Dict[str, Any]:
+    read_s = float(os.getenv("LLM_READ_TIMEOUT_S", "60"))
+    return {
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "64")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "32")),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", "60")),
+        ),
+        "timeout": httpx.Timeout(read_s, connect=float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))),
+        "http2": os.getenv("LLM_HTTP2", "1") != "0" and http2_available(),
+    }
+
+
+_lock = threading.Lock()
+_clients: Dict[str, Any] = {}
+
+
+def shared_http_client() -> httpx.Client:
+    with _lock:
+        if "sync" not in _clients:
+            _clients["sync"] = httpx.Client(**http_settings())
+        return _clients["sync"]
+
+
+def shared_async_http_client() -> httpx.AsyncClient:
+    with _lock:
+        if "async" not in _clients:
+            _clients["async"] = httpx.AsyncClient(**http_settings())
+        return _clients["async"]
+
+
+def make_chat_model(model: str = "gpt-4o-mini",
+                    temperature: float = 0.7,
+                    api_key: Optional[str] = None,
+                    **kwargs: Any) -> ChatOpenAI:
+    """ChatOpenAI wired to the shared connection pool. OPENAI_BASE_URL is honored as usual."""
+    kwargs.setdefault("timeout", http_settings()["timeout"])
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        openai_api_key=api_key or os.getenv("OPENAI_API_KEY"),
+        http_client=shared_http_client(),
+        http_async_client=shared_async_http_client(),
+        **kwargs,
+    )
+
+
+def close_http_clients() -> None:
+    """For sync programs; drops the async pool without awaiting it."""
+    with _lock:
+        client = _clients.pop("sync", None)
+        _clients.pop("async", None)
+    if client is not None:
+        client.close()
+
+
+async def aclose_http_clients() -> None:
+    """For async programs, on the loop that used the async pool."""
+    with _lock:
+        client = _clients.pop("sync", None)
+        aclient = _clients.pop("async", None)
+    if client is not None:
+        client.close()
+    if aclient is not None:
+        await aclient.aclose()
@@ -5,10 +5,11 @@ Quick start script for the Grad Director AI Chatbot
 
 import streamlit as st
 import os
+import uuid
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_core.chat_history import InMemoryChatMessageHistory
+from llm_factory import make_chat_model
+from langchain_core.messages import HumanMessage, SystemMessage
+from transcript import ASSISTANT, USER, render_transcript, store_from_env
 
 # Load environment variables
 load_dotenv()
@@ -22,15 +23,18 @@ st.set_page_config(
 
 def initialize_session_state():
     """Initialize session state variables"""
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-    
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = InMemoryChatMessageHistory()
+    if "session_id" not in st.session_state:
+        # Keys this session's transcript
+        st.session_state.session_id = uuid.uuid4().hex[:8]
 
 # Initialize session state
 initialize_session_state()
 
+@st.cache_resource
+def get_transcripts():
+    """Compact per-session transcripts for this process; idle sessions are evicted"""
+    return store_from_env()
+
 # Initialize LangChain components
 @st.cache_resource
 def get_llm():
@@ -41,11 +45,8 @@ def get_llm():
         st.info("Please create a .env file in the project root with: OPENAI_API_KEY=your_api_key_here")
         st.stop()
     
-    return ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0.7,
-        openai_api_key=api_key
-    )
+    # Shared keep-alive connection pool; see llm_factory.py
+    return make_chat_model(model="gpt-4o-mini", temperature=0.7, api_key=api_key)
 
 # Main app interface
 def main():
@@ -69,8 +70,8 @@ def main():
     col1, col2 = st.columns([1, 4])
     with col1:
         if st.button("🗑️ Clear Chat"):
-            st.session_state.messages = []
-            st.session_state.chat_history = InMemoryChatMessageHistory()
+            get_transcripts().get(st.session_state.session_id).clear()
+            st.session_state.transcript_pages = 1
             st.rerun()
     
     with col2:
@@ -79,20 +80,18 @@ def main():
     st.markdown("---")
     
     # Main chat area
+    transcript = get_transcripts().get(st.session_state.session_id)
     chat_container = st.container()
     
     with chat_container:
-        # Display chat messages
-        if "messages" in st.session_state:
-            for message in st.session_state.messages:
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
+        # Display the most recent chat messages; older ones load a page at a time
+        render_transcript(st, transcript)
         
         # Chat input
         if user_response := st.chat_input("What would you like to know?"):
-            # Add user message to chat history
-            st.session_state.messages.append({"role": "user", "content": user_response})
-            st.session_state.chat_history.add_message(HumanMessage(content=user_response))
+            # History before this question, then add it to the transcript
+            history = transcript.messages()
+            transcript.append(USER, user_response)
             
             # Display user message
             with st.chat_message("user"):
@@ -113,15 +112,14 @@ def main():
                         system_message = SystemMessage(content="You are a helpful grad director chatbot. You help students with questions about graduate programs, admissions, requirements, and academic guidance.")
                         
                         # Get response from LLM with system message and chat history
-                        messages = [system_message] + st.session_state.chat_history.messages + [HumanMessage(content=user_response)]
+                        messages = [system_message] + history + [HumanMessage(content=user_response)]
                         response = llm.invoke(messages)
                         
                         # Display AI response
                         st.markdown(response.content)
                         
-                        # Add AI message to chat history
-                        st.session_state.messages.append({"role": "assistant", "content": response.content})
-                        st.session_state.chat_history.add_message(AIMessage(content=response.content))
+                        # Add AI message to the transcript
+                        transcript.append(ASSISTANT, response.content)
                         
                     except Exception as e:
                         st.error(f"❌ Error: {str(e)}")
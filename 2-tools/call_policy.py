@@ -0,0 +1,535 @@
+"""
+Tail-latency controls for model, web search and MCP calls.
+
+- turn_deadline(seconds) sets an overall deadline for one chat turn; every
+  policy-guarded call inside it gets at most the remaining time.
+- CallPolicy runs a call with a per-attempt timeout and bounded retries with
+  jittered exponential backoff. With hedge=True, once it has seen enough
+  calls it starts one duplicate request when an attempt runs past the
+  observed p95 latency, and takes whichever finishes first.
+- give_up_on(*errors) stops every policy inside the block from retrying
+  those errors, for callers that shed instead of waiting (the Discord bot
+  answers a 429 with a busy reply).
+- CircuitBreaker opens after consecutive failures so callers can degrade
+  (e.g. answer without web search) instead of waiting on a failing service.
+
+Sync attempts run on a small thread pool so they can be timed out; an
+abandoned attempt finishes in the background and its result is dropped.
+Policies and breakers are process-wide, configured from the environment:
+
+    TURN_DEADLINE_S                   (default 90; 0 disables)
+    POLICY_<NAME>_ATTEMPT_TIMEOUT_S   per-attempt timeout
+    POLICY_<NAME>_RETRIES             retries after the first attempt
+    POLICY_<NAME>_HEDGE               1 to enable hedging (off by default)
+    BREAKER_<NAME>_FAILURES           consecutive failures before opening
+    BREAKER_<NAME>_RESET_S            seconds open before a trial call
+"""
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple, Type
+
+import openai
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import BaseTool
+
+
+class DeadlineExceeded(TimeoutError):
+    """The turn ran out of time; no further attempts are made."""
+
+
+class AttemptTimeout(TimeoutError):
+    """One attempt ran past its per-attempt timeout."""
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("turn_deadline", default=None)
+
+
+@contextmanager
+def turn_deadline(seconds: Optional[float] = None) -> Iterator[None]:
+    """Deadline for everything called inside the block; None reads TURN_DEADLINE_S."""
+    if seconds is None:
+        seconds = float(os.getenv("TURN_DEADLINE_S", "90"))
+    if seconds <= 0:
+        yield
+        return
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+_give_up: contextvars.ContextVar[Tuple[Type[BaseException], ...]] = contextvars.ContextVar("give_up", default=())
+
+
+@contextmanager
+def give_up_on(*errors: Type[BaseException]) -> Iterator[None]:
+    """errors are not retried by any policy inside the block, on top of each policy's own give_up."""
+    token = _give_up.set(_give_up.get() + errors)
+    try:
+        yield
+    finally:
+        _give_up.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current turn, or None without a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def clamp_timeout(timeout: Optional[float]) -> Optional[float]:
+    """timeout limited to the turn deadline; raises DeadlineExceeded when none is left."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("turn deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures -> half_open after `reset_after_s`."""
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_after_s: float = 60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self.counters: Counter = Counter()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """True if a call may go out; half_open lets one trial call through."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                self.counters["closed"] += 1
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.counters["opened"] += 1
+            self._trial = False
+
+    def release_trial(self) -> None:
+        """End a trial call that neither succeeded nor failed (deadline, cancellation)."""
+        with self._lock:
+            if self._trial:
+                self._trial = False
+                self.counters["trials_abandoned"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, **self.counters}
+
+
+_attempt_pool = ThreadPoolExecutor(max_workers=int(os.getenv("POLICY_THREADS", "32")),
+                                   thread_name_prefix="call-policy")
+
+
+class CallPolicy:
+    """
+    give_up: exception types that are never retried (e.g. a bad request;
+    callers can add more with give_up_on). is_failure(result) marks results
+    that should be retried like errors, for tools that report failures as
+    return values; the last such result is returned if retries run out.
+    """
+
+    def __init__(self,
+                 name: str,
+                 attempt_timeout_s: float = 30.0,
+                 retries: int = 1,
+                 backoff_base_s: float = 0.25,
+                 backoff_max_s: float = 4.0,
+                 hedge: bool = False,
+                 hedge_min_samples: int = 20,
+                 give_up: Tuple[Type[BaseException], ...] = (),
+                 is_failure: Optional[Callable[[Any], bool]] = None):
+        self.name = name
+        self.attempt_timeout_s = attempt_timeout_s
+        self.retries = retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.give_up = give_up
+        self.is_failure = is_failure
+        self.latencies: deque = deque(maxlen=256)
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 of recent successful attempts, once there are enough of them."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def _backoff(self, attempt: int) -> float:
+        delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt))
+        left = remaining()
+        return delay if left is None else max(0.0, min(delay, left))
+
+    def _succeeded(self, started: float) -> None:
+        with self._lock:
+            self.latencies.append(time.monotonic() - started)
+            self.counters["ok"] += 1
+
+    def _failed(self, error: BaseException) -> None:
+        self._count("timeouts" if isinstance(error, AttemptTimeout) else "errors")
+
+    # --- sync --------------------------------------------------------------
+
+    def _attempt(self, fn: Callable[[], Any], timeout: float) -> Any:
+        started = time.monotonic()
+        futures = [_attempt_pool.submit(contextvars.copy_context().run, fn)]
+        delay = self.hedge_delay()
+        if delay is not None and delay < timeout:
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                self._count("hedges")
+                futures.append(_attempt_pool.submit(contextvars.copy_context().run, fn))
+        pending, error = set(futures), None
+        while pending:
+            left = timeout - (time.monotonic() - started)
+            done, pending = wait(pending, timeout=max(0.0, left), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for f in done:
+                if f.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if len(futures) > 1 and f is futures[1]:
+                        self._count("hedge_wins")
+                    return f.result()
+                error = f.exception()
+        if pending or error is None:
+            raise AttemptTimeout(f"{self.name} attempt exceeded {timeout:.1f}s")
+        raise error
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        last_error: Optional[BaseException] = None
+        bad_result: Any = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(self._backoff(attempt - 1))
+            timeout = clamp_timeout(self.attempt_timeout_s)
+            started = time.monotonic()
+            try:
+                result = self._attempt(fn, timeout)
+            except self.give_up + _give_up.get() + (DeadlineExceeded,):
+                raise
+            except Exception as e:
+                self._failed(e)
+                last_error = e
+                continue
+            if self.is_failure is not None and self.is_failure(result):
+                self._count("bad_results")
+                bad_result, last_error = result, None
+                continue
+            self._succeeded(started)
+            return result
+        if last_error is None:
+            return bad_result
+        raise last_error
+
+    # --- async -------------------------------------------------------------
+
+    async def _aattempt(self, fn: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(fn())]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None and delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self._count("hedges")
+                    tasks.append(asyncio.ensure_future(fn()))
+            pending, error = set(tasks), None
+            while pending:
+                left = timeout - (time.monotonic() - started)
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, left),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for t in done:
+                    if t.exception() is None:
+                        if len(tasks) > 1 and t is tasks[1]:
+                            self._count("hedge_wins")
+                        return t.result()
+                    error = t.exception()
+            if pending or error is None:
+                raise AttemptTimeout(f"{self.name} attempt exceeded {timeout:.1f}s")
+            raise error
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        last_error: Optional[BaseException] = None
+        bad_result: Any = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retries")
+                await asyncio.sleep(self._backoff(attempt - 1))
+            timeout = clamp_timeout(self.attempt_timeout_s)
+            started = time.monotonic()
+            try:
+                result = await self._aattempt(fn, timeout)
+            except self.give_up + _give_up.get() + (DeadlineExceeded,):
+                raise
+            except Exception as e:
+                self._failed(e)
+                last_error = e
+                continue
+            if self.is_failure is not None and self.is_failure(result):
+                self._count("bad_results")
+                bad_result, last_error = result, None
+                continue
+            self._succeeded(started)
+            return result
+        if last_error is None:
+            return bad_result
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self.counters)
+        delay = self.hedge_delay()
+        out["hedge_delay_ms"] = None if delay is None else round(delay * 1000, 1)
+        return out
+
+
+# --- process-wide policies --------------------------------------------------
+
+POLICY_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    # Model clients run without SDK retries, so this also covers 429s
+    "llm": {"attempt_timeout_s": 45.0, "retries": 2, "backoff_base_s": 1.0, "hedge": False},
+    # Hedging duplicates a paid Tavily request; POLICY_SEARCH_HEDGE=1 turns it on
+    "search": {"attempt_timeout_s": 10.0, "retries": 1, "hedge": False},
+    # MCPClient already replays idempotent calls after reconnecting
+    "mcp": {"attempt_timeout_s": 30.0, "retries": 0, "hedge": False},
+}
+BREAKER_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "search": {"failure_threshold": 3, "reset_after_s": 60.0},
+}
+
+_registry_lock = threading.Lock()
+_policies: Dict[str, CallPolicy] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_policy(name: str, **kwargs: Any) -> CallPolicy:
+    """Shared policy for name; kwargs (e.g. give_up) apply on first creation only."""
+    with _registry_lock:
+        if name not in _policies:
+            d = POLICY_DEFAULTS.get(name, {})
+            env = f"POLICY_{name.upper()}_"
+            _policies[name] = CallPolicy(
+                name,
+                attempt_timeout_s=float(os.getenv(env + "ATTEMPT_TIMEOUT_S", d.get("attempt_timeout_s", 30.0))),
+                retries=int(os.getenv(env + "RETRIES", d.get("retries", 1))),
+                backoff_base_s=d.get("backoff_base_s", 0.25),
+                hedge=os.getenv(env + "HEDGE", "1" if d.get("hedge") else "0") == "1",
+                **kwargs,
+            )
+        return _policies[name]
+
+
+# Provider errors that another attempt will not fix. 429s are retried with
+# backoff; the Discord bot sheds them instead via give_up_on(openai.RateLimitError)
+LLM_GIVE_UP = (
+    openai.BadRequestError,
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.NotFoundError,
+    openai.UnprocessableEntityError,
+)
+
+
+def model_policy() -> CallPolicy:
+    return get_policy("llm", give_up=LLM_GIVE_UP)
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _registry_lock:
+        if name not in _breakers:
+            d = BREAKER_DEFAULTS.get(name, {})
+            env = f"BREAKER_{name.upper()}_"
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv(env + "FAILURES", d.get("failure_threshold", 3))),
+                reset_after_s=float(os.getenv(env + "RESET_S", d.get("reset_after_s", 60.0))),
+            )
+        return _breakers[name]
+
+
+def policy_stats() -> Dict[str, Any]:
+    with _registry_lock:
+        policies, breakers = dict(_policies), dict(_breakers)
+    out: Dict[str, Any] = {name: p.stats() for name, p in policies.items()}
+    out.update({f"{name}_breaker": b.stats() for name, b in breakers.items()})
+    return out
+
+
+# --- wrappers ---------------------------------------------------------------
+
+def guarded_model(bound: Any, policy: CallPolicy, degraded: Any = None,
+                  breaker: Optional[CircuitBreaker] = None) -> RunnableLambda:
+    """
+    Runnable that calls bound (a model with tools bound) under policy. While
+    breaker is open, degraded (the model without the failing tool) is used
+    instead, so the model answers without offering that tool.
+    """
+
+    def pick() -> Any:
+        if degraded is not None and breaker is not None and breaker.state == "open":
+            return degraded
+        return bound
+
+    def invoke(messages: Any, config: Any = None) -> Any:
+        model = pick()
+        return policy.call(lambda: model.invoke(messages, config))
+
+    async def ainvoke(messages: Any, config: Any = None) -> Any:
+        model = pick()
+        return await policy.acall(lambda: model.ainvoke(messages, config))
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"guarded_{policy.name}")
+
+
+def guard_graph_model(llm: Any, tools: list, search_tool: Optional[BaseTool] = None) -> Any:
+    """
+    llm with tools bound, under the shared "llm" policy. If search_tool is
+    given, the model is offered no web search while the search breaker is open.
+    """
+    bound = llm.bind_tools(tools) if tools else llm
+    degraded, breaker = None, None
+    if search_tool is not None:
+        others = [t for t in tools if t is not search_tool]
+        degraded = llm.bind_tools(others) if others else llm
+        breaker = get_breaker("search")
+    return guarded_model(bound, model_policy(), degraded=degraded, breaker=breaker)
+
+
+def _search_failed(value: Any) -> bool:
+    # content_and_artifact search tools report errors as (repr(e), {})
+    return isinstance(value, tuple) and len(value) == 2 and not value[1]
+
+
+SEARCH_UNAVAILABLE = "Web search is temporarily unavailable. Answer from what you already know."
+
+
+class GuardedTool(BaseTool):
+    """Runs a tool under a CallPolicy and CircuitBreaker; same name, schema and response format."""
+
+    inner: BaseTool
+    policy: Any = None
+    breaker: Any = None
+
+    def __init__(self, inner: BaseTool, policy: CallPolicy, breaker: Optional[CircuitBreaker] = None,
+                 **kwargs: Any):
+        super().__init__(
+            inner=inner,
+            policy=policy,
+            breaker=breaker,
+            name=inner.name,
+            description=inner.description,
+            args_schema=inner.args_schema,
+            response_format=inner.response_format,
+            **kwargs,
+        )
+
+    def _unavailable(self) -> Any:
+        return (SEARCH_UNAVAILABLE, {}) if self.response_format == "content_and_artifact" else SEARCH_UNAVAILABLE
+
+    def _record(self, ok: bool) -> None:
+        if self.breaker is not None:
+            self.breaker.record_success() if ok else self.breaker.record_failure()
+
+    def _release(self) -> None:
+        # A half-open trial cut short by the deadline or a cancel must not hold the breaker
+        if self.breaker is not None:
+            self.breaker.release_trial()
+
+    def _run(self, run_manager: Any = None, **kwargs: Any) -> Any:
+        if self.breaker is not None and not self.breaker.allow():
+            return self._unavailable()
+        try:
+            result = self.policy.call(lambda: self.inner._run(**kwargs))
+        except DeadlineExceeded:
+            self._release()
+            raise
+        except Exception:
+            self._record(False)
+            return self._unavailable()
+        except BaseException:
+            self._release()
+            raise
+        self._record(not _search_failed(result))
+        return result
+
+    async def _arun(self, run_manager: Any = None, **kwargs: Any) -> Any:
+        if self.breaker is not None and not self.breaker.allow():
+            return self._unavailable()
+        try:
+            result = await self.policy.acall(lambda: self.inner._arun(**kwargs))
+        except DeadlineExceeded:
+            self._release()
+            raise
+        except Exception:
+            self._record(False)
+            return self._unavailable()
+        except BaseException:
+            self._release()
+            raise
+        self._record(not _search_failed(result))
+        return result
+
+
+def guarded_search_tool(tool: Optional[BaseTool]) -> Optional[BaseTool]:
+    """Wrap a (cached) web search tool with the shared "search" policy and breaker."""
+    if tool is None:
+        return None
+    return GuardedTool(tool, get_policy("search", is_failure=_search_failed), get_breaker("search"))
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Headless capacity test for the Streamlit chat app (run.py in this folder).
+
+Runs --sessions simulated browser sessions through Streamlit's app-testing
+API (streamlit.testing.v1.AppTest), --concurrency at a time on threads in
+one process, the way one Streamlit server runs its sessions. Each session
+loads the page, then sends --turns scripted questions through the chat
+input, with --idle-reruns plain reruns (no input, as when a widget is
+clicked) after each turn.
+
+The model is FakeChatModel (--llm-latency-ms per call) and web search is
+FakeSearchTool (--tool-latency-ms); the course schedule tool reads the real
+spreadsheet. Everything the app caches with @st.cache_resource (graph,
+model, answer cache, transcripts) is shared by all sessions, as on a real
+server.
+
+Reports, in milliseconds unless noted:
+
+  first_run / turn_rerun / idle_rerun   script run latency percentiles
+  throughput_turns_per_s                completed turns over wall time
+  memory                                RSS growth per session after the
+                                        caches are warm (tracemalloc too
+                                        with --trace-memory)
+  models_built / model_calls            how often the cached model was
+                                        built, and model requests per turn
+  errors                                exceptions and st.error messages
+
+    python load_test_streamlit.py --sessions 40 --concurrency 8 --turns 4
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+QUESTIONS = [
+    "Who teaches CMSC 691?",
+    "When does CMSC 603 meet?",
+    "How many credits do I need to graduate with a master's degree?",
+    "Can I transfer graduate credits from another university?",
+    "What AI courses are available next semester?",
+    "Is there funding for PhD students?",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--app", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "run.py"))
+    p.add_argument("--sessions", type=int, default=20)
+    p.add_argument("--concurrency", type=int, default=8, help="sessions running at once")
+    p.add_argument("--turns", type=int, default=3)
+    p.add_argument("--idle-reruns", type=int, default=1, help="reruns without input after each turn")
+    p.add_argument("--llm-latency-ms", type=float, default=200.0)
+    p.add_argument("--tool-latency-ms", type=float, default=300.0)
+    p.add_argument("--answer-cache", action="store_true", help="keep the answer cache on (off by default)")
+    p.add_argument("--trace-memory", action="store_true", help="also measure with tracemalloc (slower)")
+    p.add_argument("--timeout-s", type=float, default=120.0, help="per script run")
+    p.add_argument("--out", help="write the JSON report here as well")
+    return p.parse_args()
+
+
+def configure_env(args: argparse.Namespace) -> None:
+    # Must happen before the app's modules are imported
+    app_dir = os.path.dirname(os.path.abspath(args.app))
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key-for-load-test")
+    os.environ["TAVILY_API_KEY"] = "fake-key-for-load-test"  # enables search, served by FakeSearchTool
+    os.environ.setdefault("TRACE_EXPORTER", "none")
+    if not args.answer_cache:
+        # Each repeated question would otherwise be answered from the cache
+        os.environ["ANSWER_CACHE_THRESHOLD"] = "2"
+
+
+def install_fakes(args: argparse.Namespace, counts: Counter) -> None:
+    """Route the app's model and search construction to the fakes."""
+    import langchain_community.tools.tavily_search as tavily_search
+    import llm_factory
+    from fake_llm import FakeChatModel, FakeSearchTool
+
+    lock = threading.Lock()
+
+    class CountingChatModel(FakeChatModel):
+        def _generate(self, *a, **kw):
+            with lock:
+                counts["model_calls"] += 1
+            return super()._generate(*a, **kw)
+
+        async def _agenerate(self, *a, **kw):
+            with lock:
+                counts["model_calls"] += 1
+            return await super()._agenerate(*a, **kw)
+
+    class Search(FakeSearchTool):
+        latency_s: float = args.tool_latency_ms / 1000.0
+
+    def make_chat_model(*a: Any, **kw: Any) -> FakeChatModel:
+        with lock:
+            counts["models_built"] += 1
+        return CountingChatModel(latency_s=args.llm_latency_ms / 1000.0)
+
+    llm_factory.make_chat_model = make_chat_model
+    tavily_search.TavilySearchResults = Search
+
+
+def share_runtime() -> None:
+    """
+    Let AppTest sessions run side by side, as sessions of one server do.
+
+    Each AppTest run installs a mock Runtime singleton and removes it when it
+    finishes, which would pull it from under sessions still running; the
+    last one installed stays available instead. The script is also compiled
+    once for all sessions, as the Streamlit server does: each AppTest would
+    compile its own copy, and concurrent compiles are not thread-safe on
+    some Python versions.
+    """
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    last: Dict[str, Any] = {}
+
+    def instance(cls: Any) -> Any:
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+            return cls._instance
+        if "runtime" in last:
+            return last["runtime"]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    def exists(cls: Any) -> bool:
+        return cls._instance is not None or "runtime" in last
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+
+    compile_one = ScriptCache.get_bytecode
+    compiled: Dict[str, Any] = {}
+    lock = threading.Lock()
+
+    def get_bytecode(self: Any, script_path: str) -> Any:
+        with lock:
+            if script_path not in compiled:
+                compiled[script_path] = compile_one(self, script_path)
+            return compiled[script_path]
+
+    ScriptCache.get_bytecode = get_bytecode
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_session(idx: int, args: argparse.Namespace, rec: Dict[str, Any], lock: threading.Lock) -> Any:
+    from streamlit.testing.v1 import AppTest
+
+    def timed(at: Any, kind: str) -> Any:
+        t0 = time.perf_counter()
+        at.run(timeout=args.timeout_s)
+        took = time.perf_counter() - t0
+        errors = [str(e.value)[:80] for e in at.exception] + [str(e.value)[:80] for e in at.error]
+        with lock:
+            rec[kind].append(took)
+            for e in errors:
+                rec["errors"][e] += 1
+        return at
+
+    at = timed(AppTest.from_file(args.app, default_timeout=args.timeout_s), "first_run")
+    for turn in range(args.turns):
+        if not at.chat_input:
+            with lock:
+                rec["errors"]["page did not render a chat input"] += 1
+            break
+        question = QUESTIONS[(idx + turn) % len(QUESTIONS)]
+        at.chat_input[0].set_value(question)
+        timed(at, "turn_rerun")
+        with lock:
+            rec["turns"] += 1
+        for _ in range(args.idle_reruns):
+            timed(at, "idle_rerun")
+    return at
+
+
+def main() -> None:
+    args = parse_args()
+    configure_env(args)
+    counts: Counter = Counter()
+    install_fakes(args, counts)
+    share_runtime()
+    from metrics import summarize
+
+    rec: Dict[str, Any] = {"first_run": [], "turn_rerun": [], "idle_rerun": [], "turns": 0, "errors": Counter()}
+    lock = threading.Lock()
+
+    # One session first so @st.cache_resource values exist before memory is measured
+    run_session(0, args, {"first_run": [], "turn_rerun": [], "idle_rerun": [], "turns": 0, "errors": Counter()},
+                lock)
+    warm_builds = counts["models_built"]
+    counts["model_calls"] = 0
+    rss_warm = rss_bytes()
+    if args.trace_memory:
+        tracemalloc.start()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        # The finished sessions stay referenced, as open browser tabs would
+        sessions: List[Any] = list(pool.map(lambda i: run_session(i, args, rec, lock), range(1, args.sessions + 1)))
+    wall = time.perf_counter() - t0
+
+    rss_end = rss_bytes()
+    memory = {
+        "rss_warm_mb": round(rss_warm / 2 ** 20, 1),
+        "rss_end_mb": round(rss_end / 2 ** 20, 1),
+        "rss_per_session_kb": round((rss_end - rss_warm) / 1024 / max(len(sessions), 1), 1),
+    }
+    if args.trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory["traced_per_session_kb"] = round(current / 1024 / max(len(sessions), 1), 1)
+        memory["traced_peak_mb"] = round(peak / 2 ** 20, 1)
+
+    report = {
+        "config": vars(args),
+        "sessions": len(sessions),
+        "turns": rec["turns"],
+        "wall_s": round(wall, 3),
+        "throughput_turns_per_s": round(rec["turns"] / wall, 3) if wall else 0.0,
+        "first_run": summarize(rec["first_run"]),
+        "turn_rerun": summarize(rec["turn_rerun"]),
+        "idle_rerun": summarize(rec["idle_rerun"]),
+        "memory": memory,
+        # Stays at the warm-up value if @st.cache_resource shares the model across sessions
+        "models_built": {"warmup": warm_builds, "total": counts["models_built"]},
+        "model_calls_per_turn": round(counts["model_calls"] / rec["turns"], 2) if rec["turns"] else 0.0,
+        "errors": dict(rec["errors"]),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
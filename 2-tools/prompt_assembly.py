@@ -0,0 +1,95 @@
+"""
+Stable prompt prefixes.
+
+Provider prompt caching only applies when a request starts with exactly
+the same bytes as an earlier one: the tool schemas, then the system
+prompt, then the conversation so far. Each turn's model input is built
+here, in one canonical way:
+
+- one shared SystemMessage with REACT_SYSTEM_PROMPT, built once;
+- history reduced to plain human/assistant messages with normalized
+  content (no ids, metadata or stray system messages), in order;
+- the new question appended once, even if the caller already added it to
+  the history;
+- tools bound in name order, so the schema block does not depend on which
+  tools were found or the order they were registered in.
+
+message_digests gives a per-message fingerprint; prompt_profile uses it to
+count requests whose prefix did not extend the previous one.
+"""
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from prompt import REACT_SYSTEM_PROMPT
+
+SYSTEM_MESSAGE = SystemMessage(content=REACT_SYSTEM_PROMPT)
+
+_schema_digests: Dict[Tuple[str, ...], str] = {}
+
+
+def _clean(content: Any) -> str:
+    text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return text.replace("\r\n", "\n").strip()
+
+
+def canonical_history(history: Iterable[BaseMessage]) -> List[BaseMessage]:
+    """Human and assistant turns only, rebuilt from their text."""
+    out: List[BaseMessage] = []
+    for m in history:
+        if isinstance(m, HumanMessage):
+            out.append(HumanMessage(content=_clean(m.content)))
+        elif isinstance(m, AIMessage) and not m.tool_calls and _clean(m.content):
+            out.append(AIMessage(content=_clean(m.content)))
+    return out
+
+
+def assemble_messages(history: Iterable[BaseMessage], question: Optional[str] = None) -> List[BaseMessage]:
+    """
+    Model input for one turn: the shared system message, the canonical
+    history, then question unless the history already ends with it.
+    """
+    messages = [SYSTEM_MESSAGE] + canonical_history(history)
+    if question is not None:
+        text = _clean(question)
+        last = messages[-1]
+        if not (isinstance(last, HumanMessage) and last.content == text):
+            messages.append(HumanMessage(content=text))
+    return messages
+
+
+def stable_tools(tools: Iterable[Any]) -> List[Any]:
+    """Tools in name order, so the bound schema block is byte-identical across builds."""
+    return sorted(tools, key=lambda t: t.name)
+
+
+def _digest(payload: Any) -> str:
+    text = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _role(m: BaseMessage) -> str:
+    if isinstance(m, ToolMessage):
+        return f"tool:{m.tool_call_id}"
+    return m.type
+
+
+def message_digests(messages: Iterable[BaseMessage], tools: Iterable[Any] = ()) -> Tuple[str, ...]:
+    """Fingerprint of a request: the tool schemas, then one digest per message."""
+    tools = list(tools)
+    names = tuple(t.name for t in tools)
+    if names not in _schema_digests:
+        _schema_digests[names] = _digest([convert_to_openai_tool(t) for t in tools])
+    parts = [_schema_digests[names]]
+    for m in messages:
+        calls = [{"name": c["name"], "args": c["args"]} for c in getattr(m, "tool_calls", None) or []]
+        parts.append(_digest([_role(m), m.content, calls]))
+    return tuple(parts)
+
+
+def extends(previous: Tuple[str, ...], current: Tuple[str, ...]) -> bool:
+    """True if current starts with previous (a cacheable prefix was kept)."""
+    return current[:len(previous)] == previous
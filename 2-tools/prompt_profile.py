@@ -0,0 +1,190 @@
+"""
+Prompt-size accounting per model request.
+
+profiled_model wraps the tool-bound model in the graph builders. Before
+each request it tokenizes the outgoing messages locally and splits the
+count into components:
+
+    system        system prompt (REACT_SYSTEM_PROMPT)
+    history       earlier turns of the conversation
+    question      the latest human message
+    tool_calls    the model's own tool calls earlier in this turn
+    tool_outputs  tool results in the prompt
+    tool_schemas  JSON schemas of the tools bound for this request
+    overhead      per-message framing tokens
+
+After the reply it adds the provider-reported usage: input, cached input
+and output tokens. It also checks that the request starts with the
+previous request's prefix (tool schemas, system prompt, conversation up to
+its question); otherwise the provider cache cannot help and the request
+counts as a prefix break. Results are kept per session (Streamlit session or
+Discord channel, from config["metadata"]["session"]) in PROFILES, so the
+sessions whose prompts are growing stand out.
+"""
+import json
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from model_router import FAST, tier_tools
+from prompt_assembly import extends, message_digests
+from tool_budget import count_tokens
+
+COMPONENTS = ("system", "history", "question", "tool_calls", "tool_outputs", "tool_schemas", "overhead")
+
+# Framing tokens per chat message, as in OpenAI's token counting guide
+TOKENS_PER_MESSAGE = 3
+
+_schema_tokens: Dict[str, int] = {}
+
+
+def tool_schema_tokens(tools: List[Any]) -> int:
+    total = 0
+    for t in tools:
+        if t.name not in _schema_tokens:
+            _schema_tokens[t.name] = count_tokens(json.dumps(convert_to_openai_tool(t)))
+        total += _schema_tokens[t.name]
+    return total
+
+
+def _text(m: Any) -> str:
+    content = m.content if isinstance(m.content, str) else json.dumps(m.content, default=str)
+    if isinstance(m, AIMessage) and m.tool_calls:
+        content += json.dumps([{"name": c["name"], "args": c["args"]} for c in m.tool_calls])
+    return content
+
+
+def prompt_breakdown(messages: List[Any], tools: List[Any]) -> Dict[str, int]:
+    """Local token count of one request, by component."""
+    parts = Counter({c: 0 for c in COMPONENTS})
+    last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+    for i, m in enumerate(messages):
+        if isinstance(m, SystemMessage):
+            part = "system"
+        elif isinstance(m, ToolMessage):
+            part = "tool_outputs"
+        elif i < last_human:
+            part = "history"
+        elif i == last_human:
+            part = "question"
+        else:
+            part = "tool_calls"
+        parts[part] += count_tokens(_text(m))
+    parts["tool_schemas"] = tool_schema_tokens(tools)
+    parts["overhead"] = TOKENS_PER_MESSAGE * (len(messages) + 1)
+    out = dict(parts)
+    out["total"] = sum(parts.values())
+    return out
+
+
+def provider_usage(result: Any) -> Dict[str, int]:
+    usage = getattr(result, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    return {
+        "input": int(usage.get("input_tokens") or 0),
+        "cached": int(details.get("cache_read") or 0),
+        "output": int(usage.get("output_tokens") or 0),
+    }
+
+
+class PromptProfiles:
+    """Per-session prompt totals and the latest request breakdown."""
+
+    def __init__(self, max_sessions: int = 1000):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def record(self, session: str, breakdown: Dict[str, int], usage: Dict[str, int],
+               prefix: Tuple[str, ...] = (), digests: Tuple[str, ...] = ()) -> None:
+        """prefix: this request's cacheable head; digests: the whole request (prompt_assembly)."""
+        with self._lock:
+            p = self._sessions.pop(session, None) or {
+                "requests": 0, "components": Counter(), "provider": Counter(), "max_prompt": 0,
+                "prefix_kept": 0, "prefix_breaks": 0, "prefix": None,
+            }
+            p["requests"] += 1
+            if p["prefix"] is not None and digests:
+                p["prefix_kept" if extends(p["prefix"], digests) else "prefix_breaks"] += 1
+            p["prefix"] = prefix or None
+            p["components"].update({k: v for k, v in breakdown.items() if k != "total"})
+            p["provider"].update(usage)
+            p["max_prompt"] = max(p["max_prompt"], breakdown["total"])
+            p["last"] = {**breakdown, "provider": usage}
+            self._sessions[session] = p
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def _view(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        total = sum(p["components"].values())
+        provider = dict(p["provider"])
+        return {
+            "requests": p["requests"],
+            "mean_prompt": round(total / p["requests"], 1),
+            "max_prompt": p["max_prompt"],
+            "components": dict(p["components"]),
+            "provider": provider,
+            "cached_ratio": round(provider.get("cached", 0) / provider["input"], 3) if provider.get("input") else 0.0,
+            "prefix_kept": p["prefix_kept"],
+            "prefix_breaks": p["prefix_breaks"],
+            "last": p["last"],
+        }
+
+    def session(self, session: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            p = self._sessions.get(session)
+            return self._view(p) if p else None
+
+    def top(self, n: int = 5) -> List[Dict[str, Any]]:
+        """Sessions with the largest mean prompt."""
+        with self._lock:
+            views = [{"session": s, **self._view(p)} for s, p in self._sessions.items()]
+        return sorted(views, key=lambda v: v["mean_prompt"], reverse=True)[:n]
+
+
+PROFILES = PromptProfiles()
+
+
+def session_of(config: Any) -> str:
+    return str(((config or {}).get("metadata") or {}).get("session") or "default")
+
+
+def profiled_model(bound: Any, tools: List[Any], profiles: PromptProfiles = PROFILES) -> Any:
+    """
+    bound is the tool-bound (possibly tier-routed) model; tools the full
+    tool list. Replies from the fast tier are counted with its tools only.
+    """
+
+    def record(messages: List[Any], config: Any, result: Any) -> None:
+        tier = getattr(result, "response_metadata", {}).get("model_tier")
+        offered = tier_tools(FAST, tools) if tier == FAST else tools
+        digests = message_digests(messages, offered)
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        profiles.record(session_of(config), prompt_breakdown(messages, offered), provider_usage(result),
+                        prefix=digests[:last_human + 2], digests=digests)
+
+    def invoke(messages: List[Any], config: Any = None) -> Any:
+        result = bound.invoke(messages, config)
+        record(messages, config, result)
+        return result
+
+    async def ainvoke(messages: List[Any], config: Any = None) -> Any:
+        result = await bound.ainvoke(messages, config)
+        record(messages, config, result)
+        return result
+
+    return RunnableLambda(invoke, afunc=ainvoke, name="prompt_profile")
+
+
+def format_profile(p: Dict[str, Any]) -> str:
+    """One log line for a session profile."""
+    last = p["last"]
+    parts = ", ".join(f"{c} {last[c]}" for c in COMPONENTS if last.get(c))
+    prov = p["provider"]
+    return (f"requests={p['requests']} last_prompt={last['total']} ({parts}) mean_prompt={p['mean_prompt']} "
+            f"provider_in={prov.get('input', 0)} cached={prov.get('cached', 0)} out={prov.get('output', 0)} "
+            f"prefix_breaks={p['prefix_breaks']}")
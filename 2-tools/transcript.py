@@ -0,0 +1,270 @@
+"""
+One compact transcript per chat session.
+
+The Streamlit apps used to keep each conversation twice, as display dicts in
+st.session_state.messages and as an InMemoryChatMessageHistory, and
+re-rendered every past message on each rerun. A Transcript is now the only
+copy:
+
+- each message is a slotted Turn (role, text, time);
+- beyond TRANSCRIPT_RAM_TURNS messages, the oldest are appended to a
+  per-session JSONL file under TRANSCRIPT_SPILL_DIR and read back by offset
+  when they are needed (model history, paging back);
+- the model sees only the last TRANSCRIPT_HISTORY_TURNS messages, which by
+  default are still in memory, so a turn never re-reads the spill file;
+- transcripts live in a process-wide TranscriptStore keyed by session id,
+  and sessions idle for TRANSCRIPT_TTL_S are dropped with their spill file.
+
+Spill files hold user conversations: the directory is created 0o700 and the
+files 0o600. Files are named <pid>-<session>.jsonl, and a new store removes
+the ones whose process is gone or that are older than the TTL, so a crashed
+or restarted app does not leave conversations behind.
+
+render_transcript shows only the latest TRANSCRIPT_WINDOW messages; earlier
+ones are loaded a page at a time on request, so rerun cost does not grow
+with the length of the conversation.
+
+    TRANSCRIPT_RAM_TURNS    messages kept in memory per session (default 40; 0 never spills)
+    TRANSCRIPT_SPILL_DIR    spill directory (default <tmp>/grad-director-transcripts-<uid>)
+    TRANSCRIPT_HISTORY_TURNS  messages sent to the model as history (default 20; 0 sends all)
+    TRANSCRIPT_TTL_S        idle seconds before a session is evicted (default 7200)
+    TRANSCRIPT_WINDOW       messages rendered per page (default 20)
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+USER = "user"
+ASSISTANT = "assistant"
+
+
+def _private_dir(path: str) -> None:
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    os.chmod(path, 0o700)  # makedirs leaves an existing directory's mode alone
+
+
+def _private_opener(path: str, flags: int) -> int:
+    return os.open(path, flags, 0o600)
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True  # os.kill would terminate it; fall back to the TTL
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def history_turns() -> int:
+    return int(os.getenv("TRANSCRIPT_HISTORY_TURNS", "20"))
+
+
+class Turn:
+    __slots__ = ("role", "text", "ts")
+
+    def __init__(self, role: str, text: str, ts: float):
+        self.role = role
+        self.text = text
+        self.ts = ts
+
+    def to_message(self) -> BaseMessage:
+        return HumanMessage(content=self.text) if self.role == USER else AIMessage(content=self.text)
+
+
+class Transcript:
+    """Messages of one session; the oldest may be on disk."""
+
+    __slots__ = ("session_id", "ram_turns", "spill_path", "_recent", "_offsets", "last_used")
+
+    def __init__(self, session_id: str, ram_turns: int, spill_dir: str):
+        self.session_id = session_id
+        self.ram_turns = ram_turns
+        self.spill_path = os.path.join(spill_dir, f"{os.getpid()}-{session_id}.jsonl")
+        self._recent: List[Turn] = []
+        self._offsets = array("Q")  # file offset of each spilled turn
+        self.last_used = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._recent)
+
+    @property
+    def spilled(self) -> int:
+        return len(self._offsets)
+
+    def append(self, role: str, text: str) -> None:
+        self._recent.append(Turn(role, text, time.time()))
+        if self.ram_turns and len(self._recent) > self.ram_turns:
+            # Spill in batches of half the allowance, so most appends don't touch the disk
+            self._spill(len(self._recent) - self.ram_turns // 2)
+
+    def _spill(self, n: int) -> None:
+        _private_dir(os.path.dirname(self.spill_path))
+        with open(self.spill_path, "ab", opener=_private_opener) as f:
+            for t in self._recent[:n]:
+                self._offsets.append(f.tell())
+                f.write(json.dumps([t.role, t.text, t.ts], ensure_ascii=False).encode("utf-8") + b"\n")
+        del self._recent[:n]
+
+    def _read_spilled(self, start: int, stop: int) -> List[Turn]:
+        if start >= stop:
+            return []
+        out = []
+        with open(self.spill_path, "rb") as f:
+            f.seek(self._offsets[start])
+            for _ in range(stop - start):
+                out.append(Turn(*json.loads(f.readline())))
+        return out
+
+    def turns(self, start: int = 0, stop: Optional[int] = None) -> List[Turn]:
+        """Messages start..stop in order, from disk and memory as needed."""
+        n = len(self)
+        stop = n if stop is None else min(stop, n)
+        start = max(0, start)
+        spilled = len(self._offsets)
+        out = self._read_spilled(start, min(stop, spilled))
+        return out + self._recent[max(start - spilled, 0):max(stop - spilled, 0)]
+
+    def messages(self, last: Optional[int] = None) -> List[BaseMessage]:
+        """
+        Recent history for the model: at most `last` messages (default
+        TRANSCRIPT_HISTORY_TURNS; 0 for all), starting at a user message.
+        The window start moves in steps of last // 2, so the prompt prefix
+        stays the same between steps and provider caching keeps working.
+        """
+        last = history_turns() if last is None else last
+        n = len(self)
+        start = 0
+        if 0 < last < n:
+            step = max(1, last // 2)
+            start = ((n - last - 1) // step + 1) * step
+        turns = self.turns(start)
+        while turns and turns[0].role != USER:
+            turns = turns[1:]
+        return [t.to_message() for t in turns]
+
+    def clear(self) -> None:
+        self._recent = []
+        self._offsets = array("Q")
+        self.discard()
+
+    def discard(self) -> None:
+        try:
+            os.remove(self.spill_path)
+        except FileNotFoundError:
+            pass
+
+
+def _default_dir_name() -> str:
+    # Per user, so one account can't read or pre-create another's directory
+    uid = os.getuid() if hasattr(os, "getuid") else None
+    return "grad-director-transcripts" if uid is None else f"grad-director-transcripts-{uid}"
+
+
+class TranscriptStore:
+    """Transcripts by session id, evicting sessions idle for longer than ttl_s."""
+
+    def __init__(self, ram_turns: int = 40, spill_dir: Optional[str] = None, ttl_s: float = 7200.0):
+        self.ram_turns = ram_turns
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), _default_dir_name())
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Transcript] = {}
+        self._last_sweep = time.monotonic()
+        self.evicted = 0
+        _private_dir(self.spill_dir)
+        self._clear_stale()
+
+    def _clear_stale(self) -> None:
+        """Remove spill files of dead processes and ones idle past the TTL."""
+        cutoff = time.time() - self.ttl_s
+        removed = 0
+        for name in os.listdir(self.spill_dir):
+            if not name.endswith(".jsonl"):
+                continue
+            path = os.path.join(self.spill_dir, name)
+            pid = name.split("-", 1)[0]
+            try:
+                if not pid.isdigit() or not _pid_alive(int(pid)) or os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            print(f"[transcript] removed {removed} stale spill files from {self.spill_dir}", flush=True)
+
+    def get(self, session_id: str) -> Transcript:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep > min(self.ttl_s, 60.0):
+                self._sweep(now)
+            t = self._sessions.get(session_id)
+            if t is None:
+                t = self._sessions[session_id] = Transcript(session_id, self.ram_turns, self.spill_dir)
+            t.last_used = now
+            return t
+
+    def _sweep(self, now: float) -> None:
+        self._last_sweep = now
+        idle = [sid for sid, t in self._sessions.items() if now - t.last_used > self.ttl_s]
+        for sid in idle:
+            self._sessions.pop(sid).discard()
+        if idle:
+            self.evicted += len(idle)
+            print(f"[transcript] evicted {len(idle)} idle sessions", flush=True)
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            t = self._sessions.pop(session_id, None)
+        if t is not None:
+            t.discard()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": len(sessions),
+            "in_memory": sum(len(t) - t.spilled for t in sessions),
+            "spilled": sum(t.spilled for t in sessions),
+            "evicted": self.evicted,
+        }
+
+
+def store_from_env() -> TranscriptStore:
+    return TranscriptStore(
+        ram_turns=int(os.getenv("TRANSCRIPT_RAM_TURNS", "40")),
+        spill_dir=os.getenv("TRANSCRIPT_SPILL_DIR") or None,
+        ttl_s=float(os.getenv("TRANSCRIPT_TTL_S", "7200")),
+    )
+
+
+def window_size() -> int:
+    return int(os.getenv("TRANSCRIPT_WINDOW", "20"))
+
+
+def render_transcript(st: Any, transcript: Transcript, pages_key: str = "transcript_pages") -> None:
+    """
+    Render the latest window of messages; a button loads one more page of
+    earlier ones. Pages shown are kept in st.session_state[pages_key].
+    """
+    window = window_size()
+    pages = st.session_state.get(pages_key, 1)
+    start = max(0, len(transcript) - window * pages)
+    if start > 0 and st.button(f"Show earlier messages ({start} more)", key=f"{pages_key}_more"):
+        st.session_state[pages_key] = pages + 1
+        st.rerun()
+    if pages > 1 and st.button("Show only recent messages", key=f"{pages_key}_less"):
+        st.session_state[pages_key] = 1
+        st.rerun()
+    for turn in transcript.turns(start):
+        with st.chat_message(turn.role):
+            st.markdown(turn.text)
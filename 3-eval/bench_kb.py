@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark the local knowledge-base index (kb_index.py).
+
+Builds an index from the advisor Q&A spreadsheet (plus --docs pages and
+--synthetic filler chunks, to see how latency grows with corpus size) in a
+temporary directory, then reports:
+
+  build_ms / open_ms     ingestion and mmap open time
+  latency                per-query search time (p50/p95/p99)
+  hit_rate_at_1 / _at_k  share of queries whose own Q&A pair ranks first /
+                         in the top k
+  answered_rate          share of queries with a hit above KB_MIN_SCORE,
+                         i.e. turns that would not need a web search
+
+Queries are each spreadsheet question verbatim and as a keyword-only
+variant (every other content word), the way a model tends to phrase a
+tool query.
+
+    python bench_kb.py --synthetic 20000 --repeat 50
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from kb_index import KBIndex, build_index, doc_chunks, qa_chunks, tokenize
+from metrics import summarize
+
+
+def synthetic_chunks(n: int, seed: int = 7) -> List[Dict[str, str]]:
+    """Filler passages from a fixed vocabulary, so only corpus size changes."""
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(5000)] + [
+        "graduate", "credit", "course", "thesis", "funding", "deadline", "semester", "advisor", "program",
+        "requirement", "elective", "research", "assistantship", "registration", "transfer", "policy",
+    ]
+    return [{"source": f"synthetic#{i}", "title": f"Synthetic page {i}",
+             "text": " ".join(rng.choice(vocab) for _ in range(120))} for i in range(n)]
+
+
+def queries_for(qa: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    """(query, expected source) pairs."""
+    out = []
+    for chunk in qa:
+        question = chunk["text"].split("\nA: ", 1)[0][3:]
+        out.append((question, chunk["source"]))
+        keywords = [w for w in question.split() if tokenize(w)][::2]
+        if keywords:
+            out.append((" ".join(keywords), chunk["source"]))
+    return out
+
+
+def dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def bench(args) -> Dict:
+    qa = list(qa_chunks(args.qa))
+    chunks = list(qa)
+    if args.docs and os.path.isdir(args.docs):
+        chunks += doc_chunks(args.docs)
+    chunks += synthetic_chunks(args.synthetic)
+    queries = queries_for(qa)
+    min_score = float(os.getenv("KB_MIN_SCORE", "1.0"))
+
+    with tempfile.TemporaryDirectory() as out:
+        t0 = time.perf_counter()
+        built = build_index(chunks, out)
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index = KBIndex(out)
+        open_s = time.perf_counter() - t0
+
+        top1 = topk = answered = 0
+        for query, expected in queries:
+            hits = index.search(query, args.k)
+            sources = [h["source"] for h in hits]
+            top1 += bool(sources) and sources[0] == expected
+            topk += expected in sources
+            answered += bool(hits) and hits[0]["score"] >= min_score
+
+        samples = []
+        for _ in range(args.repeat):
+            for query, _ in queries:
+                t0 = time.perf_counter()
+                index.search(query, args.k)
+                samples.append(time.perf_counter() - t0)
+        size = dir_bytes(out)
+        index.close()
+
+    n = len(queries)
+    return {
+        "meta": {"chunks": built["docs"], "terms": built["terms"], "postings": built["postings"],
+                 "queries": n, "repeat": args.repeat, "k": args.k, "min_score": min_score},
+        "build_ms": round(1000 * build_s, 1),
+        "open_ms": round(1000 * open_s, 3),
+        "index_bytes": size,
+        "latency": summarize(samples),
+        "hit_rate_at_1": round(top1 / n, 3) if n else 0.0,
+        f"hit_rate_at_{args.k}": round(topk / n, 3) if n else 0.0,
+        "answered_rate": round(answered / n, 3) if n else 0.0,
+    }
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark the local BM25 knowledge base")
+    p.add_argument("--qa", default="GPD_chatbot_eval.xlsx")
+    p.add_argument("--docs", default="kb", help="directory of pages to index as well (optional)")
+    p.add_argument("--synthetic", type=int, default=0, help="extra filler chunks")
+    p.add_argument("--repeat", type=int, default=20, help="times each query is timed")
+    p.add_argument("-k", type=int, default=3)
+    p.add_argument("--out", default="", help="Write the JSON report here")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = bench(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compare end-to-end latency with and without the schedule fast-path router
+and speculative tool prefetch.
+
+Runs offline: FakeChatModel stands in for the OpenAI model (fixed latency
+per call, emits query_course_schedule calls for course codes), and the real
+schedule tool reads the spreadsheet. Reports latency percentiles and LLM
+calls per question for each graph, plus prefetch hit rate and saved time.
+
+    python bench_router.py --llm-latency-ms 600 --iterations 5
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-bench")
+os.environ.pop("TAVILY_API_KEY", None)
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from fake_llm import FakeChatModel
+from metrics import summarize
+from prefetch import STATS as PREFETCH_STATS
+from prompt import REACT_SYSTEM_PROMPT
+from router import parse_schedule_lookup
+from run import build_graph
+from tools import known_instructors
+
+QUESTIONS = [
+    "Who teaches CMSC 691?",
+    "When does CMSC 603 meet?",
+    "What classes does Damevski teach?",
+    "Where is CMSC 635 held?",
+    "Is CMSC 602 online?",
+    "Should I take CMSC 691 or CMSC 603?",
+    "What AI courses are available?",
+]
+
+
+class CountLLMCalls(BaseCallbackHandler):
+    def __init__(self):
+        self.calls = 0
+
+    def on_chat_model_start(self, *args, **kwargs):
+        self.calls += 1
+
+
+def run_case(graph, question: str) -> Dict[str, float]:
+    counter = CountLLMCalls()
+    t0 = time.perf_counter()
+    graph.invoke(
+        {"messages": [SystemMessage(content=REACT_SYSTEM_PROMPT), HumanMessage(content=question)]},
+        config={"callbacks": [counter]},
+    )
+    return {"latency_s": time.perf_counter() - t0, "llm_calls": counter.calls}
+
+
+def bench(args) -> Dict:
+    llm = FakeChatModel(latency_s=args.llm_latency_ms / 1000.0)
+    instructors = known_instructors()
+    report = {
+        "meta": {"llm_latency_ms": args.llm_latency_ms, "iterations": args.iterations},
+        "routed": {q: parse_schedule_lookup(q, instructors) for q in QUESTIONS},
+    }
+    cases = (("react", False, False), ("react_prefetch", False, True), ("fast_path", True, True))
+    for label, fast_path, prefetch in cases:
+        graph = build_graph(llm, fast_path=fast_path, prefetch=prefetch)
+        samples: List[float] = []
+        calls: List[int] = []
+        for _ in range(args.iterations):
+            for q in QUESTIONS:
+                r = run_case(graph, q)
+                samples.append(r["latency_s"])
+                calls.append(r["llm_calls"])
+        report[label] = {
+            "latency": summarize(samples),
+            "llm_calls_per_question": round(sum(calls) / len(calls), 2),
+        }
+    report["prefetch"] = PREFETCH_STATS.snapshot()
+    report["p50_saved_ms"] = round(report["react"]["latency"]["p50_ms"] - report["fast_path"]["latency"]["p50_ms"], 1)
+    return report
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark the schedule fast-path router")
+    p.add_argument("--llm-latency-ms", type=float, default=600.0)
+    p.add_argument("--iterations", type=int, default=3)
+    p.add_argument("--out", default="", help="Write the JSON report here")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = bench(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
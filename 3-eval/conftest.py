@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from eval_dataset import clear_shards, merge_shards
+from kb_index import get_kb_index, is_eval_dataset
+
+
+def _guard_kb_index() -> None:
+    # An index built from an eval dataset (before kb_index skipped them) would
+    # answer the evals' own questions; runs before test_evals builds the graph
+    index = get_kb_index()
+    if index is not None and any(is_eval_dataset(s) for s in index.meta.get("sources", [])):
+        print("[eval] the KB index contains an eval dataset; search_program_kb is off for this run", flush=True)
+        os.environ["KB_TOOL"] = "0"
+
+
+_guard_kb_index()
+
+
+EVALS_FILE = "test_evals.py"
+_evals_collected = False
+
+
+def _merges(config) -> bool:
+    # Under pytest-xdist only the controller merges; the built-in shard runner
+    # (eval_dataset.py run) sets EVAL_MERGE=0 and merges once all shards finish
+    return not hasattr(config, "workerinput") and os.getenv("EVAL_MERGE", "1") != "0"
+
+
+def _evals_start(config, nodeids) -> None:
+    # Shards are cleared and merged only by sessions that run evals, so running
+    # e.g. test_transcript.py alone leaves the last eval results in place
+    global _evals_collected
+    if _evals_collected or config.option.collectonly:
+        return
+    if not any(n.split("::")[0].endswith(EVALS_FILE) for n in nodeids):
+        return
+    _evals_collected = True
+    if _merges(config):
+        clear_shards()
+
+
+def pytest_collection_finish(session):
+    _evals_start(session.config, [item.nodeid for item in session.items])
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_node_collection_finished(node, ids):
+    # The xdist controller collects nothing itself; workers report their ids
+    _evals_start(node.config, ids)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if _evals_collected and _merges(session.config):
+        merge_shards()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Eval datasets for test_evals.py: parsed once, filtered by tag, sharded.
+
+Each dataset file (.xlsx, .csv or .jsonl with user_question and gpd_answer
+columns, optionally a comma-separated tags column) is parsed once into
+EvalRow records. The rows are kept in memory for the process and in a
+JSON cache under EVAL_CACHE_DIR keyed by the file's size and mtime, so
+pytest-xdist workers and shard processes read the small cache instead of
+parsing the spreadsheet again.
+
+Every row has a stable id (<file stem>:<row number>) and the file stem as a
+tag. Shards are picked by a hash of the id, so a row lands in the same
+shard in every process and run.
+
+    EVAL_DATASETS     comma-separated dataset files (default GPD_chatbot_eval.xlsx)
+    EVAL_TAGS         only rows with one of these tags (default: all)
+    EVAL_MAX_ROWS     rows per dataset (default 50)
+    EVAL_SHARD        "i/n": run only shard i of n (0-based)
+    EVAL_RESULTS_DIR  per-shard result files (default eval_results)
+    EVAL_CACHE_DIR    parsed dataset cache (default .eval_cache)
+
+Per-shard results are merged into one report (EVAL_TIER_REPORT) with the
+total wall time, per-row latency and pass rates by tier, dataset and tag.
+The conftest does this at the end of a pytest run (the controller does it
+under xdist); without xdist, the built-in runner starts one pytest process
+per shard and merges their results:
+
+    python eval_dataset.py run --shards 4 [-- extra pytest args]
+    python eval_dataset.py rows --tags GPD_chatbot_eval
+    python eval_dataset.py merge
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from metrics import summarize
+
+CACHE_VERSION = 1
+QUESTION, ANSWER, TAGS = "user_question", "gpd_answer", "tags"
+
+
+class EvalRow(NamedTuple):
+    id: str
+    dataset: str
+    index: int
+    question: str
+    answer: str
+    tags: Tuple[str, ...]
+
+
+def dataset_paths() -> List[str]:
+    raw = os.getenv("EVAL_DATASETS", "GPD_chatbot_eval.xlsx")
+    return [p.strip() for p in raw.split(",") if p.strip()]
+
+
+def tag_filter() -> List[str]:
+    return [t.strip() for t in os.getenv("EVAL_TAGS", "").split(",") if t.strip()]
+
+
+def max_rows() -> int:
+    return int(os.getenv("EVAL_MAX_ROWS", "50"))
+
+
+def results_dir() -> str:
+    return os.getenv("EVAL_RESULTS_DIR", "eval_results")
+
+
+def report_path() -> str:
+    return os.getenv("EVAL_TIER_REPORT", "eval_tier_report.json")
+
+
+def _records(path: str) -> List[Dict[str, Any]]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    import pandas as pd
+    df = pd.read_csv(path) if ext == ".csv" else pd.read_excel(path)
+    return df.to_dict("records")
+
+
+def _text(value: Any) -> str:
+    # Empty spreadsheet cells come back as NaN
+    return "" if value is None or value != value else str(value)
+
+
+def parse_dataset(path: str) -> List[EvalRow]:
+    """Rows of one dataset file; rows without a question or answer are left out."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    rows = []
+    for i, rec in enumerate(_records(path)):
+        question, answer = _text(rec.get(QUESTION)), _text(rec.get(ANSWER))
+        if not question.strip() or not answer.strip():
+            continue
+        extra = [t.strip() for t in _text(rec.get(TAGS)).split(",") if t.strip()]
+        rows.append(EvalRow(f"{stem}:{i}", stem, i, question, answer, tuple([stem] + extra)))
+    return rows
+
+
+_lock = threading.Lock()
+_parsed: Dict[Tuple[str, int, int], List[EvalRow]] = {}
+
+
+def _cache_file(path: str, stamp: Tuple[str, int, int]) -> str:
+    key = hashlib.sha1(json.dumps([CACHE_VERSION, *stamp]).encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.getenv("EVAL_CACHE_DIR", ".eval_cache"), f"{stem}-{key}.json")
+
+
+def load_dataset(path: str) -> List[EvalRow]:
+    """Rows of path, parsed at most once per file version across processes."""
+    st = os.stat(path)
+    stamp = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _lock:
+        if stamp in _parsed:
+            return _parsed[stamp]
+        cache = _cache_file(path, stamp)
+        try:
+            with open(cache, encoding="utf-8") as f:
+                rows = [EvalRow(*r[:5], tuple(r[5])) for r in json.load(f)]
+        except (OSError, ValueError):
+            rows = parse_dataset(path)
+            os.makedirs(os.path.dirname(cache), exist_ok=True)
+            tmp = f"{cache}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump([list(r) for r in rows], f, ensure_ascii=False)
+            os.replace(tmp, cache)
+        _parsed[stamp] = rows
+        return rows
+
+
+def parse_shard(spec: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not spec:
+        return None
+    i, n = (int(x) for x in spec.split("/"))
+    if not 0 <= i < n:
+        raise ValueError(f"EVAL_SHARD must be i/n with 0 <= i < n, got {spec!r}")
+    return i, n
+
+
+def shard_of(row_id: str, count: int) -> int:
+    return int(hashlib.sha1(row_id.encode("utf-8")).hexdigest()[:8], 16) % count
+
+
+def select_rows(rows: Iterable[EvalRow], tags: Iterable[str] = (), limit: Optional[int] = None,
+                shard: Optional[Tuple[int, int]] = None) -> List[EvalRow]:
+    """The first limit rows of each dataset that carry one of tags, then this shard's part of them."""
+    wanted = set(tags)
+    taken: Dict[str, int] = {}
+    out = []
+    for row in rows:
+        if wanted and not wanted.intersection(row.tags):
+            continue
+        if limit is not None and taken.get(row.dataset, 0) >= limit:
+            continue
+        taken[row.dataset] = taken.get(row.dataset, 0) + 1
+        if shard is None or shard_of(row.id, shard[1]) == shard[0]:
+            out.append(row)
+    return out
+
+
+def eval_rows() -> List[EvalRow]:
+    """Rows for this process, from the EVAL_* settings."""
+    rows: List[EvalRow] = []
+    for path in dataset_paths():
+        if os.path.exists(path):
+            rows += load_dataset(path)
+        else:
+            print(f"[eval] dataset {path} not found, skipped", flush=True)
+    return select_rows(rows, tag_filter(), max_rows(), parse_shard(os.getenv("EVAL_SHARD")))
+
+
+def write_shard(results: List[Dict[str, Any]], started: float, finished: float, name: str) -> str:
+    """Results of one worker or shard, with its wall-clock span."""
+    os.makedirs(results_dir(), exist_ok=True)
+    path = os.path.join(results_dir(), f"{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"name": name, "started": started, "finished": finished, "results": results}, f, indent=2)
+    return path
+
+
+def clear_shards() -> None:
+    for path in glob.glob(os.path.join(results_dir(), "*.json")):
+        os.remove(path)
+
+
+def _summary(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "rows": len(rows),
+        "pass_rate": round(sum(r["passed"] for r in rows) / len(rows), 3),
+        "latency": summarize([r["latency_s"] for r in rows]),
+    }
+
+
+def merge_shards(out_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Merge the shard files into one report; None if there are none."""
+    shards = []
+    for path in sorted(glob.glob(os.path.join(results_dir(), "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            shards.append(json.load(f))
+    results = sorted((r for s in shards for r in s["results"]), key=lambda r: (r["tier"], r["row"]))
+    if not results:
+        return None
+
+    tiers = {}
+    for tier in sorted({r["tier"] for r in results}):
+        rows = [r for r in results if r["tier"] == tier]
+        tiers[tier] = {
+            **_summary(rows),
+            "mean_tokens": round(sum(r["tokens"] for r in rows) / len(rows), 1),
+            "models_used": dict(sorted(
+                (m, sum(r["models_used"].count(m) for r in rows))
+                for m in {m for r in rows for m in r["models_used"]}
+            )),
+        }
+    report = {
+        "wall_s": round(max(s["finished"] for s in shards) - min(s["started"] for s in shards), 3),
+        "row_latency": summarize([r["latency_s"] for r in results]),
+        "shards": {s["name"]: {"rows": len(s["results"]), "wall_s": round(s["finished"] - s["started"], 3)}
+                   for s in shards},
+        "tiers": tiers,
+        "datasets": {d: _summary([r for r in results if r["dataset"] == d])
+                     for d in sorted({r["dataset"] for r in results})},
+        "tags": {t: _summary([r for r in results if t in r["tags"]])
+                 for t in sorted({t for r in results for t in r["tags"]})},
+        "results": results,
+    }
+    with open(out_path or report_path(), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    for tier, row in tiers.items():
+        print(f"[eval] tier={tier} pass_rate={row['pass_rate']:.0%} "
+              f"p50={row['latency']['p50_ms']:.0f}ms p95={row['latency']['p95_ms']:.0f}ms "
+              f"tokens={row['mean_tokens']:.0f}")
+    print(f"[eval] {len(results)} results from {len(shards)} shards in {report['wall_s']:.1f}s", flush=True)
+    return report
+
+
+def run_shards(count: int, pytest_args: List[str]) -> int:
+    """One pytest process per shard, then merge; returns the worst exit code."""
+    clear_shards()
+    procs = []
+    for i in range(count):
+        env = {**os.environ, "EVAL_SHARD": f"{i}/{count}", "EVAL_MERGE": "0"}
+        cmd = [sys.executable, "-m", "pytest", "-q", "test_evals.py", *pytest_args]
+        procs.append(subprocess.Popen(cmd, env=env))
+    codes = [p.wait() for p in procs]
+    merge_shards()
+    # pytest exits 5 when a shard collected no rows; that is not a failure here
+    return max((c for c in codes if c != 5), default=0)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Eval datasets: list rows, run sharded evals, merge results")
+    sub = p.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("rows", help="list the selected rows")
+    r.add_argument("--tags", default=None, help="overrides EVAL_TAGS")
+    r.add_argument("--shard", default=None, help="i/n, overrides EVAL_SHARD")
+    run = sub.add_parser("run", help="run test_evals.py in parallel shards and merge the results")
+    run.add_argument("--shards", type=int, default=os.cpu_count() or 2)
+    run.add_argument("pytest_args", nargs=argparse.REMAINDER)
+    sub.add_parser("merge", help="merge the shard files in EVAL_RESULTS_DIR")
+    args = p.parse_args(argv)
+
+    if args.command == "rows":
+        if args.tags is not None:
+            os.environ["EVAL_TAGS"] = args.tags
+        if args.shard is not None:
+            os.environ["EVAL_SHARD"] = args.shard
+        t0 = time.perf_counter()
+        rows = eval_rows()
+        for row in rows:
+            print(f"{row.id}\t{','.join(row.tags)}\t{row.question[:60]!r}")
+        print(f"{len(rows)} rows in {1000 * (time.perf_counter() - t0):.1f} ms", file=sys.stderr)
+    elif args.command == "run":
+        extra = args.pytest_args[1:] if args.pytest_args[:1] == ["--"] else args.pytest_args
+        sys.exit(run_shards(args.shards, extra))
+    else:
+        sys.exit(0 if merge_shards() else 1)
+
+
+if __name__ == "__main__":
+    main()
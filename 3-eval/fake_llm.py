@@ -0,0 +1,144 @@
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Type
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+
+
+_COURSE_CODE = re.compile(r"\b([A-Za-z]{4})\s*-?\s*(\d{3})\b")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatOpenAI used by load tests and benchmarks.
+    Sleeps for latency_s per call and answers with a short canned reply
+    that quotes the latest human message. When query_course_schedule is
+    bound and a fresh question names a course code, it first emits a tool
+    call for it, like the real model does in the ReAct loop. Other fresh
+    questions go to tavily_search_results_json first when that is bound.
+    When streamed, the first chunk arrives after latency_s and the reply
+    follows word by word, token_interval_s apart.
+    """
+
+    latency_s: float = 0.2
+    reply_prefix: str = "Thanks for asking about"
+    tool_names: List[str] = []
+    token_interval_s: float = 0.01
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "FakeChatModel":
+        names = [getattr(t, "name", None) or (t.get("name") if isinstance(t, dict) else None) for t in tools]
+        return self.model_copy(update={"tool_names": [n for n in names if n]})
+
+    def _reply(self, messages: List[BaseMessage]) -> ChatResult:
+        question = ""
+        for m in reversed(messages):
+            if isinstance(m, HumanMessage):
+                question = str(m.content)
+                break
+        usage = {"input_tokens": sum(len(str(m.content)) // 4 for m in messages)}
+        code = _COURSE_CODE.search(question)
+        fresh = bool(messages) and isinstance(messages[-1], HumanMessage)
+        call = None
+        if fresh and code and "query_course_schedule" in self.tool_names:
+            call = ("query_course_schedule", {"course": f"{code.group(1).upper()}{code.group(2)}"})
+        elif fresh and not code and "tavily_search_results_json" in self.tool_names:
+            call = ("tavily_search_results_json", {"query": question[:200]})
+        if call:
+            message = AIMessage(content="", tool_calls=[{
+                "name": call[0],
+                "args": call[1],
+                "id": f"call_fake_{uuid.uuid4().hex[:12]}",
+                "type": "tool_call",
+            }])
+        else:
+            message = AIMessage(content=f"{self.reply_prefix}: {question[:80]}")
+        usage["output_tokens"] = len(str(message.content)) // 4 + 1
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        message.usage_metadata = usage
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency_s)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency_s)
+        return self._reply(messages)
+
+    def _chunks(self, messages: List[BaseMessage]) -> List[ChatGenerationChunk]:
+        message = self._reply(messages).generations[0].message
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            chunk = AIMessageChunk(content="", usage_metadata=message.usage_metadata, tool_call_chunks=[{
+                "name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0,
+            }])
+            return [ChatGenerationChunk(message=chunk)]
+        words = re.findall(r"\S+\s*", str(message.content)) or [""]
+        chunks = [ChatGenerationChunk(message=AIMessageChunk(content=w)) for w in words]
+        chunks[-1].message.usage_metadata = message.usage_metadata
+        return chunks
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_s)
+        for i, chunk in enumerate(self._chunks(messages)):
+            if i:
+                time.sleep(self.token_interval_s)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_s)
+        for i, chunk in enumerate(self._chunks(messages)):
+            if i:
+                await asyncio.sleep(self.token_interval_s)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class _SearchArgs(BaseModel):
+    query: str = Field(description="search query to look up")
+
+
+class FakeSearchTool(BaseTool):
+    """
+    Offline stand-in for TavilySearchResults: same name, arguments and
+    (content, artifact) response. Sleeps for latency_s and returns
+    max_results canned hits that quote the query.
+    """
+
+    name: str = "tavily_search_results_json"
+    description: str = "A search engine. Input should be a search query."
+    args_schema: Type[BaseModel] = _SearchArgs
+    response_format: str = "content_and_artifact"
+    max_results: int = 5
+    latency_s: float = 0.3
+
+    def _results(self, query: str) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        hits = [{"url": f"https://example.edu/grad/{i}", "title": f"Result {i + 1}",
+                 "content": f"Program information about {query[:80]}."} for i in range(self.max_results)]
+        return hits, {"query": query}
+
+    def _run(self, query: str, run_manager: Any = None) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        time.sleep(self.latency_s)
+        return self._results(query)
+
+    async def _arun(self, query: str, run_manager: Any = None) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        await asyncio.sleep(self.latency_s)
+        return self._results(query)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Local BM25 knowledge base for program policies.
+
+Program facts (deadlines, credit requirements, funding, course
+substitutions) come from a small, stable set of department pages and past
+advisor answers, so they can be answered from disk instead of a web
+search. Ingestion chunks the sources and writes an inverted index:
+
+    kb_index/meta.json     parameters, sources and the term table
+                           (term -> [postings offset, document frequency])
+    kb_index/postings.bin  uint32 (doc, tf) pairs, grouped by term
+    kb_index/doclen.bin    uint32 chunk lengths in terms
+    kb_index/docs.jsonl    chunk text and source, one JSON object per line
+    kb_index/docs.idx      uint64 byte offsets into docs.jsonl
+
+The binary files are memory-mapped when the index is opened, so opening
+is cheap and the OS page cache is shared between processes.
+
+Sources: .md, .txt and .html files under --docs (split on paragraphs into
+~120-word chunks), and the question/answer pairs of an advisor Q&A
+spreadsheet given with --qa (one chunk per pair). Eval datasets
+(EVAL_DATASETS, default GPD_chatbot_eval.xlsx) are never indexed, so the
+evals cannot answer their own questions from the index.
+
+    python kb_index.py build --docs kb --qa advisor_qa.xlsx
+    python kb_index.py query "Does a D grade count toward the degree?"
+"""
+import argparse
+import html
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from heapq import nlargest
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+INDEX_VERSION = 1
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 20
+K1, B = 1.2, 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does", "for", "from", "has",
+    "have", "how", "i", "if", "in", "is", "it", "its", "me", "my", "of", "on", "or", "so", "that", "the",
+    "this", "to", "was", "we", "what", "when", "where", "which", "who", "will", "with", "you", "your",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_COURSE = re.compile(r"\b([a-z]{4})\s*-?\s*(\d{3})\b")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words without stopwords, plural "s" stripped; course codes also as one token."""
+    lowered = text.lower()
+    terms = []
+    for w in _WORD.findall(lowered):
+        if w in STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]
+        terms.append(w)
+    terms += [f"{dept}{num}" for dept, num in _COURSE.findall(lowered)]
+    return terms
+
+
+def _strip_html(text: str) -> str:
+    text = re.sub(r"(?is)<(script|style).*?</\1>", " ", text)
+    text = re.sub(r"(?i)<br\s*/?>|</p>|</h\d>|</li>", "\n\n", text)
+    return html.unescape(re.sub(r"<[^>]+>", " ", text))
+
+
+def chunk_text(text: str, words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Paragraphs packed into chunks of about `words` words; long paragraphs are windowed."""
+    chunks: List[str] = []
+    current: List[str] = []
+    for para in re.split(r"\n\s*\n", text):
+        tokens = para.split()
+        if not tokens:
+            continue
+        if current and len(current) + len(tokens) > words:
+            chunks.append(" ".join(current))
+            current = current[-overlap:] if len(tokens) < words else []
+        while len(tokens) > words:
+            chunks.append(" ".join(tokens[:words]))
+            tokens = tokens[words - overlap:]
+        current += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def doc_chunks(root: str) -> Iterable[Dict[str, str]]:
+    for dirpath, _, files in os.walk(root):
+        for name in sorted(files):
+            if not name.lower().endswith((".md", ".txt", ".html", ".htm")):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+            if name.lower().endswith((".html", ".htm")):
+                text = _strip_html(text)
+            heading = next((line.strip("# ").strip() for line in text.splitlines() if line.strip()), name)
+            for chunk in chunk_text(text):
+                yield {"source": os.path.relpath(path, root), "title": heading[:100], "text": chunk}
+
+
+def is_eval_dataset(path: str) -> bool:
+    names = (os.getenv("EVAL_DATASETS") or "GPD_chatbot_eval.xlsx").split(",")
+    return os.path.basename(path) in {os.path.basename(n.strip()) for n in names if n.strip()}
+
+
+def qa_chunks(path: str) -> Iterable[Dict[str, str]]:
+    """One chunk per question/answer pair; eval datasets yield nothing."""
+    if is_eval_dataset(path):
+        print(f"[kb] skipped {path}: it is an eval dataset (EVAL_DATASETS)", file=sys.stderr)
+        return
+    import pandas as pd
+
+    df = pd.read_excel(path)
+    for i, row in df.iterrows():
+        question = " ".join(str(row.get("user_question", "")).split())
+        answer = " ".join(str(row.get("gpd_answer", "")).split())
+        if question and answer:
+            yield {"source": f"{os.path.basename(path)}#{i + 2}", "title": question[:100],
+                   "text": f"Q: {question}\nA: {answer}"}
+
+
+def build_index(chunks: Iterable[Dict[str, str]], out_dir: str, sources: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Write the index for chunks to out_dir, replacing any index there."""
+    os.makedirs(out_dir, exist_ok=True)
+    postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+    lengths = array("I")
+    offsets = array("Q")
+    tmp = {name: os.path.join(out_dir, name + ".tmp")
+           for name in ("meta.json", "postings.bin", "doclen.bin", "docs.jsonl", "docs.idx")}
+
+    with open(tmp["docs.jsonl"], "wb") as docs:
+        for doc_id, chunk in enumerate(chunks):
+            terms = tokenize(f"{chunk['title']} {chunk['text']}")
+            for term, tf in Counter(terms).items():
+                postings[term].append((doc_id, tf))
+            lengths.append(len(terms))
+            offsets.append(docs.tell())
+            docs.write(json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    terms_table: Dict[str, List[int]] = {}
+    flat = array("I")
+    for term in sorted(postings):
+        terms_table[term] = [len(flat) // 2, len(postings[term])]
+        for doc_id, tf in postings[term]:
+            flat.append(doc_id)
+            flat.append(tf)
+    with open(tmp["postings.bin"], "wb") as f:
+        flat.tofile(f)
+    with open(tmp["doclen.bin"], "wb") as f:
+        lengths.tofile(f)
+    with open(tmp["docs.idx"], "wb") as f:
+        offsets.tofile(f)
+
+    meta = {
+        "version": INDEX_VERSION,
+        "byteorder": sys.byteorder,
+        "docs": len(lengths),
+        "avgdl": (sum(lengths) / len(lengths)) if lengths else 0.0,
+        "k1": K1,
+        "b": B,
+        "sources": sources or [],
+        "built_at": time.time(),
+        "terms": terms_table,
+    }
+    with open(tmp["meta.json"], "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    # meta.json last, so a reader never sees new metadata with old postings
+    for name in ("postings.bin", "doclen.bin", "docs.jsonl", "docs.idx", "meta.json"):
+        os.replace(tmp[name], os.path.join(out_dir, name))
+    return {"docs": meta["docs"], "terms": len(terms_table), "postings": len(flat) // 2}
+
+
+def _map(path: str) -> Tuple[Optional[mmap.mmap], memoryview]:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None, memoryview(b"")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm, memoryview(mm)
+
+
+class KBIndex:
+    """Read-only BM25 index opened from disk; postings are read straight from the mapped files."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != INDEX_VERSION or self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path}: index was built by an incompatible version; rebuild it")
+        self.terms: Dict[str, List[int]] = self.meta["terms"]
+        self.n = self.meta["docs"]
+        self.avgdl = self.meta["avgdl"] or 1.0
+        self._maps = []
+        self.postings = self._cast("postings.bin", "I")
+        self.doclen = self._cast("doclen.bin", "I")
+        self.offsets = self._cast("docs.idx", "Q")
+        self._docs_mm, self._docs = _map(os.path.join(path, "docs.jsonl"))
+        self._maps.append(self._docs_mm)
+
+    def _cast(self, name: str, fmt: str) -> memoryview:
+        mm, view = _map(os.path.join(self.path, name))
+        self._maps.append(mm)
+        return view.cast(fmt) if mm is not None else memoryview(array(fmt))
+
+    def idf(self, df: int) -> float:
+        return math.log(1 + (self.n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Top k chunks by BM25 score, best first."""
+        k1, b = self.meta["k1"], self.meta["b"]
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            idf = self.idf(df)
+            for i in range(start, start + df):
+                doc_id, tf = self.postings[2 * i], self.postings[2 * i + 1]
+                norm = k1 * (1 - b + b * self.doclen[doc_id] / self.avgdl)
+                scores[doc_id] += idf * tf * (k1 + 1) / (tf + norm)
+        best = nlargest(k, scores.items(), key=lambda item: item[1])
+        return [{**self.doc(doc_id), "score": round(score, 3)} for doc_id, score in best]
+
+    def doc(self, doc_id: int) -> Dict[str, Any]:
+        start = self.offsets[doc_id]
+        end = self.offsets[doc_id + 1] if doc_id + 1 < self.n else len(self._docs)
+        return json.loads(bytes(self._docs[start:end]))
+
+    def close(self) -> None:
+        for view in (self.postings, self.doclen, self.offsets, self._docs):
+            view.release()
+        for mm in self._maps:
+            if mm is not None:
+                mm.close()
+
+
+_index_lock = threading.Lock()
+_index_cache: Dict[str, Any] = {}
+
+
+def index_dir() -> str:
+    return os.getenv("KB_INDEX_DIR", "kb_index")
+
+
+def get_kb_index() -> Optional[KBIndex]:
+    """The index in KB_INDEX_DIR, reopened when it is rebuilt; None if it was never built."""
+    meta_path = os.path.join(index_dir(), "meta.json")
+    try:
+        st = os.stat(meta_path)
+    except FileNotFoundError:
+        return None
+    stamp = (meta_path, st.st_mtime_ns, st.st_size)
+    with _index_lock:
+        if _index_cache.get("stamp") != stamp:
+            # The old index stays mapped; searches already running on it finish normally
+            _index_cache.update(stamp=stamp, index=KBIndex(index_dir()))
+        return _index_cache["index"]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Build or query the local program knowledge base")
+    sub = p.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="chunk sources and write the index")
+    b.add_argument("--docs", default="kb", help="directory of .md/.txt/.html pages (skipped if missing)")
+    b.add_argument("--qa", action="append", default=[], help="advisor Q&A spreadsheet (repeatable)")
+    b.add_argument("--out", default=index_dir())
+    q = sub.add_parser("query", help="search the index")
+    q.add_argument("text")
+    q.add_argument("-k", type=int, default=3)
+    args = p.parse_args(argv)
+
+    if args.command == "build":
+        chunks: List[Dict[str, str]] = []
+        sources = []
+        if os.path.isdir(args.docs):
+            chunks += doc_chunks(args.docs)
+            sources.append(args.docs)
+        for path in args.qa:
+            qa = list(qa_chunks(path))
+            if qa:
+                chunks += qa
+                sources.append(path)
+        if not chunks:
+            p.error("no sources: add pages under --docs or pass --qa")
+        t0 = time.perf_counter()
+        stats = build_index(chunks, args.out, sources)
+        print(json.dumps({**stats, "out": args.out, "build_ms": round(1000 * (time.perf_counter() - t0), 1)}))
+    else:
+        index = get_kb_index()
+        if index is None:
+            p.error(f"no index in {index_dir()}; run 'python kb_index.py build' first")
+        for hit in index.search(args.text, args.k):
+            print(f"{hit['score']:>7.3f}  {hit['source']}  {hit['title']}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Load test for serve.py: many concurrent conversations over HTTP.
+
+Starts serve.py on FakeChatModel (unless --url points at a running server),
+then runs --users conversations of --turns streamed turns each. Every user
+opens a session and asks questions from a fixed mix, one turn at a time.
+A refused turn (503) is retried after its Retry-After, up to --retries times.
+
+Reports completed turns per second and, in milliseconds, time to the first
+SSE event and to the done event, as well as refusals, errors and turns
+served per worker process.
+
+    python load_test_http.py --users 200 --turns 3 --workers 4 --llm-latency-ms 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from metrics import summarize
+
+QUESTIONS = [
+    "Who teaches CMSC 691?",
+    "When does CMSC 603 meet?",
+    "What classes does Damevski teach?",
+    "How many credits do I need to graduate with a master's degree?",
+    "Can I transfer graduate credits from another university?",
+    "What AI courses are available next semester?",
+    "Is there funding for PhD students?",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--url", help="test a running server instead of starting one")
+    p.add_argument("--port", type=int, default=8799)
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--users", type=int, default=50)
+    p.add_argument("--turns", type=int, default=3)
+    p.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's turns")
+    p.add_argument("--llm-latency-ms", type=float, default=200.0)
+    p.add_argument("--max-concurrency", type=int, default=16, help="SERVE_MAX_CONCURRENCY per worker")
+    p.add_argument("--max-queue", type=int, default=64, help="SERVE_MAX_QUEUE per worker")
+    p.add_argument("--retries", type=int, default=3)
+    p.add_argument("--answer-cache", action="store_true", help="keep the answer cache on (off by default)")
+    p.add_argument("--out", help="write the JSON report here as well")
+    return p.parse_args()
+
+
+def start_server(args: argparse.Namespace, db_path: str) -> subprocess.Popen:
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "fake-key-for-load-test")
+    env.pop("TAVILY_API_KEY", None)  # keep the test offline
+    env.update({
+        "SERVE_SESSION_DB": db_path,
+        "SERVE_MAX_CONCURRENCY": str(args.max_concurrency),
+        "SERVE_MAX_QUEUE": str(args.max_queue),
+    })
+    if not args.answer_cache:
+        # Each repeated question would otherwise be answered from the cache
+        env["ANSWER_CACHE_THRESHOLD"] = "2"
+    cmd = [sys.executable, os.path.join(here, "serve.py"), "--port", str(args.port),
+           "--workers", str(args.workers), "--fake-llm-ms", str(args.llm_latency_ms)]
+    return subprocess.Popen(cmd, cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout_s: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            if (await client.get("/healthz")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("server did not come up")
+        await asyncio.sleep(0.25)
+
+
+async def stream_turn(client: httpx.AsyncClient, sid: str, question: str,
+                      rec: Dict[str, Any]) -> Tuple[Optional[int], float]:
+    """
+    One streamed turn: (None, 0) on success, else the HTTP status (0 for a
+    stream error) and the server's Retry-After.
+    """
+    t0 = time.perf_counter()
+    first = None
+    async with client.stream("POST", f"/v1/sessions/{sid}/messages",
+                             json={"message": question, "stream": True}) as resp:
+        if resp.status_code != 200:
+            await resp.aread()
+            return resp.status_code, float(resp.headers.get("Retry-After", "1"))
+        rec["workers"][resp.headers.get("X-Worker", "?")] += 1
+        event = None
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if first is None:
+                    first = time.perf_counter() - t0
+            elif line.startswith("data: ") and event == "error":
+                rec["error_messages"][json.loads(line[6:]).get("error", "")[:80]] += 1
+                return 0, 0.0
+            elif line.startswith("data: ") and event == "done":
+                rec["first_event"].append(first)
+                rec["done"].append(time.perf_counter() - t0)
+                return None, 0.0
+    return 0, 0.0
+
+
+async def user(client: httpx.AsyncClient, idx: int, args: argparse.Namespace, rec: Dict[str, Any]) -> None:
+    rng = random.Random(idx)
+    sid = (await client.post("/v1/sessions")).json()["session_id"]
+    for turn in range(args.turns):
+        question = rng.choice(QUESTIONS)
+        for attempt in range(args.retries + 1):
+            try:
+                status, retry_after = await stream_turn(client, sid, question, rec)
+            except httpx.HTTPError as e:
+                rec["error_messages"][type(e).__name__] += 1
+                status, retry_after = 0, 0.0
+            if status is None:
+                rec["completed"] += 1
+                break
+            rec["status"][str(status)] += 1
+            if status != 503 or attempt == args.retries:
+                rec["failed"] += 1
+                break
+            await asyncio.sleep(retry_after * (0.5 + rng.random()))
+        if args.think_ms:
+            await asyncio.sleep(args.think_ms / 1000.0)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    db_path = os.path.abspath(f"load_test_sessions_{os.getpid()}.db")
+    server = None if args.url else start_server(args, db_path)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    rec: Dict[str, Any] = {"completed": 0, "failed": 0, "first_event": [], "done": [],
+                           "status": Counter(), "workers": Counter(), "error_messages": Counter()}
+    try:
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=httpx.Timeout(120.0)) as client:
+            await wait_ready(client)
+            t0 = time.perf_counter()
+            await asyncio.gather(*(user(client, i, args, rec) for i in range(args.users)))
+            wall = time.perf_counter() - t0
+            server_stats = (await client.get("/stats")).json()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+    return {
+        "config": vars(args),
+        "turns": args.users * args.turns,
+        "completed": rec["completed"],
+        "failed": rec["failed"],
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(rec["completed"] / wall, 3) if wall else 0.0,
+        "first_event": summarize(rec["first_event"]),
+        "turn_latency": summarize(rec["done"]),
+        "refusals": dict(rec["status"]),
+        "errors": dict(rec["error_messages"]),
+        "turns_per_worker": dict(rec["workers"]),
+        # From whichever worker answered the last request
+        "sample_worker_stats": server_stats,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Cost/latency-aware routing between a fast and a strong model tier.
+
+Each turn is classified locally from the latest human message and the
+conversation so far:
+
+- small talk ("thanks!", "hi")                        -> fast
+- reasoning cues (should, compare, recommend, plan)   -> strong
+- several course codes, long questions, long history  -> strong
+- short schedule lookups (course code, instructor,
+  schedule words)                                     -> fast
+- anything else (open questions that may need search) -> strong
+
+Follow-up hops inside a turn (after tool results) stay on the tier that
+made the tool call. Each tier has its own tool binding: by default the fast
+tier only gets the local schedule and knowledge-base tools. Decisions are printed as [model_router]
+lines and counted in STATS.
+
+Configuration:
+    MODEL_ROUTING              1 to enable (default 0: one model, as before)
+    MODEL_FAST / MODEL_STRONG  model names (gpt-4o-mini / gpt-4o)
+    MODEL_FAST_TEMPERATURE     default 0.3
+    MODEL_STRONG_TEMPERATURE   default 0.7
+    MODEL_FAST_TOOLS           comma-separated tool names, or "all"
+                               (default query_course_schedule,search_program_kb)
+"""
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+from call_policy import guard_graph_model
+from llm_factory import make_chat_model
+
+FAST, STRONG, DEFAULT = "fast", "strong", "default"
+
+COURSE_CODE = re.compile(r"\b([A-Za-z]{4})\s*-?\s*(\d{3})\b")
+
+SMALL_TALK = {
+    "thanks", "thank", "you", "thx", "ty", "ok", "okay", "great", "cool", "hi", "hello", "hey",
+    "bye", "got", "it", "perfect", "awesome", "nice", "sounds", "good", "appreciate", "that",
+    "helps", "much", "so",
+}
+
+STRONG_CUES = (
+    "should", "recommend", "better", "compare", "versus", " vs", "difference", "pros and cons",
+    "plan", "why", "explain", "help me", "prereq", "require", "substitute", "transfer",
+    "degree", "graduate", "advice", "strategy",
+)
+
+# Words that make a question about the schedule even without a course code;
+# "when is" / "where is" alone could just as well be about admissions
+SCHEDULE_CUES = (
+    "teach", "instructor", "professor", "schedule", "section", "crn", "room", "modality",
+    "seats", "enrollment", "course", "class",
+)
+
+MAX_FAST_WORDS = 25
+LONG_HISTORY_TURNS = 8
+
+
+def routing_enabled() -> bool:
+    return os.getenv("MODEL_ROUTING", "0") == "1"
+
+
+def classify_turn(messages: List[Any]) -> Tuple[str, str]:
+    """Return (tier, reason) for the next model call on this conversation."""
+    if not messages:
+        return STRONG, "empty"
+    if isinstance(messages[-1], ToolMessage):
+        caller = next((m for m in reversed(messages) if isinstance(m, AIMessage)), None)
+        # Tool calls injected by the fast-path router carry no tier; classify those below
+        if caller is not None and "model_tier" in caller.response_metadata:
+            return caller.response_metadata["model_tier"], "same_turn"
+
+    text = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+    lowered = " ".join(text.lower().split())
+    words = re.findall(r"[a-z0-9']+", lowered)
+    if words and len(words) <= 6 and all(w in SMALL_TALK for w in words):
+        return FAST, "small_talk"
+    if any(cue in lowered for cue in STRONG_CUES):
+        return STRONG, "reasoning_cue"
+    if len({f"{d.upper()}{n}" for d, n in COURSE_CODE.findall(text)}) >= 2:
+        return STRONG, "multi_lookup"
+    if len(words) > MAX_FAST_WORDS:
+        return STRONG, "long_question"
+    if sum(1 for m in messages if isinstance(m, HumanMessage)) > LONG_HISTORY_TURNS:
+        return STRONG, "long_history"
+    if COURSE_CODE.search(text) or any(cue in lowered for cue in SCHEDULE_CUES):
+        return FAST, "schedule_lookup"
+    return STRONG, "open_question"
+
+
+class RoutingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tiers: Counter = Counter()
+        self.reasons: Counter = Counter()
+
+    def add(self, tier: str, reason: str) -> None:
+        with self._lock:
+            self.tiers[tier] += 1
+            self.reasons[f"{tier}:{reason}"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"tiers": dict(self.tiers), "reasons": dict(self.reasons)}
+
+
+STATS = RoutingStats()
+
+
+def tier_settings() -> Dict[str, Dict[str, Any]]:
+    return {
+        FAST: {
+            "model": os.getenv("MODEL_FAST", "gpt-4o-mini"),
+            "temperature": float(os.getenv("MODEL_FAST_TEMPERATURE", "0.3")),
+        },
+        STRONG: {
+            "model": os.getenv("MODEL_STRONG", "gpt-4o"),
+            "temperature": float(os.getenv("MODEL_STRONG_TEMPERATURE", "0.7")),
+        },
+    }
+
+
+def tier_tools(tier: str, tools: Iterable[Any]) -> List[Any]:
+    tools = list(tools)
+    if tier != FAST:
+        return tools
+    wanted = os.getenv("MODEL_FAST_TOOLS", "query_course_schedule,search_program_kb")
+    if wanted.strip() == "all":
+        return tools
+    names = {n.strip() for n in wanted.split(",") if n.strip()}
+    return [t for t in tools if t.name in names]
+
+
+def make_tier_llms(api_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Fast and strong chat models from the MODEL_* settings, on the shared HTTP
+    pool. SDK retries are off: routed_graph_model puts them under call_policy.
+    """
+    return {tier: make_chat_model(api_key=api_key, max_retries=0, **cfg)
+            for tier, cfg in tier_settings().items()}
+
+
+def routed_graph_model(tier_llms: Dict[str, Any], tools: List[Any], search_tool: Any = None) -> Any:
+    """Bind each tier's tools (under the call policy) and route between the tiers."""
+    bound = {}
+    for tier, llm in tier_llms.items():
+        own = tier_tools(tier, tools)
+        bound[tier] = guard_graph_model(llm, own, search_tool=search_tool if search_tool in own else None)
+    return routed_model(bound, log=len(bound) > 1)
+
+
+def routed_model(bound: Dict[str, Any], log: bool = True) -> Any:
+    """
+    bound maps tier -> model with that tier's tools bound. With a single
+    tier every call goes there. Replies carry response_metadata["model_tier"].
+    """
+    forced: Optional[str] = next(iter(bound)) if len(bound) == 1 else None
+
+    def pick(messages: List[Any]) -> Tuple[str, Any]:
+        if forced is not None:
+            tier, reason = forced, "forced"
+        else:
+            tier, reason = classify_turn(messages)
+        if reason != "same_turn":
+            STATS.add(tier, reason)
+            if log:
+                words = len(str(messages[-1].content).split()) if messages else 0
+                print(f"[model_router] tier={tier} reason={reason} words={words} "
+                      f"history={len(messages)}", flush=True)
+        return tier, bound.get(tier) or bound[STRONG]
+
+    def tag(tier: str, result: Any) -> Any:
+        if isinstance(result, AIMessage):
+            result.response_metadata["model_tier"] = tier
+        return result
+
+    def invoke(messages: List[Any], config: Any = None) -> Any:
+        tier, model = pick(messages)
+        return tag(tier, model.invoke(messages, config))
+
+    async def ainvoke(messages: List[Any], config: Any = None) -> Any:
+        tier, model = pick(messages)
+        return tag(tier, await model.ainvoke(messages, config))
+
+    return RunnableLambda(invoke, afunc=ainvoke, name="model_router")
@@ -3,13 +3,16 @@
 Quick start script for the Grad Director AI Chatbot (LangGraph version)
 """
 import os
+import uuid
 # from typing import Annotated, TypedDict
 
 import streamlit as st
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_core.chat_history import InMemoryChatMessageHistory
+from llm_factory import make_chat_model
+from tracing import trace_config, turn_span
+from call_policy import DeadlineExceeded, turn_deadline
+from model_router import DEFAULT, STATS as ROUTING_STATS, make_tier_llms, routed_graph_model, routing_enabled
+from langchain_core.messages import HumanMessage, AIMessage
 
 
 # LangGraph + tools
@@ -17,10 +20,19 @@ from langgraph.graph import StateGraph, START, END, MessagesState
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import tools_condition
 from langgraph.prebuilt.tool_node import ToolNode
+from langgraph.utils.runnable import RunnableCallable
 
 
 from prompt import REACT_SYSTEM_PROMPT
-from tools import query_course_schedule, get_tavily_tool
+from tools import query_course_schedule, get_tavily_tool, get_kb_tool, known_instructors, XLSX_PATH as SCHEDULE_XLSX_PATH
+from router import make_router_node
+from prefetch import STATS as PREFETCH_STATS, Prefetcher, make_guess, make_prefetch_nodes, prefetch_enabled
+from tool_budget import STATS as BUDGET_STATS, budget_tool_node
+from prompt_assembly import assemble_messages, stable_tools
+from prompt_profile import COMPONENTS as PROMPT_COMPONENTS, PROFILES as PROMPT_PROFILES, profiled_model
+from answer_cache import AnswerCache, content_version
+from transcript import ASSISTANT, USER, render_transcript, store_from_env
+from search_cache import get_search_cache
 
 # Load environment variables
 load_dotenv()
@@ -33,10 +45,15 @@ st.set_page_config(
 )
 
 def initialize_session_state():
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = InMemoryChatMessageHistory()
+    if "session_id" not in st.session_state:
+        # Keys this session's transcript and prompt profile
+        st.session_state.session_id = uuid.uuid4().hex[:8]
+
+@st.cache_resource
+def get_transcripts():
+    # One compact transcript per session, shared store for this Streamlit
+    # process; idle sessions are evicted (see transcript.py)
+    return store_from_env()
 
 @st.cache_resource
 def get_llm():
@@ -47,16 +64,18 @@ def get_llm():
         st.stop()
 
     # Keep model/temperature consistent with your original setup
-    return ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0.7,
-        openai_api_key=api_key
-    )
-
-@st.cache_resource
-def get_graph():
-    llm = get_llm()
+    # Shared keep-alive connection pool; see llm_factory.py. Retries come from
+    # call_policy (routed_graph_model), so the SDK's own are off
+    return make_chat_model(model="gpt-4o-mini", temperature=0.7, api_key=api_key, max_retries=0)
 
+def build_graph(llm, fast_path=True, prefetch=True, tiers=None):
+    """
+    tiers: {"fast": model, "strong": model} routes each turn to a tier
+    (see model_router); by default every turn goes to llm.
+    fast_path: route unambiguous schedule lookups through the router node,
+    which runs query_course_schedule without asking the LLM first.
+    prefetch: start likely tool calls while the first LLM call is running.
+    """
     # Initialize tools
     tools = []
     tavily = get_tavily_tool()
@@ -65,43 +84,123 @@ def get_graph():
     schedule_tool = query_course_schedule
     if schedule_tool:
         tools.append(schedule_tool)
-
-    llm_with_tools = llm.bind_tools(tools) if tools else llm
-
-    def chatbot(state: MessagesState):
+    kb = get_kb_tool()
+    if kb:
+        # Program policy lookups from the local index instead of web search
+        tools.append(kb)
+    # Bound in name order so the tool-schema block of every prompt is identical
+    tools = stable_tools(tools)
+
+    # Tier routing in model_router; retries, timeouts and search degradation in call_policy
+    # Each request's prompt size is recorded per session in prompt_profile.PROFILES
+    llm_with_tools = profiled_model(routed_graph_model(tiers or {DEFAULT: llm}, tools, search_tool=tavily), tools)
+
+    def chatbot_sync(state: MessagesState):
         # Let the LLM decide whether to call tools
         result = llm_with_tools.invoke(state["messages"])
         return {"messages": [result]}
 
+    async def chatbot_async(state: MessagesState):
+        result = await llm_with_tools.ainvoke(state["messages"])
+        return {"messages": [result]}
+
+    # Same node under graph.invoke and graph.ainvoke
+    chatbot = RunnableCallable(chatbot_sync, chatbot_async, name="chatbot")
+
+    tool_node = ToolNode(tools=tools) if tools else None
+    if prefetch and tools:
+        prefetcher = Prefetcher(tools, make_guess(schedule_tool, known_instructors, tavily))
+        chatbot, tool_node = make_prefetch_nodes(llm_with_tools, tool_node, prefetcher)
+    if tool_node is not None:
+        # Oversized tool results are trimmed before they join the conversation
+        tool_node = budget_tool_node(tool_node)
+
     graph_builder = StateGraph(MessagesState)
     graph_builder.add_node("chatbot", chatbot)
 
     if tools:
-        tool_node = ToolNode(tools=tools)
         graph_builder.add_node("tools", tool_node)
         graph_builder.add_conditional_edges("chatbot", tools_condition)
         graph_builder.add_edge("tools", "chatbot")
 
-    graph_builder.add_edge(START, "chatbot")
+    if fast_path and schedule_tool:
+        graph_builder.add_node("router", budget_tool_node(make_router_node(schedule_tool, known_instructors),
+                                                          name="router"))
+        graph_builder.add_edge(START, "router")
+        graph_builder.add_edge("router", "chatbot")
+    else:
+        graph_builder.add_edge(START, "chatbot")
     graph_builder.add_edge("chatbot", END)
     graph = graph_builder.compile()
     return graph
 
-def invoke_graph(all_messages):
-    """
-    all_messages: list of langchain_core.messages BaseMessage
-    Returns the final assistant message text.
-    """
-    graph = get_graph()
-    # Run the graph with the accumulated messages
-    state = graph.invoke({"messages": all_messages})
+@st.cache_resource
+def get_graph():
+    return build_graph(get_llm(),
+                       fast_path=os.getenv("SCHEDULE_FAST_PATH", "1") != "0",
+                       prefetch=prefetch_enabled(),
+                       tiers=make_tier_llms() if routing_enabled() else None)
+
+@st.cache_resource
+def get_answer_cache():
+    # Shared by every session in this Streamlit process
+    return AnswerCache(
+        max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+        ttl_s=float(os.getenv("ANSWER_CACHE_TTL_S", str(6 * 3600))),
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.85")),
+    )
+
+def cached_answer(all_messages):
+    """Returns (question, cached answer or None) for the latest human turn."""
+    # Repeated standalone questions are answered from the cache
+    cache = get_answer_cache()
+    cache.ensure_version(content_version(REACT_SYSTEM_PROMPT, paths=[SCHEDULE_XLSX_PATH]))
+    question = next((m.content for m in reversed(all_messages) if isinstance(m, HumanMessage)), "")
+    return question, (cache.lookup(question) if question else None)
+
+def final_answer(question, state):
     # Find the last assistant message
     last_ai = None
     for m in reversed(state["messages"]):
         if isinstance(m, AIMessage):
             last_ai = m
             break
-    return last_ai.content if last_ai else ""
+    answer = last_ai.content if last_ai else ""
+    get_answer_cache().store(question, answer)
+    return answer
+
+def invoke_graph(all_messages, session="default"):
+    """
+    all_messages: list of langchain_core.messages BaseMessage
+    session: key for this conversation's prompt profile
+    Returns the final assistant message text.
+    """
+    # One trace per turn when TRACE_EXPORTER is set; see tracing.py
+    with turn_span("streamlit.turn") as turn:
+        question, cached = cached_answer(all_messages)
+        turn.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+
+        graph = get_graph()
+        # Run the graph with the accumulated messages, within the turn deadline
+        with turn_deadline():
+            state = graph.invoke({"messages": all_messages}, config=trace_config({"metadata": {"session": session}}))
+        return final_answer(question, state)
+
+async def ainvoke_graph(all_messages, session="default"):
+    """
+    Async twin of invoke_graph, for callers that already run an event loop.
+    """
+    with turn_span("streamlit.turn") as turn:
+        question, cached = cached_answer(all_messages)
+        turn.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+
+        with turn_deadline():
+            state = await get_graph().ainvoke({"messages": all_messages}, config=trace_config({"metadata": {"session": session}}))
+        return final_answer(question, state)
 
 def main():
 
@@ -128,8 +227,8 @@ def main():
     col1, col2 = st.columns([1, 4])
     with col1:
         if st.button("🗑️ Clear Chat"):
-            st.session_state.messages = []
-            st.session_state.chat_history = InMemoryChatMessageHistory()
+            get_transcripts().get(st.session_state.session_id).clear()
+            st.session_state.transcript_pages = 1
             st.rerun()
 
     with col2:
@@ -141,19 +240,16 @@ def main():
 
     st.markdown("---")
 
+    transcript = get_transcripts().get(st.session_state.session_id)
     chat_container = st.container()
     with chat_container:
-        # Display prior messages
-        if "messages" in st.session_state:
-            for message in st.session_state.messages:
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
+        # Display the most recent messages; older ones load a page at a time
+        render_transcript(st, transcript)
 
         # Chat input
         if user_response := st.chat_input("What would you like to know?"):
-            # Add user message to visible transcript and history
-            st.session_state.messages.append({"role": "user", "content": user_response})
-            st.session_state.chat_history.add_message(HumanMessage(content=user_response))
+            # Add user message to the transcript
+            transcript.append(USER, user_response)
 
             # Display user message immediately
             with st.chat_message("user"):
@@ -162,30 +258,77 @@ def main():
             with st.chat_message("assistant"):
                 with st.spinner("🤔 Thinking..."):
                     try:
-                        # System preamble
-                        system_message = SystemMessage(
-                            # content=(
-                            #     "You are a helpful grad director chatbot. You help students with questions about graduate programs, admissions, requirements, and academic guidance."
-                            # )
-                            content = REACT_SYSTEM_PROMPT
-                        )
-
-                        # Compose full message list for the graph
-                        prior_msgs = [system_message] + st.session_state.chat_history.messages
+                        # Canonical model input: shared system prompt, history, then the
+                        # new question once (it is already in the transcript), so the
+                        # prompt prefix stays byte-identical across turns for caching
+                        prior_msgs = assemble_messages(transcript.messages(), user_response)
 
                         # Run the graph
-                        ai_text = invoke_graph(prior_msgs)
+                        ai_text = invoke_graph(prior_msgs, session=st.session_state.session_id)
 
                         # Display AI response
                         st.markdown(ai_text)
 
-                        # Persist assistant message to transcript and history
-                        st.session_state.messages.append({"role": "assistant", "content": ai_text})
-                        st.session_state.chat_history.add_message(AIMessage(content=ai_text))
+                        # Persist assistant message to the transcript
+                        transcript.append(ASSISTANT, ai_text)
 
+                    except DeadlineExceeded:
+                        st.warning("⏱️ That took too long to answer. Please try again in a moment.")
                     except Exception as e:
                         st.error(f"❌ Error: {str(e)}")
                         st.info("Please check your API keys and internet connection.")
 
+    cache_stats = get_answer_cache().stats()
+    st.sidebar.caption(
+        f"Answer cache: {cache_stats['hits']} hits / {cache_stats['hits'] + cache_stats['misses']} lookups "
+        f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries"
+    )
+    search_stats = get_search_cache().stats()
+    st.sidebar.caption(
+        f"Search cache: {search_stats['hit_rate']:.0%} hit rate, "
+        f"{search_stats.get('coalesced', 0)} coalesced, {search_stats['entries']} entries"
+    )
+    prefetch_stats = PREFETCH_STATS.snapshot()
+    st.sidebar.caption(
+        f"Tool prefetch: {prefetch_stats.get('hits', 0)} / {prefetch_stats.get('issued', 0)} used "
+        f"({prefetch_stats['hit_rate']:.0%}), {prefetch_stats['saved_ms']:.0f} ms saved"
+    )
+    transcript_stats = get_transcripts().stats()
+    st.sidebar.caption(
+        f"Transcripts: {transcript_stats['sessions']} sessions, {transcript_stats['in_memory']} messages in memory, "
+        f"{transcript_stats['spilled']} on disk, {transcript_stats['evicted']} sessions evicted"
+    )
+    budget_stats = BUDGET_STATS.snapshot()
+    st.sidebar.caption(
+        f"Tool budget: {budget_stats.get('trimmed', 0)} / {budget_stats.get('results', 0)} results trimmed, "
+        f"{budget_stats['tokens_saved']} tokens saved"
+    )
+    if routing_enabled():
+        tiers = ROUTING_STATS.snapshot()["tiers"]
+        st.sidebar.caption("Model tiers: " + ", ".join(f"{t} {n}" for t, n in sorted(tiers.items())))
+    profile = PROMPT_PROFILES.session(st.session_state.session_id)
+    with st.sidebar.expander("Prompt size"):
+        if profile is None:
+            st.caption("No model requests in this session yet.")
+        else:
+            last = profile["last"]
+            st.caption(
+                f"Last request: {last['total']} tokens; mean {profile['mean_prompt']:.0f} "
+                f"over {profile['requests']} requests"
+            )
+            st.table({
+                "component": list(PROMPT_COMPONENTS),
+                "last": [last[c] for c in PROMPT_COMPONENTS],
+                "session": [profile["components"].get(c, 0) for c in PROMPT_COMPONENTS],
+            })
+            provider = profile["provider"]
+            st.caption(
+                f"Provider: {provider.get('input', 0)} input ({provider.get('cached', 0)} cached), "
+                f"{provider.get('output', 0)} output; {profile['prefix_breaks']} prefix breaks"
+            )
+        largest = PROMPT_PROFILES.top(3)
+        if largest:
+            st.caption("Largest sessions: " + ", ".join(f"{p['session']} {p['mean_prompt']:.0f}" for p in largest))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Headless HTTP API for the Grad Director chatbot.
+
+Serves the same graph, answer cache and turn deadline as the Streamlit app
+(run.py), without a browser session per conversation:
+
+    POST   /v1/sessions                 -> {"session_id": ...}
+    POST   /v1/sessions/{id}/messages   {"message": "...", "stream": true}
+    GET    /v1/sessions/{id}            -> {"session_id", "messages": [...]}
+    DELETE /v1/sessions/{id}
+    GET    /healthz, GET /stats
+
+With "stream": true the reply is a server-sent event stream:
+
+    event: token   data: {"text": "..."}        answer tokens as the model writes them
+    event: tool    data: {"name": "..."}        a tool call was started
+    event: done    data: {"answer": "...", "cached": false, "latency_ms": ...}
+    event: error   data: {"error": "...", "status": 504}
+
+otherwise it is one JSON object with answer, cached and latency_ms.
+
+Each worker runs at most SERVE_MAX_CONCURRENCY turns at once; up to
+SERVE_MAX_QUEUE more wait for a slot, for at most SERVE_QUEUE_TIMEOUT_S.
+Beyond that a turn is refused at once with 503 and Retry-After, so clients
+back off instead of piling up behind a slow model. A session runs one turn
+at a time (409 while busy).
+
+Sessions live in a SQLite file (SERVE_SESSION_DB) so every worker process
+sees them; idle sessions expire after SERVE_SESSION_TTL_S. With --workers N
+the parent loads the schedule spreadsheet and the knowledge-base index once,
+then forks N workers that share them copy-on-write and accept on the same
+listening socket.
+
+    python serve.py --port 8000 --workers 4
+    python serve.py --fake-llm-ms 200        # offline, FakeChatModel instead of OpenAI
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+import run
+from call_policy import DeadlineExceeded, turn_deadline
+from kb_index import get_kb_index
+from prompt_assembly import assemble_messages
+from tools import known_instructors, load_schedule
+from tracing import trace_config, turn_span
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="HTTP API for the Grad Director chatbot")
+    p.add_argument("--host", default=os.getenv("SERVE_HOST", "127.0.0.1"))
+    p.add_argument("--port", type=int, default=int(os.getenv("SERVE_PORT", "8000")))
+    p.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", "1")))
+    p.add_argument("--fake-llm-ms", type=float, default=None,
+                   help="answer with FakeChatModel after this many ms instead of calling OpenAI")
+    return p.parse_args(argv)
+
+
+class SessionStore:
+    """
+    Conversation history per session as [{"role", "content"}] in SQLite.
+    busy_until marks a turn in progress; claiming it is one UPDATE, so it
+    also holds across worker processes.
+    """
+
+    def __init__(self, path: str, ttl_s: float, turn_lease_s: float):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.turn_lease_s = turn_lease_s
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, history TEXT NOT NULL, "
+                         "updated REAL NOT NULL, busy_until REAL NOT NULL DEFAULT 0)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self) -> str:
+        sid = uuid.uuid4().hex
+        with self._conn() as conn:
+            conn.execute("INSERT INTO sessions (id, history, updated) VALUES (?, '[]', ?)", (sid, time.time()))
+        return sid
+
+    def history(self, sid: str) -> Optional[List[Dict[str, str]]]:
+        row = self._conn().execute("SELECT history FROM sessions WHERE id = ? AND updated > ?",
+                                   (sid, time.time() - self.ttl_s)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def claim(self, sid: str) -> bool:
+        """Start a turn; False if another turn of this session is running."""
+        now = time.time()
+        with self._conn() as conn:
+            cur = conn.execute("UPDATE sessions SET busy_until = ? WHERE id = ? AND busy_until < ?",
+                               (now + self.turn_lease_s, sid, now))
+        return cur.rowcount == 1
+
+    def finish(self, sid: str, new_messages: List[Dict[str, str]]) -> None:
+        """End the turn, appending new_messages (empty if the turn failed)."""
+        with self._conn() as conn:
+            if new_messages:
+                row = conn.execute("SELECT history FROM sessions WHERE id = ?", (sid,)).fetchone()
+                history = (json.loads(row[0]) if row else []) + new_messages
+                conn.execute("UPDATE sessions SET history = ?, updated = ?, busy_until = 0 WHERE id = ?",
+                             (json.dumps(history), time.time(), sid))
+            else:
+                conn.execute("UPDATE sessions SET busy_until = 0 WHERE id = ?", (sid,))
+
+    def delete(self, sid: str) -> bool:
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM sessions WHERE id = ?", (sid,)).rowcount == 1
+
+    def expire(self) -> int:
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM sessions WHERE updated < ? AND busy_until < ?",
+                                (time.time() - self.ttl_s, time.time())).rowcount
+
+
+class Overloaded(Exception):
+    pass
+
+
+class TurnSlots:
+    """At most max_concurrent turns running and max_queue waiting; the rest are refused."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout_s: float):
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self.running = 0
+        self.waiting = 0
+        self.served = 0
+        self.rejected = 0
+        self.queue_wait_s = 0.0
+
+    async def acquire(self) -> None:
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("queue full")
+        self.waiting += 1
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("queue timeout")
+        finally:
+            self.waiting -= 1
+        self.queue_wait_s += time.monotonic() - t0
+        self.running += 1
+
+    def release(self, served: bool = True) -> None:
+        self.running -= 1
+        self.served += served
+        self._sem.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": self.running, "waiting": self.waiting, "served": self.served,
+                "rejected": self.rejected,
+                "mean_queue_wait_ms": round(1000 * self.queue_wait_s / self.served, 3) if self.served else 0.0}
+
+
+_graph: Dict[str, Any] = {}
+
+
+def serve_graph():
+    """run.get_graph(), or a graph on FakeChatModel when SERVE_FAKE_LLM_MS is set."""
+    if "graph" not in _graph:
+        fake_ms = os.getenv("SERVE_FAKE_LLM_MS")
+        if fake_ms:
+            from fake_llm import FakeChatModel
+            from prefetch import prefetch_enabled
+            _graph["graph"] = run.build_graph(FakeChatModel(latency_s=float(fake_ms) / 1000.0),
+                                              fast_path=os.getenv("SCHEDULE_FAST_PATH", "1") != "0",
+                                              prefetch=prefetch_enabled())
+        else:
+            _graph["graph"] = run.get_graph()
+    return _graph["graph"]
+
+
+def warm() -> None:
+    """Load what the workers share before forking them."""
+    t0 = time.perf_counter()
+    load_schedule()
+    known_instructors()
+    kb = get_kb_index()
+    print(f"[serve] warmed schedule{' and kb index' if kb else ''} in "
+          f"{1000 * (time.perf_counter() - t0):.0f} ms", flush=True)
+
+
+def to_messages(history: List[Dict[str, str]], question: str) -> List[Any]:
+    prior = [HumanMessage(content=m["content"]) if m["role"] == "user" else AIMessage(content=m["content"])
+             for m in history]
+    return assemble_messages(prior + [HumanMessage(content=question)], question)
+
+
+async def run_turn(messages: List[Any], session: str) -> AsyncIterator[Dict[str, Any]]:
+    """Events of one turn: tool and token as they happen, then done."""
+    t0 = time.perf_counter()
+    with turn_span("http.turn", session=session) as turn:
+        question, cached = run.cached_answer(messages)
+        turn.set(cache_hit=cached is not None)
+        if cached is not None:
+            yield {"event": "done", "answer": cached, "cached": True,
+                   "latency_ms": round(1000 * (time.perf_counter() - t0), 1)}
+            return
+
+        state = None
+        config = trace_config({"metadata": {"session": session}})
+        with turn_deadline():
+            async for mode, data in serve_graph().astream({"messages": messages}, config=config,
+                                                          stream_mode=["messages", "values"]):
+                if mode == "values":
+                    state = data
+                    continue
+                chunk, _ = data
+                if not isinstance(chunk, (AIMessage, AIMessageChunk)):
+                    continue
+                for call in getattr(chunk, "tool_call_chunks", None) or chunk.tool_calls:
+                    if call.get("name"):
+                        yield {"event": "tool", "name": call["name"]}
+                if isinstance(chunk.content, str) and chunk.content and not chunk.tool_calls:
+                    yield {"event": "token", "text": chunk.content}
+        yield {"event": "done", "answer": run.final_answer(question, state), "cached": False,
+               "latency_ms": round(1000 * (time.perf_counter() - t0), 1)}
+
+
+def sse(event: Dict[str, Any]) -> str:
+    data = {k: v for k, v in event.items() if k != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(data)}\n\n"
+
+
+def error_status(exc: BaseException) -> int:
+    return 504 if isinstance(exc, DeadlineExceeded) else 500
+
+
+def build_app() -> Starlette:
+    store = SessionStore(os.getenv("SERVE_SESSION_DB", "serve_sessions.db"),
+                         ttl_s=float(os.getenv("SERVE_SESSION_TTL_S", str(24 * 3600))),
+                         turn_lease_s=float(os.getenv("TURN_DEADLINE_S", "90")) + 30)
+    holder: Dict[str, TurnSlots] = {}
+
+    def slots() -> TurnSlots:
+        # Created on first use, inside the worker's own event loop
+        if "slots" not in holder:
+            holder["slots"] = TurnSlots(int(os.getenv("SERVE_MAX_CONCURRENCY", "16")),
+                                        int(os.getenv("SERVE_MAX_QUEUE", "64")),
+                                        float(os.getenv("SERVE_QUEUE_TIMEOUT_S", "10")))
+        return holder["slots"]
+
+    def refused(reason: str) -> JSONResponse:
+        return JSONResponse({"error": f"server busy ({reason}), retry shortly"}, status_code=503,
+                            headers={"Retry-After": "1"})
+
+    async def create_session(request: Request):
+        return JSONResponse({"session_id": await asyncio.to_thread(store.create)}, status_code=201)
+
+    async def get_session(request: Request):
+        sid = request.path_params["sid"]
+        history = await asyncio.to_thread(store.history, sid)
+        if history is None:
+            return JSONResponse({"error": "unknown session"}, status_code=404)
+        return JSONResponse({"session_id": sid, "messages": history})
+
+    async def delete_session(request: Request):
+        if not await asyncio.to_thread(store.delete, request.path_params["sid"]):
+            return JSONResponse({"error": "unknown session"}, status_code=404)
+        return Response(status_code=204)
+
+    async def post_message(request: Request):
+        sid = request.path_params["sid"]
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            body = {}
+        question = str(body.get("message") or "").strip()
+        if not question:
+            return JSONResponse({"error": "message is required"}, status_code=400)
+        history = await asyncio.to_thread(store.history, sid)
+        if history is None:
+            return JSONResponse({"error": "unknown session"}, status_code=404)
+
+        try:
+            await slots().acquire()
+        except Overloaded as e:
+            print(f"[serve] refused session={sid[:8]} reason={e}", flush=True)
+            return refused(str(e))
+        if not await asyncio.to_thread(store.claim, sid):
+            slots().release(served=False)
+            return JSONResponse({"error": "a turn is already running for this session"}, status_code=409)
+
+        messages = to_messages(history, question)
+
+        async def events() -> AsyncIterator[Dict[str, Any]]:
+            # The history is saved before done goes out, so the client's next turn
+            # sees it. The finally block must not await: a client that disconnects
+            # mid-stream cancels this generator, and the slot and session are still
+            # released.
+            finished = False
+            try:
+                async for event in run_turn(messages, sid):
+                    if event["event"] == "done":
+                        await asyncio.to_thread(store.finish, sid, [
+                            {"role": "user", "content": question},
+                            {"role": "assistant", "content": event["answer"]},
+                        ])
+                        finished = True
+                    yield event
+            finally:
+                slots().release()
+                if not finished:
+                    store.finish(sid, [])
+
+        if body.get("stream"):
+            async def stream():
+                try:
+                    async for event in events():
+                        yield sse(event)
+                except Exception as e:
+                    print(f"[serve] turn failed session={sid[:8]}: {e!r}", flush=True)
+                    yield sse({"event": "error", "error": str(e) or type(e).__name__, "status": error_status(e)})
+            return StreamingResponse(stream(), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Worker": str(os.getpid())})
+
+        try:
+            done = [e async for e in events() if e["event"] == "done"][-1]
+        except Exception as e:
+            print(f"[serve] turn failed session={sid[:8]}: {e!r}", flush=True)
+            return JSONResponse({"error": str(e) or type(e).__name__}, status_code=error_status(e))
+        return JSONResponse({k: v for k, v in done.items() if k != "event"},
+                            headers={"X-Worker": str(os.getpid())})
+
+    async def healthz(request: Request):
+        return JSONResponse({"ok": True, "pid": os.getpid()})
+
+    async def stats(request: Request):
+        return JSONResponse({
+            "pid": os.getpid(),
+            "turns": slots().stats(),
+            "answer_cache": run.get_answer_cache().stats(),
+            "prefetch": run.PREFETCH_STATS.snapshot(),
+            "routing": run.ROUTING_STATS.snapshot(),
+            "tool_budget": run.BUDGET_STATS.snapshot(),
+        })
+
+    async def expire_sessions():
+        interval = float(os.getenv("SERVE_EXPIRE_INTERVAL_S", "300"))
+        while True:
+            await asyncio.sleep(interval)
+            removed = await asyncio.to_thread(store.expire)
+            if removed:
+                print(f"[serve] expired {removed} idle sessions", flush=True)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        serve_graph()
+        expire = asyncio.create_task(expire_sessions())
+        yield
+        expire.cancel()
+
+    return Starlette(routes=[
+        Route("/v1/sessions", create_session, methods=["POST"]),
+        Route("/v1/sessions/{sid}", get_session, methods=["GET"]),
+        Route("/v1/sessions/{sid}", delete_session, methods=["DELETE"]),
+        Route("/v1/sessions/{sid}/messages", post_message, methods=["POST"]),
+        Route("/healthz", healthz),
+        Route("/stats", stats),
+    ], lifespan=lifespan)
+
+
+def run_worker(sock: socket.socket) -> None:
+    config = uvicorn.Config(build_app(), log_level=os.getenv("SERVE_LOG_LEVEL", "warning"), access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.fake_llm_ms is not None:
+        os.environ["SERVE_FAKE_LLM_MS"] = str(args.fake_llm_ms)
+    warm()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    print(f"[serve] listening on http://{args.host}:{args.port} workers={args.workers}", flush=True)
+
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        run_worker(sock)
+        return
+
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(sock)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,19 @@
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
-from run import get_graph
+from llm_factory import make_chat_model
+from run import build_graph, get_graph, get_llm
+from model_router import make_tier_llms
+from eval_dataset import eval_rows, parse_shard, write_shard
 from dotenv import load_dotenv
 from prompt import REACT_SYSTEM_PROMPT, RESPONSE_CRITERIA_SYSTEM_PROMPT
 import os
+import time
 import pytest
-import pandas as pd
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 
-XLSX_PATH = "GPD_chatbot_eval.xlsx"
-MAX_ROWS_TO_TEST = 50
+# "app" is the graph as configured (routed when MODEL_ROUTING=1); "fast" and
+# "strong" force every turn to that tier, e.g. EVAL_TIERS=app,fast,strong
+EVAL_TIERS = [t.strip() for t in os.getenv("EVAL_TIERS", "app").split(",") if t.strip()]
+_tier_results = []
 
 # Load environment variables
 load_dotenv()
@@ -20,23 +24,19 @@ class CriteriaGrade(BaseModel):
     grade: bool = Field(description="Does the response meet the provided criteria?")
 
 
-# create evaluation LLM once
 api_key = os.getenv("OPENAI_API_KEY")
-criteria_eval_llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0.0,
-        openai_api_key=api_key
-    )
-criteria_eval_structured_llm = criteria_eval_llm.with_structured_output(CriteriaGrade)
+
+# Parsed once per file version and shared through the on-disk cache with other
+# workers; filtered by EVAL_TAGS and cut to this process's EVAL_SHARD (see eval_dataset.py)
+EVAL_ROWS = eval_rows()
 
 
-def _load_row_indices():
-    if not os.path.exists(XLSX_PATH):
-        return []
-    df = pd.read_excel(XLSX_PATH)
-    if "user_question" not in df.columns or "gpd_answer" not in df.columns:
-        return []
-    return list(range(min(MAX_ROWS_TO_TEST, len(df))))
+@pytest.fixture(scope="module")
+def criteria_eval_structured_llm():
+    # Built only in processes that run evals; shares the app's connection pool (llm_factory)
+    # The grader is not under a CallPolicy, so it keeps the SDK's own retries
+    criteria_eval_llm = make_chat_model(model="gpt-4o-mini", temperature=0.0, api_key=api_key)
+    return criteria_eval_llm.with_structured_output(CriteriaGrade)
 
 
 @pytest.fixture(scope="module")
@@ -44,15 +44,38 @@ def gpd_graph():
     return get_graph()
 
 
-@pytest.mark.parametrize("row_index", _load_row_indices())
-def test_graph_returns_ai_response_and_meets_criteria(gpd_graph, row_index):
-    # load the row data
-    df = pd.read_excel(XLSX_PATH)
-    if "user_question" not in df.columns or "gpd_answer" not in df.columns:
-        pytest.skip("Required columns 'user_question' or 'gpd_answer' missing")
-
-    user_question = str(df.iloc[row_index]["user_question"])
-    gpd_answer = str(df.iloc[row_index]["gpd_answer"])
+@pytest.fixture(scope="module")
+def tier_graphs(gpd_graph):
+    graphs = {"app": gpd_graph}
+    forced = [t for t in EVAL_TIERS if t != "app"]
+    if forced:
+        llms = make_tier_llms(api_key=api_key)
+        for tier in forced:
+            graphs[tier] = build_graph(get_llm(), tiers={tier: llms[tier]})
+    return graphs
+
+
+def _shard_name():
+    shard = parse_shard(os.getenv("EVAL_SHARD"))
+    worker = os.getenv("PYTEST_XDIST_WORKER", "main")
+    return f"{shard[0]}of{shard[1]}-{worker}" if shard else worker
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tier_report():
+    # This process's results; conftest merges every shard into EVAL_TIER_REPORT
+    # (quality/latency tradeoff per tier, dataset and tag) when the run ends
+    started = time.time()
+    yield
+    if _tier_results:
+        write_shard(_tier_results, started, time.time(), _shard_name())
+
+
+@pytest.mark.parametrize("tier", EVAL_TIERS)
+@pytest.mark.parametrize("row", EVAL_ROWS, ids=[r.id for r in EVAL_ROWS])
+def test_graph_returns_ai_response_and_meets_criteria(tier_graphs, criteria_eval_structured_llm, tier, row):
+    user_question = row.question
+    gpd_answer = row.answer
 
     # prepare messages for the graph
     system_msg = SystemMessage(content=REACT_SYSTEM_PROMPT)
@@ -60,7 +83,9 @@ def test_graph_returns_ai_response_and_meets_criteria(gpd_graph, row_index):
     initial_messages = [system_msg, human_msg]
 
     # invoke the graph
-    state = gpd_graph.invoke({"messages": initial_messages})
+    t0 = time.perf_counter()
+    state = tier_graphs[tier].invoke({"messages": initial_messages})
+    latency_s = time.perf_counter() - t0
 
     assert isinstance(state, dict), "Graph.invoke should return a dict-like state"
     assert "messages" in state, "Returned state missing 'messages'"
@@ -89,4 +114,15 @@ def test_graph_returns_ai_response_and_meets_criteria(gpd_graph, row_index):
     ])
 
     assert hasattr(eval_result, "grade"), "Evaluator returned no 'grade' field"
+    turn_ai = [m for m in state["messages"][len(initial_messages):] if isinstance(m, AIMessage)]
+    _tier_results.append({
+        "tier": tier,
+        "row": row.id,
+        "dataset": row.dataset,
+        "tags": list(row.tags),
+        "passed": bool(eval_result.grade),
+        "latency_s": latency_s,
+        "tokens": sum((m.usage_metadata or {}).get("total_tokens", 0) for m in turn_ai),
+        "models_used": [m.response_metadata.get("model_tier", "default") for m in turn_ai],
+    })
     assert eval_result.grade is True, f"Response did not meet criteria: {eval_result.justification}"
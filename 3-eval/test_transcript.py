@@ -0,0 +1,58 @@
+import os
+import stat
+
+import pytest
+
+from transcript import ASSISTANT, USER, TranscriptStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TranscriptStore(ram_turns=4, spill_dir=str(tmp_path / "spill"), ttl_s=60)
+
+
+def _fill(transcript, n):
+    for i in range(n):
+        transcript.append(USER if i % 2 == 0 else ASSISTANT, f"m{i} é")
+
+
+def test_spilled_turns_read_back_by_offset(store):
+    t = store.get("s1")
+    _fill(t, 11)
+    assert t.spilled > 0 and len(t) == 11
+    assert [x.text for x in t.turns()] == [f"m{i} é" for i in range(11)]
+    # Ranges that start inside the file, straddle the file and memory, and stay in memory
+    assert [x.text for x in t.turns(3, 5)] == ["m3 é", "m4 é"]
+    assert [x.text for x in t.turns(t.spilled - 1, t.spilled + 1)] == [f"m{t.spilled - 1} é", f"m{t.spilled} é"]
+    assert [x.text for x in t.turns(9)] == ["m9 é", "m10 é"]
+
+
+def test_spill_files_are_private(store):
+    t = store.get("s1")
+    _fill(t, 6)
+    assert stat.S_IMODE(os.stat(store.spill_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(t.spill_path).st_mode) == 0o600
+
+
+def test_stale_spill_files_cleared_at_startup(store):
+    t = store.get("s1")
+    _fill(t, 6)
+    dead = os.path.join(store.spill_dir, "999999999-gone.jsonl")
+    old = os.path.join(store.spill_dir, f"{os.getpid()}-old.jsonl")
+    for path in (dead, old):
+        open(path, "w").close()
+    os.utime(old, (0, 0))
+    TranscriptStore(spill_dir=store.spill_dir, ttl_s=60)
+    assert sorted(os.listdir(store.spill_dir)) == [os.path.basename(t.spill_path)]
+
+
+def test_model_history_is_a_bounded_window(store):
+    t = store.get("s1")
+    _fill(t, 11)
+    window = t.messages(last=4)
+    assert 0 < len(window) <= 4 and window[0].type == "human"
+    assert window[-1].content == "m10 é"
+    # The window start only moves every last // 2 messages
+    t.append(ASSISTANT, "m11 é")
+    assert t.messages(last=4)[0].content == window[0].content
+    assert len(t.messages(last=0)) == 12
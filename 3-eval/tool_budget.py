@@ -0,0 +1,279 @@
+"""
+Token budgets for tool results.
+
+A ToolMessage stays in the conversation for every later chatbot hop of the
+turn, so one oversized result (the whole semester schedule, long search
+snippets) is paid for again on each hop. budget_tool_node wraps a graph
+node that returns ToolMessages (ToolNode, the prefetch tools node, the
+fast-path router) and trims each result to fit:
+
+- a per-tool budget (TOOL_BUDGET_TOKENS, or TOOL_BUDGET_<TOOL>_TOKENS), and
+- a per-turn budget shared by all tool results since the last human
+  message (TOOL_TURN_BUDGET_TOKENS).
+
+Results that fit are left alone. For JSON lists of records the trimming
+steps are, in order: project each record onto the tool's useful fields and
+drop empty values, clip long string fields, keep the leading rows that fit
+and append a "more available" marker. Anything still too long (or not
+JSON) is clipped as text. Original and trimmed sizes are recorded in
+response_metadata["tool_budget"] on each ToolMessage.
+
+    TOOL_BUDGET                 0 to disable (default 1)
+    TOOL_BUDGET_TOKENS          per-result budget (default 1500)
+    TOOL_TURN_BUDGET_TOKENS     per-turn budget (default 4000)
+    TOOL_FIELDS_<TOOL>          comma-separated fields to keep when trimming
+"""
+import json
+import math
+import os
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage, ToolMessage
+from langgraph.utils.runnable import RunnableCallable
+
+# Fields worth keeping when a result has to be trimmed; whitespace in the
+# spreadsheet column names is ignored when matching
+DEFAULT_FIELDS = {
+    "query_course_schedule": [
+        "COURSE", "TITLE", "CRN", "SECT", "PRIMARY INSTRUCTOR LAST NAME", "SCHEDULE",
+        "BUILDING", "ROOM", "BEGIN TIME", "END TIME", "MODALITY TEXT",
+        "MON-IND", "TUE-IND", "WED-IND", "THU-IND", "FRI-IND",
+    ],
+    "tavily_search_results_json": ["url", "title", "content"],
+    "search_program_kb": ["source", "title", "text"],
+}
+
+# Every result keeps at least this much, even when the turn budget is spent
+MIN_TOKENS = 200
+MIN_FIELD_TOKENS = 40
+CLIP_MARK = " ...[clipped]"
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # tiktoken missing or its encoding file not downloadable: estimate
+        return None
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is None:
+        return math.ceil(len(text) / 4)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def clip_text(text: str, max_tokens: int) -> str:
+    """text cut to about max_tokens, with a marker if anything was cut."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens - count_tokens(CLIP_MARK), 0)
+    enc = _encoding()
+    if enc is None:
+        head = text[:keep * 4]
+    else:
+        head = enc.decode(enc.encode(text, disallowed_special=())[:keep])
+    return head + CLIP_MARK
+
+
+def budget_enabled() -> bool:
+    return os.getenv("TOOL_BUDGET", "1") != "0"
+
+
+def _env_key(tool_name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in tool_name).upper()
+
+
+def tool_budget(tool_name: str) -> int:
+    default = os.getenv("TOOL_BUDGET_TOKENS", "1500")
+    return int(os.getenv(f"TOOL_BUDGET_{_env_key(tool_name)}_TOKENS", default))
+
+
+def turn_budget() -> int:
+    return int(os.getenv("TOOL_TURN_BUDGET_TOKENS", "4000"))
+
+
+def tool_fields(tool_name: str) -> Optional[List[str]]:
+    raw = os.getenv(f"TOOL_FIELDS_{_env_key(tool_name)}")
+    if raw is not None:
+        return [f.strip() for f in raw.split(",") if f.strip()] or None
+    return DEFAULT_FIELDS.get(tool_name)
+
+
+def _norm(field: str) -> str:
+    return " ".join(str(field).split()).lower()
+
+
+def _empty(value: Any) -> bool:
+    return value is None or value == "" or (isinstance(value, float) and math.isnan(value))
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _project(rows: List[Dict], fields: Optional[List[str]]) -> List[Dict]:
+    wanted = {_norm(f) for f in fields} if fields else None
+    return [{k: v for k, v in row.items() if not _empty(v) and (wanted is None or _norm(k) in wanted)}
+            for row in rows]
+
+
+def _clip_fields(rows: List[Dict], max_tokens: int) -> Tuple[List[Dict], bool]:
+    clipped = False
+    out = []
+    for row in rows:
+        new = {}
+        for k, v in row.items():
+            if isinstance(v, str) and count_tokens(v) > max_tokens:
+                v = clip_text(v, max_tokens)
+                clipped = True
+            new[k] = v
+        out.append(new)
+    return out, clipped
+
+
+def _more_marker(total: int, kept: int) -> Dict[str, Any]:
+    return {"_more_available": total - kept,
+            "_note": f"Showing {kept} of {total} rows. Ask with a narrower query to see the others."}
+
+
+def _take_rows(rows: List[Dict], budget: int) -> List[Dict]:
+    """Leading rows that fit in budget together with the marker; at least one."""
+    reserve = count_tokens(_dumps(_more_marker(len(rows), len(rows)))) + 2
+    used, kept = 1, []
+    for row in rows:
+        cost = count_tokens(_dumps(row)) + 1
+        if kept and used + cost > budget - reserve:
+            break
+        kept.append(row)
+        used += cost
+    return kept
+
+
+def trim_content(content: str, budget: int, tool_name: str = "") -> Tuple[str, Dict[str, Any]]:
+    """
+    content trimmed to about budget tokens, and a record of what was done:
+    {"original_tokens", "tokens", "budget", "actions", and "rows": [total, kept]
+    for record lists}.
+    """
+    original = count_tokens(content)
+    info: Dict[str, Any] = {"original_tokens": original, "tokens": original, "budget": budget, "actions": []}
+    if original <= budget:
+        return content, info
+
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = None
+    if isinstance(data, list) and data and all(isinstance(r, dict) for r in data):
+        rows = _project(data, tool_fields(tool_name))
+        info["actions"].append("project")
+        text = _dumps(rows)
+        if count_tokens(text) > budget:
+            rows, clipped = _clip_fields(rows, max(MIN_FIELD_TOKENS, budget // len(rows)))
+            if clipped:
+                info["actions"].append("clip_fields")
+                text = _dumps(rows)
+        if count_tokens(text) > budget:
+            kept = _take_rows(rows, budget)
+            if len(kept) < len(rows):
+                info["actions"].append("truncate_rows")
+                text = _dumps(kept + [_more_marker(len(rows), len(kept))])
+            info["rows"] = [len(data), len(kept)]
+        else:
+            info["rows"] = [len(data), len(data)]
+        content = text
+
+    if count_tokens(content) > budget:
+        content = clip_text(content, budget)
+        info["actions"].append("clip_text")
+    info["tokens"] = count_tokens(content)
+    return content, info
+
+
+class BudgetStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Counter = Counter()
+
+    def add(self, info: Dict[str, Any]) -> None:
+        with self._lock:
+            self.counters["results"] += 1
+            self.counters["tokens_in"] += info["original_tokens"]
+            self.counters["tokens_out"] += info["tokens"]
+            if info["actions"]:
+                self.counters["trimmed"] += 1
+            for action in info["actions"]:
+                self.counters[action] += 1
+            if "rows" in info:
+                self.counters["rows_dropped"] += info["rows"][0] - info["rows"][1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self.counters)
+            out["tokens_saved"] = self.counters["tokens_in"] - self.counters["tokens_out"]
+            return out
+
+
+STATS = BudgetStats()
+
+
+def _message_tokens(m: ToolMessage) -> int:
+    info = m.response_metadata.get("tool_budget")
+    return info["tokens"] if info else count_tokens(str(m.content))
+
+
+def turn_tool_tokens(messages: List[Any]) -> int:
+    """Tokens of tool results since the last human message."""
+    used = 0
+    for m in reversed(messages):
+        if isinstance(m, HumanMessage):
+            break
+        if isinstance(m, ToolMessage):
+            used += _message_tokens(m)
+    return used
+
+
+def apply_budget(history: List[Any], new_messages: List[Any]) -> List[Any]:
+    """Trim the ToolMessages in new_messages given the turn so far in history."""
+    results = [m for m in new_messages if isinstance(m, ToolMessage) and isinstance(m.content, str)]
+    left = turn_budget() - turn_tool_tokens(history)
+    trimmed = {}
+    for i, m in enumerate(results):
+        share = max(MIN_TOKENS, left // (len(results) - i))
+        budget = min(tool_budget(m.name or ""), share)
+        content, info = trim_content(m.content, budget, m.name or "")
+        STATS.add(info)
+        left -= info["tokens"]
+        if info["actions"]:
+            rows = f" rows={info['rows'][0]}->{info['rows'][1]}" if "rows" in info else ""
+            print(f"[tool_budget] tool={m.name} tokens={info['original_tokens']}->{info['tokens']}"
+                  f"{rows} actions={','.join(info['actions'])}", flush=True)
+        metadata = {**m.response_metadata, "tool_budget": info}
+        trimmed[id(m)] = m.model_copy(update={"content": content, "response_metadata": metadata})
+    return [trimmed.get(id(m), m) for m in new_messages]
+
+
+def budget_tool_node(node: Any, name: str = "tools") -> Any:
+    """
+    Wrap a graph node whose update is {"messages": [...]} so the tool
+    results in it are trimmed to budget. Runs under invoke and ainvoke.
+    """
+    if not budget_enabled():
+        return node
+
+    def run(state, config):
+        out = node.invoke(state, config)
+        return {**out, "messages": apply_budget(state["messages"], out["messages"])}
+
+    async def arun(state, config):
+        out = await node.ainvoke(state, config)
+        return {**out, "messages": apply_budget(state["messages"], out["messages"])}
+
+    return RunnableCallable(run, arun, name=name)
@@ -1,13 +1,24 @@
 from typing import Any, Dict, List, Optional, TypedDict
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel, Field
+import asyncio
+import contextvars
+import inspect
 import os
+import threading
 import pandas as pd
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain.schema.messages import ToolMessage  
 from langchain.tools import tool
+from langchain_core.tools import StructuredTool
 from langgraph.prebuilt.tool_node import ToolNode
 from langchain_community.tools.tavily_search import TavilySearchResults
 
+from search_cache import cached_search_tool
+from call_policy import guarded_search_tool
+from tracing import span
+from kb_index import get_kb_index
+
 
 XLSX_PATH = "VCU-CMSC-202610-FA2025.xlsx"
 
@@ -15,15 +26,70 @@ XLSX_PATH = "VCU-CMSC-202610-FA2025.xlsx"
 def get_tavily_tool():
     tavily_key = os.getenv("TAVILY_API_KEY", "")
     tool = TavilySearchResults(max_results=2) if tavily_key else None
-    return tool
+    # Identical queries within the TTL are served from the shared search cache;
+    # misses run under the search call policy and circuit breaker
+    return cached_search_tool(guarded_search_tool(tool))
+
+# Columns that are useful to the model and user
+SCHEDULE_COLUMNS = [
+    'COURSE',
+    'TITLE',
+    'CRN',
+    'SECT',
+    'PRIMARY\nINSTRUCTOR\nLAST NAME',
+    'SCHEDULE',
+    'BUILDING',
+    'ROOM',
+    'BEGIN\nTIME',
+    'END\nTIME',
+    'MODALITY\nTEXT',
+    'MAX\nCREDITS',
+    'ACTUAL\nENROLLMENT',
+    'MAX\nSIZE',
+    'MON-IND',
+    'TUE-IND',
+    'WED-IND',
+    'THU-IND',
+    'FRI-IND',
+]
+
+_schedule_lock = threading.Lock()
+_schedule_cache: Dict[str, Any] = {}
+
+
+def load_schedule() -> pd.DataFrame:
+    """
+    Parse the schedule spreadsheet once and reuse it until the file changes.
+    Callers must treat the returned frame as read-only.
+    """
+    st = os.stat(XLSX_PATH)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _schedule_lock:
+        if _schedule_cache.get("stamp") != stamp:
+            df = pd.read_excel(XLSX_PATH)
+            existing_cols = [c for c in SCHEDULE_COLUMNS if c in df.columns]
+            if existing_cols:
+                df = df[existing_cols]
+            _schedule_cache.update(stamp=stamp, df=df, instructors=None)
+        return _schedule_cache["df"]
+
+
+def known_instructors() -> List[str]:
+    """Distinct instructor last names in the schedule."""
+    df = load_schedule()
+    with _schedule_lock:
+        if _schedule_cache.get("instructors") is None:
+            col = "PRIMARY\nINSTRUCTOR\nLAST NAME"
+            names = df[col].dropna() if col in df.columns else []
+            _schedule_cache["instructors"] = sorted({str(n).strip() for n in names if str(n).strip()})
+        return _schedule_cache["instructors"]
 
 class CourseScheduleArgs(BaseModel):
     course: Optional[str] = Field(None, description="Course code prefix or full code, e.g., 'CMSC691'")
     instructor: Optional[str] = Field(None, description="Instructor last name, e.g., 'Damevski'")
     max_rows: Optional[int] = Field(None, description="If set, cap the number of returned rows.")
 
-@tool(args_schema=CourseScheduleArgs)
-def query_course_schedule(course: Optional[str] = None,
+def _query_course_schedule(course: Optional[str] = None,
                           instructor: Optional[str] = None,
                           max_rows: Optional[int] = None) -> List[Dict[str, Any]]:
     """
@@ -34,53 +100,96 @@ def query_course_schedule(course: Optional[str] = None,
     - If no filter is provided, or filters yield zero matches, return the entire schedule.
     - Optionally cap the number of returned rows via max_rows.
     """
-    df = pd.read_excel(XLSX_PATH)
-
-    # Keep columns that are useful to the model and user
-    keep_cols = [
-        'COURSE',
-        'TITLE',
-        'CRN',
-        'SECT',
-        'PRIMARY\nINSTRUCTOR\nLAST NAME',
-        'SCHEDULE',
-        'BUILDING',
-        'ROOM',
-        'BEGIN\nTIME',
-        'END\nTIME',
-        'MODALITY\nTEXT',
-        'MAX\nCREDITS',
-        'ACTUAL\nENROLLMENT',
-        'MAX\nSIZE',
-        'MON-IND',
-        'TUE-IND',
-        'WED-IND',
-        'THU-IND',
-        'FRI-IND',
-    ]
-    
-    existing_cols = [c for c in keep_cols if c in df.columns]
-    if existing_cols:
-        df = df[existing_cols]
-
-    # Apply filters if given
-    filtered = df
-    applied_filter = False
-    if course:
-        filtered = filtered[filtered["COURSE"].str.contains(course, case=False, na=False)]
-        applied_filter = True
-    if instructor:
-        filtered = filtered[filtered["PRIMARY\nINSTRUCTOR\nLAST NAME"].str.contains(instructor, case=False, na=False)]
-        applied_filter = True
-
-    # Decide what to return
-    if applied_filter and not filtered.empty:
-        out = filtered
-    else:
-        # Either no filters or no matches, return full schedule
-        out = df
-
-    if max_rows is not None:
-        out = out.head(max_rows)
-
-    return out.to_dict(orient="records")
\ No newline at end of file
+    df = load_schedule()
+
+    with span("schedule.filter") as s:
+        # Apply filters if given
+        filtered = df
+        applied_filter = False
+        if course:
+            filtered = filtered[filtered["COURSE"].str.contains(course, case=False, na=False)]
+            applied_filter = True
+        if instructor:
+            filtered = filtered[filtered["PRIMARY\nINSTRUCTOR\nLAST NAME"].str.contains(instructor, case=False, na=False)]
+            applied_filter = True
+
+        # Decide what to return
+        if applied_filter and not filtered.empty:
+            out = filtered
+        else:
+            # Either no filters or no matches, return full schedule
+            out = df
+
+        if max_rows is not None:
+            out = out.head(max_rows)
+
+        s.set(rows=len(out), matched=applied_filter and not filtered.empty)
+        return out.to_dict(orient="records")
+
+
+# pandas work for async callers runs here instead of on the event loop
+_schedule_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SCHEDULE_WORKERS", "4")), thread_name_prefix="schedule"
+)
+
+
+async def _aquery_course_schedule(course: Optional[str] = None,
+                                  instructor: Optional[str] = None,
+                                  max_rows: Optional[int] = None) -> List[Dict[str, Any]]:
+    loop = asyncio.get_running_loop()
+    # Carry the turn's deadline and trace span into the worker thread
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _schedule_executor, ctx.run, _query_course_schedule, course, instructor, max_rows
+    )
+
+
+query_course_schedule = StructuredTool.from_function(
+    func=_query_course_schedule,
+    coroutine=_aquery_course_schedule,
+    name="query_course_schedule",
+    description=inspect.getdoc(_query_course_schedule),
+    args_schema=CourseScheduleArgs,
+)
+
+
+class ProgramKBArgs(BaseModel):
+    query: str = Field(..., description="What to look up, e.g., 'credits required for the MS thesis option'")
+    k: int = Field(3, description="Number of passages to return.")
+
+
+def _search_program_kb(query: str, k: int = 3) -> Any:
+    """
+    Search the local knowledge base of VCU CS graduate program policies and
+    past advisor answers: deadlines, credit and GPA requirements, funding,
+    course substitutions. Much faster than web search; try it first for
+    program questions.
+    """
+    index = get_kb_index()
+    hits = index.search(query, max(1, min(k, 10))) if index is not None else []
+    min_score = float(os.getenv("KB_MIN_SCORE", "1.0"))
+    hits = [h for h in hits if h["score"] >= min_score]
+    if not hits:
+        return "No matching entries in the local knowledge base."
+    return hits
+
+
+async def _asearch_program_kb(query: str, k: int = 3) -> Any:
+    # Memory-mapped lookups take well under a millisecond; no thread hop needed
+    return _search_program_kb(query, k)
+
+
+search_program_kb = StructuredTool.from_function(
+    func=_search_program_kb,
+    coroutine=_asearch_program_kb,
+    name="search_program_kb",
+    description=inspect.getdoc(_search_program_kb),
+    args_schema=ProgramKBArgs,
+)
+
+
+def get_kb_tool():
+    """search_program_kb once `python kb_index.py build` has written an index; KB_TOOL=0 disables it."""
+    if os.getenv("KB_TOOL", "1") == "0" or get_kb_index() is None:
+        return None
+    return search_program_kb
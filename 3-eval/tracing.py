@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Per-turn tracing spans with a local exporter.
+
+Each chat turn (Streamlit or Discord) is one trace, and its turn ID is the
+trace ID. Spans under it cover:
+
+- graph nodes (router, chatbot, tools), from TracingCallback;
+- LLM calls, with token counts (input, output, cached input) that roll up
+  into the node and turn spans;
+- tool calls, with a hash of their arguments;
+- anything wrapped in span(), e.g. the pandas filter in
+  query_course_schedule and MCPClient.call_tool_text.
+
+Records use OpenTelemetry's span fields (traceId, spanId, parentSpanId,
+kind, start/end in Unix nanoseconds, status, attributes as a flat dict,
+gen_ai.* token attributes), so they can be converted to OTLP later. They
+are written by a background thread to a JSONL file or an SQLite database,
+so no collector is needed.
+
+    TRACE_EXPORTER   jsonl, sqlite, or none (default none)
+    TRACE_PATH       output file (default traces.jsonl / traces.db)
+
+Summarize a trace file by span name:
+
+    python tracing.py summarize traces.jsonl
+    python tracing.py summarize traces.db --json
+"""
+import argparse
+import atexit
+import contextvars
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import summarize
+
+TOKEN_ATTRS = ("gen_ai.usage.input_tokens", "gen_ai.usage.output_tokens", "gen_ai.usage.cached_tokens")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent", "name", "kind", "start_ns", "attributes", "status")
+
+    def __init__(self, name: str, parent: Optional["Span"], kind: str = "internal",
+                 trace_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id or (parent.trace_id if parent else uuid.uuid4().hex)
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add_tokens(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> None:
+        """Count tokens on this span and every span above it."""
+        s: Optional[Span] = self
+        while s is not None:
+            for key, n in zip(TOKEN_ATTRS, (input_tokens, output_tokens, cached_tokens)):
+                s.attributes[key] = s.attributes.get(key, 0) + n
+            s = s.parent
+
+    def fail(self, error: BaseException) -> None:
+        self.status = "error"
+        self.attributes["exception.type"] = type(error).__name__
+        self.attributes["exception.message"] = str(error)[:200]
+
+    def record(self, end_ns: int) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent.span_id if self.parent else "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": end_ns,
+            "durationMs": round((end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "turnId": self.trace_id,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def add_tokens(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> None:
+        pass
+
+
+NOOP = _NoopSpan()
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+
+
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, records: List[Dict[str, Any]]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+
+
+class SqliteExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+
+    def export(self, records: List[Dict[str, Any]]) -> None:
+        if self._db is None:
+            # Opened on the writer thread, which is the only one using it
+            self._db = sqlite3.connect(self.path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS spans (trace_id TEXT, span_id TEXT PRIMARY KEY, "
+                "parent_span_id TEXT, name TEXT, kind TEXT, start_ns INTEGER, end_ns INTEGER, "
+                "duration_ms REAL, status TEXT, attributes TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS spans_trace ON spans (trace_id)")
+        self._db.executemany(
+            "INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(r["traceId"], r["spanId"], r["parentSpanId"], r["name"], r["kind"], r["startTimeUnixNano"],
+              r["endTimeUnixNano"], r["durationMs"], r["status"], json.dumps(r["attributes"], default=str))
+             for r in records],
+        )
+        self._db.commit()
+
+
+class SpanWriter:
+    """Hands finished spans to the exporter on a background thread."""
+
+    def __init__(self, exporter: Any, batch: int = 256):
+        self.exporter = exporter
+        self.batch = batch
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, record: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Tracing never slows a turn down; the span is lost instead
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            records = [item] if item is not None else []
+            while item is not None and len(records) < self.batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    records.append(item)
+            if records:
+                try:
+                    self.exporter.export(records)
+                except Exception as e:
+                    print(f"[tracing] export failed: {e!r}", flush=True)
+            if item is None:
+                return
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+def make_exporter(kind: str, path: Optional[str] = None) -> Any:
+    if kind == "jsonl":
+        return JsonlExporter(path or "traces.jsonl")
+    if kind == "sqlite":
+        return SqliteExporter(path or "traces.db")
+    raise ValueError(f"unknown TRACE_EXPORTER {kind!r}")
+
+
+_writer: Optional[SpanWriter] = None
+_writer_lock = threading.Lock()
+
+
+def tracing_enabled() -> bool:
+    return os.getenv("TRACE_EXPORTER", "none").lower() not in ("", "none", "0")
+
+
+def get_writer() -> Optional[SpanWriter]:
+    global _writer
+    if not tracing_enabled():
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = SpanWriter(make_exporter(os.getenv("TRACE_EXPORTER", "").lower(),
+                                               os.getenv("TRACE_PATH") or None))
+        return _writer
+
+
+def _finish(s: Span) -> None:
+    writer = get_writer()
+    if writer is not None:
+        writer.put(s.record(time.time_ns()))
+
+
+@contextmanager
+def _open_span(s: Span) -> Iterator[Span]:
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        _finish(s)
+
+
+@contextmanager
+def turn_span(name: str, turn_id: Optional[str] = None, **attributes: Any) -> Iterator[Any]:
+    """Root span for one chat turn; turn_id (a 32-hex trace ID) is generated if not given."""
+    if not tracing_enabled():
+        yield NOOP
+        return
+    with _open_span(Span(name, None, kind="server", trace_id=turn_id, attributes=attributes)) as s:
+        yield s
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes: Any) -> Iterator[Any]:
+    """Child span of the current one; a no-op outside a traced turn."""
+    parent = _current.get()
+    if parent is None or not tracing_enabled():
+        yield NOOP
+        return
+    with _open_span(Span(name, parent, kind=kind, attributes=attributes)) as s:
+        yield s
+
+
+def current_turn_id() -> Optional[str]:
+    s = _current.get()
+    return s.trace_id if s else None
+
+
+def args_hash(args: Any) -> str:
+    """Short stable hash of tool arguments, so spans don't carry user text."""
+    if isinstance(args, str):
+        try:
+            args = json.loads(args)
+        except ValueError:
+            pass
+    text = json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class TracingCallback(BaseCallbackHandler):
+    """
+    Turns LangChain/LangGraph callbacks into spans: the graph run, each node,
+    each LLM call and each tool call. Runs in between (routers, wrappers)
+    are not recorded; their children attach to the nearest recorded span.
+    """
+
+    # Called on the caller's thread or task, so _current follows the spans
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, Optional[Span]] = {}
+        self._own: Dict[UUID, Span] = {}
+
+    def _parent(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        if parent_run_id is not None and parent_run_id in self._runs:
+            return self._runs[parent_run_id]
+        return _current.get()
+
+    def _start(self, run_id: UUID, parent: Optional[Span], name: Optional[str],
+               kind: str = "internal", **attributes: Any) -> None:
+        if name is None or parent is None:
+            # Not recorded: children attach to the parent (or nothing, outside a turn)
+            self._runs[run_id] = parent
+            return
+        s = Span(name, parent, kind=kind, attributes=attributes)
+        self._runs[run_id] = s
+        self._own[run_id] = s
+        _current.set(s)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Span]:
+        parent = self._runs.pop(run_id, None)
+        s = self._own.pop(run_id, None)
+        if s is None:
+            return None
+        if error is not None:
+            s.fail(error)
+        _current.set(s.parent)
+        _finish(s)
+        return s
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None,
+                       metadata=None, **kwargs):
+        parent = self._parent(parent_run_id)
+        name = kwargs.get("name")
+        node = (metadata or {}).get("langgraph_node")
+        span_name = None
+        if parent_run_id is None and node is None:
+            span_name = "graph"
+        elif node is not None and name == node and not (parent and parent.name == f"node.{node}"):
+            # Wrapper nodes (budget, prefetch) and the ToolNode inside share a name; one span
+            span_name = f"node.{node}"
+        self._start(run_id, parent, span_name)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None,
+                            **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or (metadata or {}).get("ls_model_name")
+        self._start(run_id, self._parent(parent_run_id), "llm", kind="client",
+                    **{"gen_ai.request.model": model or "unknown"})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, self._parent(parent_run_id), "llm", kind="client")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        s = self._own.get(run_id)
+        if s is not None:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            if not usage:
+                for gens in response.generations:
+                    for g in gens:
+                        meta = getattr(getattr(g, "message", None), "usage_metadata", None) or {}
+                        usage = {"prompt_tokens": meta.get("input_tokens", 0),
+                                 "completion_tokens": meta.get("output_tokens", 0),
+                                 "prompt_tokens_details": {
+                                     "cached_tokens": (meta.get("input_token_details") or {}).get("cache_read", 0)}}
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+            s.add_tokens(int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0), int(cached))
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, inputs=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, self._parent(parent_run_id), f"tool.{name}", kind="client",
+                    **{"tool.name": name, "tool.args_hash": args_hash(inputs if inputs is not None else input_str)})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
+def trace_config(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """config for graph.invoke/ainvoke with a tracing callback added when tracing is on."""
+    config = dict(config or {})
+    if tracing_enabled():
+        config["callbacks"] = list(config.get("callbacks") or []) + [TracingCallback()]
+    return config
+
+
+def load_spans(path: str) -> List[Dict[str, Any]]:
+    if path.endswith(".db") or path.endswith(".sqlite"):
+        db = sqlite3.connect(path)
+        try:
+            rows = db.execute("SELECT name, duration_ms, status, attributes FROM spans").fetchall()
+        finally:
+            db.close()
+        return [{"name": n, "durationMs": d, "status": s, "attributes": json.loads(a or "{}")}
+                for n, d, s, a in rows]
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize_spans(spans: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Latency percentiles, error count and mean tokens per span name."""
+    by_name: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for s in spans:
+        by_name[s["name"]].append(s)
+    out = {}
+    for name, group in sorted(by_name.items()):
+        row: Dict[str, Any] = summarize(s["durationMs"] / 1000.0 for s in group)
+        row["errors"] = sum(1 for s in group if s["status"] == "error")
+        for key in TOKEN_ATTRS:
+            counts = [s["attributes"][key] for s in group if key in s["attributes"]]
+            if counts:
+                row[key.rsplit(".", 1)[-1]] = round(sum(counts) / len(counts), 1)
+        out[name] = row
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Summarize exported trace spans")
+    sub = p.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("summarize", help="p50/p95 latency by span name")
+    s.add_argument("path", nargs="?", default=os.getenv("TRACE_PATH", "traces.jsonl"))
+    s.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = p.parse_args(argv)
+
+    summary = summarize_spans(load_spans(args.path))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{'span':<36} {'count':>6} {'p50_ms':>10} {'p95_ms':>10} {'errors':>6} {'in_tok':>8} {'out_tok':>8} "
+          f"{'cached':>8}")
+    for name, row in summary.items():
+        print(f"{name:<36} {row['count']:>6} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f} {row['errors']:>6} "
+              f"{row.get('input_tokens', ''):>8} {row.get('output_tokens', ''):>8} {row.get('cached_tokens', ''):>8}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        # now may predate `updated` when the caller read the clock before creating the bucket
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, now: Optional[float] = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class AdmissionController:
+    """
+    Decides whether an incoming Discord message may reach the LLM.
+
+    A message must pass its channel's and its author's token buckets and then
+    fit into a bounded backlog queue. A dispatcher drains the queue, and the
+    `slots` semaphore caps how many graph runs are in flight at once.
+    Anything rejected is "shed" and should get a canned busy reply instead.
+    A rate <= 0 disables that bucket.
+    """
+
+    # Bucket maps are pruned of idle (full) buckets past this many entries
+    MAX_BUCKETS = 10_000
+
+    def __init__(self,
+                 channel_rate: float,
+                 channel_burst: float,
+                 author_rate: float,
+                 author_burst: float,
+                 max_concurrency: int,
+                 max_backlog: int):
+        self.channel_rate, self.channel_burst = channel_rate, channel_burst
+        self.author_rate, self.author_burst = author_rate, author_burst
+        self.max_concurrency = max_concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_backlog)
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self._channel_buckets: Dict[str, TokenBucket] = {}
+        self._author_buckets: Dict[str, TokenBucket] = {}
+        self.admitted = 0
+        self.in_flight = 0
+        self.shed: Counter = Counter()
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], key: str, rate: float, burst: float) -> TokenBucket:
+        if key not in buckets:
+            if len(buckets) >= self.MAX_BUCKETS:
+                now = time.monotonic()
+                for k in [k for k, b in buckets.items() if b.is_full(now)]:
+                    del buckets[k]
+            buckets[key] = TokenBucket(rate, burst)
+        return buckets[key]
+
+    def check(self, channel: str, author: str) -> Optional[str]:
+        """Return None if the message passes rate limits, else the shed reason."""
+        now = time.monotonic()
+        if self.channel_rate > 0:
+            if not self._bucket(self._channel_buckets, channel, self.channel_rate, self.channel_burst).try_take(now):
+                return "channel_rate"
+        if self.author_rate > 0 and author:
+            if not self._bucket(self._author_buckets, author, self.author_rate, self.author_burst).try_take(now):
+                return "author_rate"
+        return None
+
+    def offer(self, channel: str, author: str, job: Any) -> Optional[str]:
+        """Rate-limit and enqueue job. Returns None if accepted, else the shed reason."""
+        reason = self.check(channel, author)
+        if reason is None:
+            try:
+                self.queue.put_nowait(job)
+            except asyncio.QueueFull:
+                reason = "backlog_full"
+        if reason is None:
+            self.admitted += 1
+        else:
+            self.shed[reason] += 1
+        return reason
+
+    def record_shed(self, reason: str) -> None:
+        # For requests dropped after admission, e.g. provider 429s
+        self.shed[reason] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "shed_total": sum(self.shed.values()),
+        }
@@ -0,0 +1,222 @@
+"""
+Answer cache for repeated standalone student questions.
+
+Questions are normalized (case, punctuation, course codes, stopwords) and
+matched with TF-IDF cosine similarity over word unigrams and bigrams,
+computed locally. Course codes and question words must match exactly, so
+"When does CMSC 691 meet?" never answers "Where does CMSC 691 meet?".
+Entries expire after a TTL, the least recently used entry is evicted when
+the cache is full, and everything is dropped when the content version
+(system prompt, schedule data) changes.
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "i", "me", "my",
+    "we", "our", "you", "your", "can", "could", "would", "should", "will", "to", "of", "in",
+    "on", "for", "at", "by", "with", "about", "and", "or", "please", "tell", "know", "want",
+    "there", "any", "vcu", "hi", "hello", "s", "t",
+}
+
+# Kept in the key: they decide what is being asked about the same subject
+INTERROGATIVES = {"who", "whom", "whose", "what", "when", "where", "which", "why", "how"}
+ALIASES = {"whats": "what"}
+
+# Words that make a question depend on earlier turns; such questions are never cached
+ANAPHORA = {
+    "it", "its", "that", "this", "these", "those", "they", "them", "their", "he", "she",
+    "him", "her", "his", "hers", "same", "above", "previous", "again", "else", "also",
+}
+
+_COURSE_CODE = re.compile(r"\b([a-z]{4})\s*-?\s*(\d{3})\b")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    text = _COURSE_CODE.sub(r"\1\2", text.lower())
+    return _WORD.findall(text)
+
+
+def _stem(word: str) -> str:
+    # Crude suffix stripping so "teaches"/"teaching" and "deadline(s)" match
+    if len(word) <= 4 or word[-1].isdigit():
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if word.endswith("ing") and len(word) > 5:
+        return word[:-3]
+    if word.endswith("ed"):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize(text: str) -> List[str]:
+    return [_stem(ALIASES.get(t, t)) for t in tokenize(text) if t not in STOPWORDS]
+
+
+def exact_keys(tokens: List[str]) -> Set[str]:
+    """Tokens that must match exactly: course codes, years and question words."""
+    return {t for t in tokens if t in INTERROGATIVES or any(ch.isdigit() for ch in t)}
+
+
+def is_standalone(question: str) -> bool:
+    """True if the question can be answered without earlier turns."""
+    words = tokenize(question)
+    content = [t for t in normalize(question) if t not in INTERROGATIVES]
+    return len(content) >= 2 and not any(w in ANAPHORA for w in words)
+
+
+def content_version(*parts: str, paths: Iterable[str] = ()) -> str:
+    """Hash of prompt text and data-file stats; changes whenever either does."""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+    for path in paths:
+        try:
+            st = os.stat(path)
+            h.update(f"{path}:{st.st_mtime_ns}:{st.st_size}".encode("utf-8"))
+        except OSError:
+            h.update(f"{path}:missing".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _features(tokens: List[str]) -> Counter:
+    return Counter(tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])])
+
+
+class _Entry:
+    __slots__ = ("answer", "features", "keys", "created")
+
+    def __init__(self, answer: str, features: Counter, keys: Set[str], created: float):
+        self.answer = answer
+        self.features = features
+        self.keys = keys
+        self.created = created
+
+
+class AnswerCache:
+    """Thread-safe; one instance can be shared by every session in a process."""
+
+    def __init__(self, version: str = "", max_entries: int = 512, ttl_s: float = 6 * 3600,
+                 threshold: float = 0.85):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._postings: Dict[str, Set[str]] = {}
+        self._df: Counter = Counter()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def ensure_version(self, version: str) -> None:
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._entries.clear()
+                self._postings.clear()
+                self._df.clear()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        for f in entry.features:
+            self._df[f] -= 1
+            if self._df[f] <= 0:
+                del self._df[f]
+            posting = self._postings.get(f)
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self._postings[f]
+
+    def _cosine(self, a: Counter, b: Counter) -> float:
+        n = len(self._entries) + 1
+        idf = lambda f: math.log((n + 1) / (self._df.get(f, 0) + 1)) + 1.0
+        dot = sum(a[f] * b[f] * idf(f) ** 2 for f in a.keys() & b.keys())
+        na = math.sqrt(sum((v * idf(f)) ** 2 for f, v in a.items()))
+        nb = math.sqrt(sum((v * idf(f)) ** 2 for f, v in b.items()))
+        return dot / (na * nb) if na and nb else 0.0
+
+    def lookup(self, question: str) -> Optional[str]:
+        if not is_standalone(question):
+            self.skipped += 1
+            return None
+        tokens = normalize(question)
+        key = " ".join(tokens)
+        features = _features(tokens)
+        keys = exact_keys(tokens)
+        now = time.time()
+        with self._lock:
+            best_key, best_score = None, 0.0
+            if key in self._entries:
+                best_key, best_score = key, 1.0
+            else:
+                candidates = set()
+                for f in features:
+                    candidates |= self._postings.get(f, set())
+                for cand in candidates:
+                    entry = self._entries[cand]
+                    if entry.keys != keys:
+                        continue
+                    score = self._cosine(features, entry.features)
+                    if score > best_score:
+                        best_key, best_score = cand, score
+            if best_key is not None and best_score >= self.threshold:
+                entry = self._entries[best_key]
+                if now - entry.created <= self.ttl_s:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    return entry.answer
+                self._remove(best_key)
+            self.misses += 1
+            return None
+
+    def store(self, question: str, answer: str) -> None:
+        if not answer or not is_standalone(question):
+            return
+        tokens = normalize(question)
+        key = " ".join(tokens)
+        features = _features(tokens)
+        keys = exact_keys(tokens)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = _Entry(answer, features, keys, time.time())
+            for f in features:
+                self._df[f] += 1
+                self._postings.setdefault(f, set()).add(key)
+
+    def clear(self) -> int:
+        """Drop every entry; returns how many there were."""
+        with self._lock:
+            n = len(self._entries)
+            self._entries.clear()
+            self._postings.clear()
+            self._df.clear()
+            return n
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "version": self.version,
+        }
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark: many conversations through one graph in one process.
+
+"threads" runs each turn as asyncio.to_thread(GRAPH.invoke), which is how the
+Discord frontend used to call the graph; "async" awaits GRAPH.ainvoke. The
+model is FakeChatModel, so the numbers isolate graph and tool overhead from
+provider latency.
+
+    python bench_async.py --conversations 50 --turns 3 --llm-latency-ms 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-bench")
+os.environ.pop("TAVILY_API_KEY", None)
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from fake_llm import FakeChatModel
+from graph import build_graph
+from prompt_assembly import assemble_messages
+from metrics import summarize
+
+QUESTIONS = [
+    "Who teaches CMSC 691?",
+    "Should I take CMSC 691 or CMSC 603 first?",
+    "What classes does Damevski teach?",
+    "What AI courses are available next semester?",
+    "When does CMSC 603 meet?",
+]
+
+
+async def conversation(graph, mode: str, idx: int, turns: int, latencies: List[float]) -> None:
+    history: List = []
+    for t in range(turns):
+        human = HumanMessage(content=QUESTIONS[(idx + t) % len(QUESTIONS)])
+        prior = assemble_messages(history, human.content)
+        t0 = time.perf_counter()
+        if mode == "async":
+            state = await graph.ainvoke({"messages": prior})
+        else:
+            state = await asyncio.to_thread(graph.invoke, {"messages": prior})
+        latencies.append(time.perf_counter() - t0)
+        history += [human, AIMessage(content=state["messages"][-1].content)]
+
+
+async def run_mode(graph, mode: str, conversations: int, turns: int) -> Dict:
+    latencies: List[float] = []
+    peak_threads = threading.active_count()
+    done = asyncio.Event()
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while not done.is_set():
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample_threads())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(conversation(graph, mode, i, turns, latencies) for i in range(conversations)))
+    wall = time.perf_counter() - t0
+    done.set()
+    await sampler
+    return {
+        "wall_s": round(wall, 3),
+        "turns_per_s": round(len(latencies) / wall, 2),
+        "turn_latency": summarize(latencies),
+        "peak_threads": peak_threads,
+    }
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark sync-in-threads vs async graph execution")
+    p.add_argument("--conversations", type=int, default=50)
+    p.add_argument("--turns", type=int, default=3)
+    p.add_argument("--llm-latency-ms", type=float, default=500.0)
+    p.add_argument("--modes", default="threads,async")
+    p.add_argument("--out", default="", help="Write the JSON report here")
+    return p.parse_args()
+
+
+async def main(args) -> Dict:
+    graph = build_graph(llm=FakeChatModel(latency_s=args.llm_latency_ms / 1000.0))
+    report: Dict = {"meta": {
+        "conversations": args.conversations,
+        "turns": args.turns,
+        "llm_latency_ms": args.llm_latency_ms,
+        "cpu_count": os.cpu_count(),
+    }}
+    for mode in args.modes.split(","):
+        report[mode] = await run_mode(graph, mode, args.conversations, args.turns)
+    return report
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Measure connection reuse of the shared model client against a local
+stand-in OpenAI server (fake_openai_server.py, started as a subprocess).
+
+Modes:
+  per_call      new ChatOpenAI and httpx client for every request
+  no_keepalive  one client, keep-alive disabled
+  shared        llm_factory.make_chat_model, requests from a thread pool
+  shared_async  llm_factory.make_chat_model, requests via ainvoke
+
+Loopback connects are cheap, so the latency gap understates what a TLS
+handshake to a real provider costs; "connections" is the number to watch.
+
+    python bench_llm_client.py --requests 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from llm_factory import http_settings, make_chat_model
+from metrics import summarize
+
+PROMPT = "Who teaches CMSC 691?"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, latency_ms: float) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, "fake_openai_server.py", "--port", str(port),
+                             "--latency-ms", str(latency_ms)])
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=1.0)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("stand-in server did not start")
+
+
+def run_sync(call: Callable[[], None], total: int, concurrency: int) -> List[float]:
+    def timed(_):
+        t0 = time.perf_counter()
+        call()
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(timed, range(total)))
+
+
+async def run_async(llm: ChatOpenAI, total: int, concurrency: int) -> List[float]:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def timed():
+        async with gate:
+            t0 = time.perf_counter()
+            await llm.ainvoke(PROMPT)
+            return time.perf_counter() - t0
+
+    return list(await asyncio.gather(*(timed() for _ in range(total))))
+
+
+def per_call_request(base_url: str) -> None:
+    with httpx.Client() as http:
+        ChatOpenAI(model="gpt-4o-mini", base_url=base_url, api_key="x", http_client=http).invoke(PROMPT)
+
+
+def bench(args) -> Dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}/v1"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "offline-bench")
+    server = start_server(port, args.server_latency_ms)
+    report: Dict = {"meta": {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "server_latency_ms": args.server_latency_ms,
+        "http2": http_settings()["http2"],
+    }}
+    no_keepalive = httpx.Client(limits=httpx.Limits(max_keepalive_connections=0))
+    modes = {
+        "per_call": lambda: run_sync(lambda: per_call_request(base_url), args.requests, args.concurrency),
+        "no_keepalive": lambda: run_sync(
+            lambda: ChatOpenAI(model="gpt-4o-mini", base_url=base_url, api_key="x",
+                               http_client=no_keepalive).invoke(PROMPT),
+            args.requests, args.concurrency),
+        "shared": lambda: run_sync(lambda: make_chat_model().invoke(PROMPT), args.requests, args.concurrency),
+        "shared_async": lambda: asyncio.run(run_async(make_chat_model(), args.requests, args.concurrency)),
+    }
+    try:
+        for name in args.modes.split(","):
+            httpx.post(f"http://127.0.0.1:{port}/stats/reset")
+            t0 = time.perf_counter()
+            samples = modes[name]()
+            wall = time.perf_counter() - t0
+            server_stats = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+            report[name] = {
+                "wall_s": round(wall, 3),
+                "requests_per_s": round(len(samples) / wall, 1),
+                "latency": summarize(samples),
+                "connections": server_stats["connections"],
+            }
+    finally:
+        no_keepalive.close()
+        server.terminate()
+        server.wait(timeout=10)
+    return report
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark pooled vs unpooled model clients")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--server-latency-ms", type=float, default=20.0)
+    p.add_argument("--modes", default="per_call,no_keepalive,shared,shared_async")
+    p.add_argument("--out", default="", help="Write the JSON report here")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = bench(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
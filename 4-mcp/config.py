@@ -25,4 +25,47 @@ DISCORD_ALLOWED_CHANNELS = {
 # Tool names exposed by your Discord MCP server.
 # These defaults match SaseQ/discord-mcp; override via env if needed.
 DISCORD_SEND_TOOL = os.getenv("DISCORD_SEND_TOOL", "send_message")
-DISCORD_READ_TOOL = os.getenv("DISCORD_READ_TOOL", "read_messages")
\ No newline at end of file
+DISCORD_READ_TOOL = os.getenv("DISCORD_READ_TOOL", "read_messages")
+
+# MCP client resilience. Deadlines are in seconds.
+DISCORD_MCP_CALL_TIMEOUT = float(os.getenv("DISCORD_MCP_CALL_TIMEOUT", "30"))
+DISCORD_MCP_STARTUP_TIMEOUT = float(os.getenv("DISCORD_MCP_STARTUP_TIMEOUT", "120"))
+DISCORD_MCP_MAX_IN_FLIGHT = int(os.getenv("DISCORD_MCP_MAX_IN_FLIGHT", "16"))
+DISCORD_MCP_HEALTH_INTERVAL = float(os.getenv("DISCORD_MCP_HEALTH_INTERVAL", "15"))
+# Tools that are safe to replay after the server is restarted mid-call
+DISCORD_MCP_IDEMPOTENT_TOOLS = {
+    p.strip() for p in (
+        os.getenv("DISCORD_MCP_IDEMPOTENT_TOOLS")
+        or "read_messages,list_channels,find_channel,get_server_info"
+    ).split(",") if p.strip()
+}
+
+# Number of MCP server processes; channels are spread across them
+DISCORD_MCP_POOL_SIZE = int(os.getenv("DISCORD_MCP_POOL_SIZE", "1"))
+
+# Admission control in front of the LLM. Rates are messages per second,
+# bursts are bucket sizes; a rate of 0 disables that limit.
+DISCORD_CHANNEL_RATE = float(os.getenv("DISCORD_CHANNEL_RATE", "0.5"))
+DISCORD_CHANNEL_BURST = float(os.getenv("DISCORD_CHANNEL_BURST", "5"))
+DISCORD_AUTHOR_RATE = float(os.getenv("DISCORD_AUTHOR_RATE", "0.2"))
+DISCORD_AUTHOR_BURST = float(os.getenv("DISCORD_AUTHOR_BURST", "3"))
+DISCORD_LLM_CONCURRENCY = int(os.getenv("DISCORD_LLM_CONCURRENCY", "4"))
+DISCORD_MAX_BACKLOG = int(os.getenv("DISCORD_MAX_BACKLOG", "32"))
+DISCORD_BUSY_REPLY = os.getenv(
+    "DISCORD_BUSY_REPLY",
+    "I'm getting a lot of questions right now. Please try again in a minute."
+)
+# Sent when answering fails for any other reason, so every message gets a reply
+DISCORD_ERROR_REPLY = os.getenv(
+    "DISCORD_ERROR_REPLY",
+    "Sorry, something went wrong while answering. Please try asking again."
+)
+
+# Answer cache for repeated standalone questions
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", str(6 * 3600)))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.85"))
+
+# Messages kept per channel when diagnostics trims state over the memory
+# ceiling (see diagnostics.py)
+DISCORD_TRIM_KEEP_MESSAGES = int(os.getenv("DISCORD_TRIM_KEEP_MESSAGES", "8"))
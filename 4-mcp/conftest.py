@@ -0,0 +1,30 @@
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from fake_openai_server import build_app
+
+
+@pytest.fixture(scope="module")
+def stand_in():
+    """
+    Fault-injecting OpenAI stand-in on a free port, in a background thread.
+    Prompt caching applies from the first token, so short test prompts show it.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    app = build_app(0.02, cache_min_tokens=0)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.05)
+    yield base
+    server.should_exit = True
+    thread.join(timeout=5)
@@ -0,0 +1,408 @@
+"""
+Opt-in runtime diagnostics for the long-running Discord bot.
+
+Off unless DIAG=1. When on, a task on the bot's event loop records a sample
+every DIAG_INTERVAL_S:
+
+- RSS (from /proc/self/statm), garbage collector counts and thread count;
+- event-loop lag: how late a short periodic sleep wakes up, i.e. how long
+  something held the loop;
+- with DIAG_TRACEMALLOC_FRAMES > 0, the source lines whose allocations grew
+  most since the previous sample and since start-up. tracemalloc slows
+  allocation down, and each snapshot holds the GIL for up to a few seconds
+  on a large heap (reported as snapshot_ms, and visible as loop lag), so
+  leave it off unless hunting a leak and use a long DIAG_INTERVAL_S.
+
+Each sample is appended as one JSON line to DIAG_FILE.
+
+CPU profiles are taken on demand by a thread that reads every thread's stack
+DIAG_PROFILE_HZ times a second (wall-clock samples, so idle threads show up
+in their wait call). Profiles are written in collapsed-stack form, one
+"frame;frame;frame count" line per stack, which flamegraph.pl and speedscope
+read. Send SIGUSR1 to profile for DIAG_PROFILE_S seconds into
+DIAG_PROFILE_DIR, or use the endpoint.
+
+With DIAG_PORT set, an HTTP endpoint is served on 127.0.0.1 only:
+
+    GET  /diag                       latest sample, counters, trim hooks
+    GET  /diag/profile?seconds=10    collapsed stacks as text (hz= optional)
+    GET  /diag/heap                  top growth since start-up (needs tracemalloc)
+    POST /diag/trim                  run the trim hooks now
+
+DIAG_MEMORY_CEILING_MB is checked on every sample. Over the ceiling a
+warning is printed and, with DIAG_CEILING_ACTION=trim, the registered trim
+hooks run (shorter histories, empty caches) followed by a full garbage
+collection, at most once per DIAG_TRIM_COOLDOWN_S.
+
+    DIAG                      1 to enable (default off)
+    DIAG_FILE                 JSONL output (default diagnostics.jsonl)
+    DIAG_INTERVAL_S           sample period (default 60)
+    DIAG_PORT                 local endpoint port (default 0: no endpoint)
+    DIAG_TRACEMALLOC_FRAMES   tracemalloc traceback depth (default 0: off)
+    DIAG_HEAP_TOP             growth lines per sample (default 10)
+    DIAG_PROFILE_DIR          SIGUSR1 profiles (default diag_profiles)
+    DIAG_PROFILE_S            SIGUSR1 profile length (default 30)
+    DIAG_PROFILE_HZ           samples per second (default 100)
+    DIAG_MEMORY_CEILING_MB    RSS ceiling (default 0: none)
+    DIAG_CEILING_ACTION       warn or trim (default warn)
+    DIAG_TRIM_COOLDOWN_S      minimum time between ceiling trims (default 300)
+"""
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import summarize
+
+LAG_TICK_S = 0.25
+MAX_PROFILE_S = 300.0
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def collapse(thread_name: str, frame: Any) -> str:
+    """One stack as 'thread;outermost;...;innermost'."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join([thread_name] + names[::-1])
+
+
+def format_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
+
+
+def top_frames(stacks: Counter, n: int = 10) -> List[Dict[str, Any]]:
+    """Innermost frames by share of samples."""
+    total = sum(stacks.values()) or 1
+    leaves: Counter = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return [{"frame": f, "share": round(c / total, 3)} for f, c in leaves.most_common(n)]
+
+
+class SamplingProfiler:
+    """Samples every other thread's stack; one profile at a time."""
+
+    def __init__(self):
+        self._running = threading.Lock()
+        self.profiles = 0
+
+    def run(self, seconds: float, hz: float = 100.0) -> Counter:
+        """Blocks for seconds; call it from a worker thread."""
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("a profile is already running")
+        try:
+            me = threading.get_ident()
+            interval = 1.0 / max(hz, 1.0)
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + min(seconds, MAX_PROFILE_S)
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        stacks[collapse(names.get(ident, str(ident)), frame)] += 1
+                time.sleep(interval)
+            self.profiles += 1
+            return stacks
+        finally:
+            self._running.release()
+
+
+class HeapTracker:
+    """tracemalloc snapshots compared with the previous one and the first one."""
+
+    def __init__(self, frames: int = 1, top: int = 10):
+        self.top = top
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.baseline = self.previous = self._snapshot()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def _growth(self, now: tracemalloc.Snapshot, then: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+        out = []
+        for d in now.compare_to(then, "lineno"):
+            if d.size_diff <= 0:
+                continue
+            frame = d.traceback[0]
+            out.append({
+                "where": f"{frame.filename}:{frame.lineno}",
+                "grew_kb": round(d.size_diff / 1024, 1),
+                "size_kb": round(d.size / 1024, 1),
+                "blocks": d.count_diff,
+            })
+            if len(out) >= self.top:
+                break
+        return out
+
+    def sample(self) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        now = self._snapshot()
+        out = {
+            "traced_mb": round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 1),
+            "since_last": self._growth(now, self.previous),
+            "since_start": self._growth(now, self.baseline),
+        }
+        out["snapshot_ms"] = round(1000 * (time.perf_counter() - t0), 1)
+        self.previous = now
+        return out
+
+    def since_start(self) -> List[Dict[str, Any]]:
+        return self._growth(self._snapshot(), self.baseline)
+
+
+class Diagnostics:
+    """
+    Samples, trim hooks and on-demand profiles for one process.
+
+    Trim hooks are registered with add_trim(name, fn); fn frees what it can
+    and returns how many items it dropped.
+    """
+
+    def __init__(self, path: str = "diagnostics.jsonl", interval_s: float = 60.0,
+                 ceiling_mb: float = 0.0, action: str = "warn", cooldown_s: float = 300.0,
+                 heap_frames: int = 0, heap_top: int = 10, profile_dir: str = "diag_profiles",
+                 profile_s: float = 30.0, profile_hz: float = 100.0):
+        if action not in {"warn", "trim"}:
+            raise ValueError(f"DIAG_CEILING_ACTION must be warn or trim, got {action!r}")
+        self.path = path
+        self.interval_s = interval_s
+        self.ceiling_mb = ceiling_mb
+        self.action = action
+        self.cooldown_s = cooldown_s
+        self.heap_frames = heap_frames
+        self.heap_top = heap_top
+        self.profile_dir = profile_dir
+        self.profile_s = profile_s
+        self.profile_hz = profile_hz
+        self.profiler = SamplingProfiler()
+        self.heap: Optional[HeapTracker] = None
+        self.last: Dict[str, Any] = {}
+        self.counters: Counter = Counter()
+        self._trims: Dict[str, Callable[[], int]] = {}
+        self._last_trim = float("-inf")
+        self._lags: deque = deque(maxlen=4096)
+        self._tasks: List[asyncio.Task] = []
+        self._server: Any = None
+        self._serving: Optional[asyncio.Task] = None
+
+    def add_trim(self, name: str, fn: Callable[[], int]) -> None:
+        self._trims[name] = fn
+
+    def trim(self, reason: str) -> Dict[str, Any]:
+        """Run every trim hook, then a full collection; returns what each freed."""
+        before = rss_bytes()
+        freed: Dict[str, Any] = {}
+        for name, fn in self._trims.items():
+            try:
+                freed[name] = fn()
+            except Exception as e:
+                freed[name] = f"failed: {e!r}"
+        freed["gc_objects"] = gc.collect()
+        freed["rss_mb_before"] = round(before / 2 ** 20, 1)
+        freed["rss_mb_after"] = round(rss_bytes() / 2 ** 20, 1)
+        self._last_trim = time.monotonic()
+        self.counters["trims"] += 1
+        print(f"[diag] trimmed state ({reason}): {json.dumps(freed)}", flush=True)
+        return freed
+
+    def check_ceiling(self, rss_mb: float) -> Optional[Dict[str, Any]]:
+        if not self.ceiling_mb or rss_mb <= self.ceiling_mb:
+            return None
+        self.counters["over_ceiling"] += 1
+        print(f"[diag] RSS {rss_mb:.0f} MB is over the {self.ceiling_mb:.0f} MB ceiling", flush=True)
+        if self.action == "trim" and time.monotonic() - self._last_trim >= self.cooldown_s:
+            return self.trim("memory ceiling")
+        return None
+
+    def sample(self, heap: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        lags = list(self._lags)
+        self._lags.clear()
+        rss_mb = round(rss_bytes() / 2 ** 20, 1)
+        out: Dict[str, Any] = {
+            "ts": round(time.time(), 3),
+            "rss_mb": rss_mb,
+            "loop_lag": summarize(lags),
+            "gc_counts": list(gc.get_count()),
+            "threads": threading.active_count(),
+        }
+        with contextlib.suppress(RuntimeError):
+            out["tasks"] = len(asyncio.all_tasks())
+        if heap is not None:
+            out["heap"] = heap
+        trimmed = self.check_ceiling(rss_mb)
+        if trimmed is not None:
+            out["trimmed"] = trimmed
+        self.counters["samples"] += 1
+        self.last = out
+        return out
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    async def profile(self, seconds: float, hz: Optional[float] = None) -> Counter:
+        return await asyncio.to_thread(self.profiler.run, seconds, hz or self.profile_hz)
+
+    async def profile_to_file(self, seconds: float) -> str:
+        stacks = await self.profile(seconds)
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(format_collapsed(stacks))
+        self.write({"ts": round(time.time(), 3), "profile": path, "seconds": seconds,
+                    "samples": sum(stacks.values()), "top": top_frames(stacks)})
+        print(f"[diag] wrote profile {path}", flush=True)
+        return path
+
+    # --- background tasks ----------------------------------------------
+
+    async def _watch_lag(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(LAG_TICK_S)
+            self._lags.append(max(0.0, time.perf_counter() - t0 - LAG_TICK_S))
+
+    async def _sample_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                # Snapshots take a while on a big heap; keep them off the loop
+                heap = await asyncio.to_thread(self.heap.sample) if self.heap is not None else None
+                self.write(self.sample(heap))
+            except Exception as e:
+                print(f"[diag] sample failed: {e!r}", flush=True)
+
+    def _on_sigusr1(self) -> None:
+        async def run() -> None:
+            try:
+                await self.profile_to_file(self.profile_s)
+            except RuntimeError as e:
+                print(f"[diag] {e}", flush=True)
+
+        self._tasks.append(asyncio.get_running_loop().create_task(run()))
+
+    async def start(self, port: int = 0) -> None:
+        """Start sampling (and the local endpoint if port) on the running loop."""
+        if self.heap_frames > 0:
+            self.heap = await asyncio.to_thread(HeapTracker, self.heap_frames, self.heap_top)
+        loop = asyncio.get_running_loop()
+        self._tasks += [loop.create_task(self._watch_lag()), loop.create_task(self._sample_forever())]
+        with contextlib.suppress(NotImplementedError, AttributeError, RuntimeError):
+            loop.add_signal_handler(signal.SIGUSR1, self._on_sigusr1)
+        if port:
+            self._server = _local_server(self, port)
+            self._serving = loop.create_task(self._server.serve())
+        print(f"[diag] on: file={self.path} interval={self.interval_s:g}s port={port or '-'} "
+              f"ceiling={self.ceiling_mb or '-'}MB action={self.action} "
+              f"tracemalloc={self.heap_frames or 'off'}", flush=True)
+
+    async def stop(self) -> None:
+        with contextlib.suppress(NotImplementedError, AttributeError, RuntimeError):
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._serving is not None:
+            # Let uvicorn close its socket instead of cancelling it mid-shutdown
+            self._server.should_exit = True
+            await asyncio.gather(self._serving, return_exceptions=True)
+            self._serving = None
+
+
+def _local_server(diag: Diagnostics, port: int) -> Any:
+    """The /diag endpoint; bound to 127.0.0.1 so it is never reachable from outside."""
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse, PlainTextResponse
+    from starlette.routing import Route
+
+    async def status(request: Request) -> JSONResponse:
+        return JSONResponse({"last": diag.last, "counters": dict(diag.counters),
+                             "trim_hooks": sorted(diag._trims), "rss_mb": round(rss_bytes() / 2 ** 20, 1)})
+
+    async def profile(request: Request) -> PlainTextResponse:
+        try:
+            seconds = float(request.query_params.get("seconds", "10"))
+            hz = float(request.query_params.get("hz", str(diag.profile_hz)))
+            stacks = await diag.profile(seconds, hz)
+        except ValueError:
+            return PlainTextResponse("seconds and hz must be numbers\n", status_code=400)
+        except RuntimeError as e:
+            return PlainTextResponse(f"{e}\n", status_code=409)
+        return PlainTextResponse(format_collapsed(stacks))
+
+    async def heap(request: Request) -> JSONResponse:
+        if diag.heap is None:
+            return JSONResponse({"error": "set DIAG_TRACEMALLOC_FRAMES to track the heap"}, status_code=404)
+        return JSONResponse({"since_start": await asyncio.to_thread(diag.heap.since_start)})
+
+    async def trim(request: Request) -> JSONResponse:
+        return JSONResponse(diag.trim("requested"))
+
+    app = Starlette(routes=[
+        Route("/diag", status),
+        Route("/diag/profile", profile),
+        Route("/diag/heap", heap),
+        Route("/diag/trim", trim, methods=["POST"]),
+    ])
+
+    class Server(uvicorn.Server):
+        # Leave SIGINT/SIGTERM to the bot
+        @contextlib.contextmanager
+        def capture_signals(self):
+            yield
+
+    return Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+
+
+def from_env() -> Optional[Diagnostics]:
+    """Diagnostics configured from DIAG_*; None unless DIAG is on."""
+    if os.getenv("DIAG", "").lower() not in {"1", "true", "yes"}:
+        return None
+    return Diagnostics(
+        path=os.getenv("DIAG_FILE", "diagnostics.jsonl"),
+        interval_s=float(os.getenv("DIAG_INTERVAL_S", "60")),
+        ceiling_mb=float(os.getenv("DIAG_MEMORY_CEILING_MB", "0")),
+        action=os.getenv("DIAG_CEILING_ACTION", "warn").lower(),
+        cooldown_s=float(os.getenv("DIAG_TRIM_COOLDOWN_S", "300")),
+        heap_frames=int(os.getenv("DIAG_TRACEMALLOC_FRAMES", "0")),
+        heap_top=int(os.getenv("DIAG_HEAP_TOP", "10")),
+        profile_dir=os.getenv("DIAG_PROFILE_DIR", "diag_profiles"),
+        profile_s=float(os.getenv("DIAG_PROFILE_S", "30")),
+        profile_hz=float(os.getenv("DIAG_PROFILE_HZ", "100")),
+    )
+
+
+def port_from_env() -> int:
+    return int(os.getenv("DIAG_PORT", "0"))
@@ -2,22 +2,68 @@ import asyncio
 import json
 import os
 import shlex
-from typing import Dict, List, Iterable
+import time
+from typing import Dict, List, Iterable, Optional, Set
 
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.chat_history import InMemoryChatMessageHistory
+from openai import RateLimitError
 
 from config import (
     DISCORD_MCP_CMD,
     DISCORD_ALLOWED_CHANNELS,
     DISCORD_SEND_TOOL,
     DISCORD_READ_TOOL,
+    DISCORD_MCP_CALL_TIMEOUT,
+    DISCORD_MCP_STARTUP_TIMEOUT,
+    DISCORD_MCP_MAX_IN_FLIGHT,
+    DISCORD_MCP_HEALTH_INTERVAL,
+    DISCORD_MCP_IDEMPOTENT_TOOLS,
+    DISCORD_MCP_POOL_SIZE,
+    DISCORD_CHANNEL_RATE,
+    DISCORD_CHANNEL_BURST,
+    DISCORD_AUTHOR_RATE,
+    DISCORD_AUTHOR_BURST,
+    DISCORD_LLM_CONCURRENCY,
+    DISCORD_MAX_BACKLOG,
+    DISCORD_BUSY_REPLY,
+    DISCORD_ERROR_REPLY,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL_S,
+    ANSWER_CACHE_THRESHOLD,
+    DISCORD_TRIM_KEEP_MESSAGES,
 )
-from graph import GRAPH, SYSTEM_MSG
-from mcp_client import MCPClient
+from admission import AdmissionController
+from answer_cache import AnswerCache, content_version
+from graph import GRAPH
+from prompt_assembly import assemble_messages
+from prompt import REACT_SYSTEM_PROMPT
+from search_cache import get_search_cache
+from diagnostics import Diagnostics, from_env as diagnostics_from_env, port_from_env as diagnostics_port
+from prefetch import STATS as PREFETCH_STATS
+from tools import XLSX_PATH as SCHEDULE_XLSX_PATH, drop_schedule
+from mcp_pool import MCPPool
+from llm_factory import aclose_http_clients
+from model_router import STATS as ROUTING_STATS
+from tool_budget import STATS as BUDGET_STATS
+from prompt_profile import PROFILES as PROMPT_PROFILES, format_profile
+from call_policy import DeadlineExceeded, get_policy, give_up_on, policy_stats, turn_deadline
+from tracing import trace_config, turn_span
+
+STATS_INTERVAL_S = float(os.getenv("DISCORD_STATS_INTERVAL", "60"))
 
 # Per-channel histories
 _histories: Dict[str, InMemoryChatMessageHistory] = {}
+_channel_locks: Dict[str, asyncio.Lock] = {}
+_cached_replies: Set[asyncio.Task] = set()
+# Newest message id handled per channel; reads return history, not just new messages
+_last_seen: Dict[str, int] = {}
+
+ANSWER_CACHE = AnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl_s=ANSWER_CACHE_TTL_S,
+    threshold=ANSWER_CACHE_THRESHOLD,
+)
 
 
 def history(cid: str) -> InMemoryChatMessageHistory:
@@ -26,6 +72,33 @@ def history(cid: str) -> InMemoryChatMessageHistory:
     return _histories[cid]
 
 
+def trim_histories(keep: int = DISCORD_TRIM_KEEP_MESSAGES) -> int:
+    """Keep only the last keep messages of each channel; returns messages dropped."""
+    keep -= keep % 2  # whole question/answer pairs
+    dropped = 0
+    for h in _histories.values():
+        extra = len(h.messages) - keep
+        if extra > 0:
+            h.messages = h.messages[extra:]
+            dropped += extra
+    return dropped
+
+
+def history_stats() -> Dict[str, int]:
+    return {"channels": len(_histories), "messages": sum(len(h.messages) for h in _histories.values())}
+
+
+def make_diagnostics() -> Optional[Diagnostics]:
+    """Diagnostics from DIAG_* with this bot's state registered for trimming; None if off."""
+    diag = diagnostics_from_env()
+    if diag is not None:
+        diag.add_trim("histories", trim_histories)
+        diag.add_trim("answer_cache", ANSWER_CACHE.clear)
+        diag.add_trim("search_cache", lambda: get_search_cache().clear_memory())
+        diag.add_trim("schedule", drop_schedule)
+    return diag
+
+
 def allowed_channels() -> Iterable[str]:
     """
     For SaseQ/discord-mcp, read_messages requires channelId.
@@ -39,118 +112,294 @@ def allowed_channels() -> Iterable[str]:
     return DISCORD_ALLOWED_CHANNELS
 
 
-async def debug_print_tool_schemas(client: MCPClient) -> None:
-    if not client.session:
-        return
-    reply = await client.session.list_tools()  # type: ignore[attr-defined]
+async def debug_print_tool_schemas(client: MCPPool) -> None:
+    # Schemas are cached when the sessions start, no extra round trip needed
     print("=== MCP tools and schemas ===")
-    for t in reply.tools or []:
-        print(t.name, getattr(t, "inputSchema", None))
+    for name, schema in client.tool_schemas.items():
+        print(name, schema)
     print("=============================")
 
 
-async def main() -> None:
-    argv = shlex.split(DISCORD_MCP_CMD)
-    client = MCPClient(argv)
-    await client.start()
+def message_author(m: Dict) -> str:
+    author = m.get("authorId") or m.get("author_id") or m.get("author") or ""
+    if isinstance(author, dict):
+        author = author.get("id") or author.get("username") or ""
+    return str(author)
+
+
+def is_bot_message(m: Dict) -> bool:
+    author = m.get("author")
+    return bool(m.get("bot") or (isinstance(author, dict) and author.get("bot")))
 
+
+def message_id_of(m: Dict) -> str:
+    return str(m.get("messageId") or m.get("message_id") or m.get("id") or "")
+
+
+def unseen_messages(chan: str, msgs: List[Dict]) -> List[Dict]:
+    """
+    Messages newer than the last one handled in chan, oldest first. Discord
+    ids (snowflakes) increase over time. The first read of a channel only
+    sets the cursor, so history from before the bot started is not answered.
+    """
+    numbered = sorted((int(mid), m) for m in msgs if (mid := message_id_of(m)).isdigit())
+    last = _last_seen.get(chan)
+    _last_seen[chan] = max(numbered[-1][0] if numbered else 0, last or 0)
+    if last is None:
+        return []
+    return [m for mid, m in numbered if mid > last and not is_bot_message(m)]
+
+
+def make_admission() -> AdmissionController:
+    return AdmissionController(
+        channel_rate=DISCORD_CHANNEL_RATE,
+        channel_burst=DISCORD_CHANNEL_BURST,
+        author_rate=DISCORD_AUTHOR_RATE,
+        author_burst=DISCORD_AUTHOR_BURST,
+        max_concurrency=DISCORD_LLM_CONCURRENCY,
+        max_backlog=DISCORD_MAX_BACKLOG,
+    )
+
+
+async def send_reply(client: MCPPool, send_tool: str, chan: str, message_id: str, text: str) -> None:
+    # Send reply back using camelCase required by SaseQ server
+    send_payload_variants = [
+        # Preferred for SaseQ/discord-mcp
+        (
+            {"channelId": chan, "content": text, "replyToMessageId": message_id}
+            if message_id else
+            {"channelId": chan, "content": text}
+        ),
+        # Fallbacks for other servers (kept for portability)
+        (
+            {"channel_id": chan, "content": text, "reply_to_id": message_id}
+            if message_id else
+            {"channel_id": chan, "content": text}
+        ),
+        (
+            {"channel": chan, "text": text, "reply_to": message_id}
+            if message_id else
+            {"channel": chan, "text": text}
+        ),
+    ]
+
+    # The client picks the variant matching the tool's schema (and
+    # remembers it), so each reply costs exactly one round trip.
     try:
-        if os.getenv("DEBUG_MCP_SCHEMAS", "").lower() in {"1", "true", "yes"}:
-            await debug_print_tool_schemas(client)
-
-        tool_names = {t.lower(): t for t in await client.list_tool_names()}
-        if DISCORD_SEND_TOOL.lower() not in tool_names or DISCORD_READ_TOOL.lower() not in tool_names:
-            have = ", ".join(sorted(tool_names.values()))
-            raise RuntimeError(
-                f"Discord MCP tools not found. Have: {have}. Need: {DISCORD_SEND_TOOL}, {DISCORD_READ_TOOL}"
-            )
+        _ = await client.call_tool_variants(send_tool, send_payload_variants, key=chan)
+    except Exception as e:
+        print(f"[send_message] failed for channel {chan}: {e}", flush=True)
+
+
+# run_graph's reply when the graph ends without an answer; never cached
+NO_RESPONSE = "I didn’t produce a response."
+
+
+async def run_graph(prior: List, chan: str = "default") -> str:
+    # The channel keys the prompt profile (prompt_profile.PROFILES)
+    state = await GRAPH.ainvoke({"messages": prior}, config=trace_config({"metadata": {"session": chan}}))
+    for msg in reversed(state["messages"]):
+        if isinstance(msg, AIMessage) and msg.content:
+            return msg.content
+    return NO_RESPONSE
+
+
+async def answer(client: MCPPool, controller: AdmissionController, send_tool: str,
+                 chan: str, message_id: str, content: str) -> None:
+    """Run the graph for one admitted message and send the reply."""
+    # One answer at a time per channel keeps history and reply order consistent
+    async with _channel_locks.setdefault(chan, asyncio.Lock()):
+        # One trace per turn (graph and reply send) when TRACE_EXPORTER is set
+        with turn_span("discord.turn", channel=chan) as turn:
+            h = history(chan)
+            human = HumanMessage(content=content)
+            # Shared system prompt + canonical history keeps the prompt prefix cacheable
+            prior = assemble_messages(h.messages, content)
+            try:
+                # The graph is async end to end, so other channels keep flowing.
+                # A 429 is shed with the busy reply below rather than retried
+                with turn_deadline(), give_up_on(RateLimitError):
+                    ai_text = await run_graph(prior, chan)
+            except DeadlineExceeded:
+                controller.record_shed("deadline")
+                turn.set(shed="deadline")
+                await send_reply(client, send_tool, chan, message_id, DISCORD_BUSY_REPLY)
+                return
+            except RateLimitError:
+                controller.record_shed("provider_429")
+                turn.set(shed="provider_429")
+                await send_reply(client, send_tool, chan, message_id, DISCORD_BUSY_REPLY)
+                return
+            except Exception as e:
+                print(f"[graph] failed for channel {chan}: {e!r}", flush=True)
+                turn.set(error=repr(e)[:200])
+                await send_reply(client, send_tool, chan, message_id, DISCORD_ERROR_REPLY)
+                return
+
+            profile = PROMPT_PROFILES.session(chan)
+            if profile is not None:
+                print(f"[prompt] channel={chan} {format_profile(profile)}", flush=True)
+
+            h.add_message(human)
+            h.add_message(AIMessage(content=ai_text))
+            if ai_text.strip() and ai_text != NO_RESPONSE:
+                ANSWER_CACHE.store(content, ai_text)
+            await send_reply(client, send_tool, chan, message_id, ai_text)
+
 
-        send_tool = tool_names[DISCORD_SEND_TOOL.lower()]
-        read_tool = tool_names[DISCORD_READ_TOOL.lower()]
+async def answer_cached(client: MCPPool, send_tool: str, chan: str, message_id: str,
+                        content: str, cached: str) -> None:
+    """Send a cached answer in turn with the channel's in-flight answers."""
+    async with _channel_locks.setdefault(chan, asyncio.Lock()):
+        with turn_span("discord.turn", channel=chan, cache_hit=True):
+            h = history(chan)
+            h.add_message(HumanMessage(content=content))
+            h.add_message(AIMessage(content=cached))
+            await send_reply(client, send_tool, chan, message_id, cached)
 
-        # Main loop: poll each allowed channel explicitly, then reply in-place.
+
+async def dispatch(client: MCPPool, controller: AdmissionController, send_tool: str) -> None:
+    """Drain the admission backlog, running at most max_concurrency graphs at once."""
+    running = set()
+    try:
+        while True:
+            chan, message_id, content = await controller.queue.get()
+            await controller.slots.acquire()
+            controller.in_flight += 1
+            task = asyncio.create_task(answer(client, controller, send_tool, chan, message_id, content))
+            running.add(task)
+
+            def _done(t: asyncio.Task) -> None:
+                running.discard(t)
+                controller.in_flight -= 1
+                controller.slots.release()
+
+            task.add_done_callback(_done)
+    finally:
+        for task in list(running):
+            task.cancel()
+
+
+async def poll_channel(client: MCPPool, controller: AdmissionController,
+                       chan: str, read_tool: str, send_tool: str) -> bool:
+    """Read new messages from one channel and queue them for answering. Returns True if any were read."""
+    # SaseQ server expects camelCase: channelId + optional limit.
+    # Other spellings are adapted from the cached inputSchema.
+    print(f"[read_messages] channelId={chan}", flush=True)
+    # Servers that accept an `after` cursor return only newer messages; the others get the plain variant
+    after = str(_last_seen.get(chan, ""))
+    variants = [{"channelId": chan, "limit": 5, "after": after}, {"channelId": chan, "limit": 5}]
+    try:
+        msgs_raw = await client.call_tool_variants(read_tool, variants, key=chan)
+    except Exception as e:
+        # Deadline hit or the server could not be restarted; try again next poll
+        print(f"[read_messages] failed for channel {chan}: {e!r}", flush=True)
+        return False
+    try:
+        msgs: List[Dict] = json.loads(msgs_raw) if msgs_raw else []
+    except Exception:
+        msgs = []
+
+    msgs = unseen_messages(chan, msgs if isinstance(msgs, list) else [])
+    if not msgs:
+        return False
+
+    for m in msgs:
+        message_id = message_id_of(m)
+        content = (m.get("content") or m.get("text") or "").strip()
+        if not content:
+            continue
+
+        # Repeated standalone questions skip admission and the LLM entirely
+        ANSWER_CACHE.ensure_version(content_version(REACT_SYSTEM_PROMPT, paths=[SCHEDULE_XLSX_PATH]))
+        cached = ANSWER_CACHE.lookup(content)
+        if cached is not None:
+            # In a task so a channel busy with an LLM answer doesn't hold up polling
+            task = asyncio.create_task(answer_cached(client, send_tool, chan, message_id, content, cached))
+            _cached_replies.add(task)
+            task.add_done_callback(_cached_replies.discard)
+            continue
+
+        # Over the rate limits or backlog: answer cheaply without the LLM
+        reason = controller.offer(chan, message_author(m), (chan, message_id, content))
+        if reason:
+            print(f"[admission] shed message in {chan}: {reason}", flush=True)
+            await send_reply(client, send_tool, chan, message_id, DISCORD_BUSY_REPLY)
+
+    return True
+
+
+async def run_bot(client: MCPPool, controller: Optional[AdmissionController] = None) -> None:
+    """Poll and reply forever using an already started pool."""
+    controller = controller or make_admission()
+    if os.getenv("DEBUG_MCP_SCHEMAS", "").lower() in {"1", "true", "yes"}:
+        await debug_print_tool_schemas(client)
+
+    tool_names = {t.lower(): t for t in await client.list_tool_names()}
+    if DISCORD_SEND_TOOL.lower() not in tool_names or DISCORD_READ_TOOL.lower() not in tool_names:
+        have = ", ".join(sorted(tool_names.values()))
+        raise RuntimeError(
+            f"Discord MCP tools not found. Have: {have}. Need: {DISCORD_SEND_TOOL}, {DISCORD_READ_TOOL}"
+        )
+
+    send_tool = tool_names[DISCORD_SEND_TOOL.lower()]
+    read_tool = tool_names[DISCORD_READ_TOOL.lower()]
+
+    diag = make_diagnostics()
+    if diag is not None:
+        await diag.start(diagnostics_port())
+    dispatcher = asyncio.create_task(dispatch(client, controller, send_tool))
+    try:
+        # Main loop: poll every allowed channel concurrently and queue admitted messages.
+        # The pool keeps each channel on one session so its replies stay ordered.
+        last_stats = time.monotonic()
         while True:
-            any_found = False
-            for chan in allowed_channels():
-                # SaseQ server expects camelCase: channelId + optional limit
-                print(f"[read_messages] channelId={chan}", flush=True)
-                msgs_raw = await client.call_tool_text(read_tool, {"channelId": chan, "limit": 5})
-                try:
-                    msgs: List[Dict] = json.loads(msgs_raw) if msgs_raw else []
-                except Exception:
-                    msgs = []
-
-                if not msgs:
-                    continue
-
-                any_found = True
-                for m in msgs:
-                    # Normalize message fields
-                    message_id = str(
-                        m.get("messageId")
-                        or m.get("message_id")
-                        or m.get("id")
-                        or ""
-                    )
-                    content = (m.get("content") or m.get("text") or "").strip()
-                    if not content:
-                        continue
-
-                    # Build conversation and invoke LangGraph
-                    h = history(chan)
-                    h.add_message(HumanMessage(content=content))
-                    prior = [SYSTEM_MSG] + h.messages
-
-                    state = GRAPH.invoke({"messages": prior})
-                    ai_text = ""
-                    for msg in reversed(state["messages"]):
-                        if isinstance(msg, AIMessage):
-                            ai_text = msg.content
-                            break
-                    if not ai_text:
-                        ai_text = "I didn’t produce a response."
-
-                    h.add_message(AIMessage(content=ai_text))
-
-                    # Send reply back using camelCase required by SaseQ server
-                    send_payload_variants = [
-                        # Preferred for SaseQ/discord-mcp
-                        (
-                            {"channelId": chan, "content": ai_text, "replyToMessageId": message_id}
-                            if message_id else
-                            {"channelId": chan, "content": ai_text}
-                        ),
-                        # Fallbacks for other servers (kept for portability)
-                        (
-                            {"channel_id": chan, "content": ai_text, "reply_to_id": message_id}
-                            if message_id else
-                            {"channel_id": chan, "content": ai_text}
-                        ),
-                        (
-                            {"channel": chan, "text": ai_text, "reply_to": message_id}
-                            if message_id else
-                            {"channel": chan, "text": ai_text}
-                        ),
-                    ]
-
-                    sent_ok = False
-                    for payload in send_payload_variants:
-                        try:
-                            _ = await client.call_tool_text(send_tool, payload)
-                            sent_ok = True
-                            break
-                        except Exception:
-                            continue
-
-                    if not sent_ok:
-                        print(f"[send_message] failed for channel {chan}", flush=True)
+            if time.monotonic() - last_stats >= STATS_INTERVAL_S:
+                print(f"[mcp] stats {json.dumps(client.stats())}", flush=True)
+                print(f"[admission] stats {json.dumps(controller.stats())}", flush=True)
+                print(f"[answer_cache] stats {json.dumps(ANSWER_CACHE.stats())}", flush=True)
+                print(f"[search_cache] stats {json.dumps(get_search_cache().stats())}", flush=True)
+                print(f"[prefetch] stats {json.dumps(PREFETCH_STATS.snapshot())}", flush=True)
+                print(f"[policy] stats {json.dumps(policy_stats())}", flush=True)
+                print(f"[model_router] stats {json.dumps(ROUTING_STATS.snapshot())}", flush=True)
+                print(f"[tool_budget] stats {json.dumps(BUDGET_STATS.snapshot())}", flush=True)
+                print(f"[histories] stats {json.dumps(history_stats())}", flush=True)
+                last_stats = time.monotonic()
+
+            found = await asyncio.gather(
+                *(poll_channel(client, controller, chan, read_tool, send_tool) for chan in allowed_channels())
+            )
 
             # Back off a bit if nothing was read
-            await asyncio.sleep(0.3 if any_found else 0.8)
+            await asyncio.sleep(0.3 if any(found) else 0.8)
+    finally:
+        dispatcher.cancel()
+        if diag is not None:
+            await diag.stop()
+
+
+def make_pool() -> MCPPool:
+    return MCPPool(
+        shlex.split(DISCORD_MCP_CMD),
+        size=DISCORD_MCP_POOL_SIZE,
+        policy=get_policy("mcp"),
+        call_timeout=DISCORD_MCP_CALL_TIMEOUT,
+        startup_timeout=DISCORD_MCP_STARTUP_TIMEOUT,
+        max_in_flight=DISCORD_MCP_MAX_IN_FLIGHT,
+        idempotent_tools=DISCORD_MCP_IDEMPOTENT_TOOLS,
+        health_interval=DISCORD_MCP_HEALTH_INTERVAL,
+    )
 
+
+async def main() -> None:
+    client = make_pool()
+    await client.start()
+    try:
+        await run_bot(client)
     finally:
         await client.stop()
+        await aclose_http_clients()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
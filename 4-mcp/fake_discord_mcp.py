@@ -0,0 +1,251 @@
+"""
+Local stand-in for saseq/discord-mcp, for load-testing discord_frontend.py
+without a Discord guild.
+
+Implements read_messages, send_message, list_channels, find_channel and
+get_server_info over stdio, backed by an in-memory message bus. A traffic
+generator posts student questions into every channel this process has been
+asked to read (so a pooled frontend does not leave messages unread in the
+sessions it never polls), and reply latency is measured from post time to
+the matching send_message(replyToMessageId=...).
+
+As on Discord, reading does not consume: read_messages returns the newest
+messages of the channel's history, the bot's own replies included, or with
+an `after` message id the oldest ones posted after it. The client has to
+keep track of what it has already seen; get_load_stats counts messages
+delivered more than once and messages answered more than once.
+
+Configuration is taken from the command line, because the MCP stdio client
+only forwards a small whitelist of environment variables to the server:
+  --channels N         number of channels (default 4)
+  --rate R             messages per second per channel (default 1.0, 0 = no traffic)
+  --burst SHAPE        steady | poisson | burst (default steady)
+  --burst-size N       messages per burst in burst mode (default 10)
+  --latency-ms MS      simulated server latency per tool call (default 0)
+  --authors N          distinct message authors (default 50)
+
+Usage:
+  DISCORD_MCP_CMD="python fake_discord_mcp.py --channels 2" python discord_frontend.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from contextlib import asynccontextmanager
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from mcp.server.fastmcp import FastMCP
+
+GUILD_ID = "900000000000000000"
+TEST_CHANNEL_NAME = "mcp-testing"
+BOT_AUTHOR = {"id": "800000000000000001", "username": "grad-director", "bot": True}
+HISTORY_LIMIT = 500
+
+SAMPLE_QUESTIONS = [
+    "When is the application deadline for the MS in Computer Science?",
+    "Who teaches CMSC 691 this fall?",
+    "How many credits do I need to graduate with a PhD?",
+    "Is funding available for first-year PhD students?",
+    "What courses is Damevski teaching?",
+    "Can I transfer credits from another university?",
+    "What time does CMSC 603 meet?",
+    "Do I need the GRE to apply?",
+]
+
+
+def channel_ids(count: int) -> List[str]:
+    """Deterministic ids so the load driver can configure DISCORD_ALLOWED_CHANNELS."""
+    return [str(int(GUILD_ID) + 1 + i) for i in range(count)]
+
+
+class MessageBus:
+    """Per-channel message history plus delivery and reply bookkeeping."""
+
+    def __init__(self, channel_count: int):
+        self.channels: Dict[str, str] = {cid: f"load-{i}" for i, cid in enumerate(channel_ids(channel_count))}
+        self.channels[str(int(GUILD_ID) + 999)] = TEST_CHANNEL_NAME
+        self.history: Dict[str, Deque[Dict[str, Any]]] = {
+            cid: deque(maxlen=HISTORY_LIMIT) for cid in self.channels
+        }
+        self.active: set = set()
+        self.posted_at: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.delivered: Counter = Counter()
+        self.replied: Counter = Counter()
+        self.generated = 0
+        self.sent = 0
+        self.reads = 0
+        self.paused = False
+        # Increasing numeric ids, like Discord snowflakes
+        self._ids = itertools.count(int(GUILD_ID) * 10)
+
+    def _append(self, channel_id: str, content: str, author: Any) -> Dict[str, Any]:
+        msg = {
+            "messageId": str(next(self._ids)),
+            "channelId": channel_id,
+            "author": author,
+            "content": content,
+            "timestamp": time.time(),
+        }
+        self.history[channel_id].append(msg)
+        return msg
+
+    def post(self, channel_id: str, content: str, author: str = "student") -> Dict[str, Any]:
+        msg = self._append(channel_id, content, author)
+        self.posted_at[msg["messageId"]] = msg["timestamp"]
+        self.generated += 1
+        return msg
+
+    def read(self, channel_id: str, limit: int, after: str = "") -> List[Dict[str, Any]]:
+        """Newest `limit` messages, newest first; with `after`, the oldest `limit` after it, oldest first."""
+        self.active.add(channel_id)
+        self.reads += 1
+        box = self.history.setdefault(channel_id, deque(maxlen=HISTORY_LIMIT))
+        if after:
+            out = [m for m in box if int(m["messageId"]) > int(after)][:limit]
+        else:
+            out = list(box)[-limit:][::-1] if limit > 0 else []
+        for m in out:
+            self.delivered[m["messageId"]] += 1
+        return out
+
+    def reply(self, channel_id: str, content: str, reply_to: Optional[str]) -> None:
+        self.sent += 1
+        self._append(channel_id, content, BOT_AUTHOR)
+        if reply_to:
+            self.replied[reply_to] += 1
+        posted = self.posted_at.pop(reply_to or "", None)
+        if posted is not None:
+            self.latencies.append(time.time() - posted)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Fake Discord MCP server (stdio)")
+    p.add_argument("--channels", type=int, default=4)
+    p.add_argument("--rate", type=float, default=1.0)
+    p.add_argument("--burst", choices=["steady", "poisson", "burst"], default="steady")
+    p.add_argument("--burst-size", type=int, default=10)
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    p.add_argument("--authors", type=int, default=50)
+    return p.parse_args(argv)
+
+
+ARGS = parse_args([]) if __name__ != "__main__" else parse_args()
+LATENCY_S = ARGS.latency_ms / 1000.0
+
+BUS = MessageBus(ARGS.channels)
+
+
+def _author(rng: random.Random, args: argparse.Namespace) -> str:
+    return f"student-{rng.randrange(args.authors)}"
+
+
+async def generate_traffic(bus: MessageBus, args: argparse.Namespace) -> None:
+    """Post questions into active channels at args.rate per channel with the configured shape."""
+    rng = random.Random(0)
+    while True:
+        active = [c for c in bus.active if bus.channels.get(c) != TEST_CHANNEL_NAME]
+        if not active or args.rate <= 0 or bus.paused:
+            await asyncio.sleep(0.05)
+            continue
+        total_rate = args.rate * len(active)
+        if args.burst == "burst":
+            for _ in range(args.burst_size):
+                bus.post(rng.choice(active), rng.choice(SAMPLE_QUESTIONS), _author(rng, args))
+            await asyncio.sleep(args.burst_size / total_rate)
+        elif args.burst == "poisson":
+            bus.post(rng.choice(active), rng.choice(SAMPLE_QUESTIONS), _author(rng, args))
+            await asyncio.sleep(rng.expovariate(total_rate))
+        else:
+            for c in active:
+                bus.post(c, rng.choice(SAMPLE_QUESTIONS), _author(rng, args))
+            await asyncio.sleep(1.0 / args.rate)
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    task = asyncio.create_task(generate_traffic(BUS, ARGS))
+    try:
+        yield {}
+    finally:
+        task.cancel()
+
+
+mcp = FastMCP("fake-discord", lifespan=lifespan, log_level="WARNING")
+
+
+async def _simulate_latency() -> None:
+    if LATENCY_S > 0:
+        await asyncio.sleep(LATENCY_S)
+
+
+@mcp.tool()
+async def get_server_info() -> str:
+    """Get information about the Discord server."""
+    await _simulate_latency()
+    return json.dumps({"id": GUILD_ID, "name": "Fake Grad Director Guild", "channelCount": len(BUS.channels)})
+
+
+@mcp.tool()
+async def list_channels() -> str:
+    """List all channels in the server."""
+    await _simulate_latency()
+    return json.dumps([{"id": cid, "name": name} for cid, name in BUS.channels.items()])
+
+
+@mcp.tool()
+async def find_channel(channelName: str) -> str:
+    """Find a channel by name."""
+    await _simulate_latency()
+    for cid, name in BUS.channels.items():
+        if name == channelName:
+            return json.dumps({"id": cid, "name": name})
+    raise ValueError(f"Channel '{channelName}' not found")
+
+
+@mcp.tool()
+async def read_messages(channelId: str, limit: int = 10, after: str = "") -> str:
+    """Read recent messages from a channel, or the messages after a message id."""
+    await _simulate_latency()
+    if channelId not in BUS.channels:
+        raise ValueError(f"Unknown channel {channelId}")
+    return json.dumps(BUS.read(channelId, limit, after))
+
+
+@mcp.tool()
+async def send_message(channelId: str, content: str, replyToMessageId: str = "") -> str:
+    """Send a message to a channel, optionally as a reply."""
+    await _simulate_latency()
+    if channelId not in BUS.channels:
+        raise ValueError(f"Unknown channel {channelId}")
+    BUS.reply(channelId, content, replyToMessageId)
+    return json.dumps({"status": "sent", "channelId": channelId, "length": len(content)})
+
+
+@mcp.tool()
+async def stop_traffic() -> str:
+    """Benchmark-only: stop the traffic generator so pending replies can drain."""
+    BUS.paused = True
+    return "stopped"
+
+
+@mcp.tool()
+async def get_load_stats() -> str:
+    """Benchmark-only: generated/answered counts and raw reply latencies in seconds."""
+    return json.dumps({
+        "generated": BUS.generated,
+        "sent": BUS.sent,
+        "answered": len(BUS.latencies),
+        "pending": len(BUS.posted_at),
+        "reads": BUS.reads,
+        "redelivered": sum(n - 1 for n in BUS.delivered.values()),
+        "duplicate_replies": sum(n - 1 for n in BUS.replied.values()),
+        "latencies": BUS.latencies,
+    })
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions API, for benchmarks and tests.
+
+POST /v1/chat/completions answers after --latency-ms with a canned reply
+that quotes the last user message. Tools and streaming are not supported.
+GET /stats reports requests served and distinct client connections seen
+(by peer address), so callers can measure connection reuse.
+POST /stats/reset clears both.
+
+POST /faults injects failures for tests of retry and hedging logic, e.g.
+{"fail_next": 2, "fail_status": 503} or {"slow_next": 1, "slow_ms": 2000};
+fail_rate and slow_rate apply to every request. POST /faults with {} clears them.
+
+Prompt caching is emulated like OpenAI's: the longest earlier-seen request
+prefix (tools, then whole messages) is reported as
+usage.prompt_tokens_details.cached_tokens, in 128-token steps, once it is
+at least --cache-min-tokens long. GET /requests returns the most recent
+request bodies so tests can compare prompts.
+
+    python fake_openai_server.py --port 8765 --latency-ms 50
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=x python ...
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency-ms", type=float, default=50.0)
+    p.add_argument("--cache-min-tokens", type=int, default=1024)
+    return p.parse_args(argv)
+
+
+NO_FAULTS = {"fail_next": 0, "fail_rate": 0.0, "fail_status": 500,
+             "slow_next": 0, "slow_rate": 0.0, "slow_ms": 0.0}
+
+
+CACHE_STEP_TOKENS = 128
+KEEP_BODIES = 50
+
+
+class ServerStats:
+    def __init__(self):
+        self.requests = 0
+        self.peers = set()
+        self.cached_tokens = 0
+        self.bodies = []
+
+    def snapshot(self):
+        return {"requests": self.requests, "connections": len(self.peers), "cached_tokens": self.cached_tokens}
+
+
+class PrefixCache:
+    """Prefixes seen so far, hashed at message boundaries."""
+
+    def __init__(self, min_tokens: int):
+        self.min_tokens = min_tokens
+        self.seen = set()
+
+    def lookup_and_add(self, body: dict) -> tuple:
+        """(prompt_tokens, cached_tokens) for one request; its prefixes are remembered."""
+        pieces = [json.dumps(body.get("tools") or [], sort_keys=True)]
+        pieces += [json.dumps(m, sort_keys=True) for m in body.get("messages", [])]
+        h = hashlib.sha1()
+        tokens = cached = 0
+        for piece in pieces:
+            h.update(piece.encode("utf-8"))
+            tokens += len(piece) // 4
+            digest = h.hexdigest()
+            if digest in self.seen:
+                cached = tokens
+            self.seen.add(digest)
+        cached = cached // CACHE_STEP_TOKENS * CACHE_STEP_TOKENS
+        return tokens, (cached if cached >= self.min_tokens else 0)
+
+
+def build_app(latency_s: float, cache_min_tokens: int = 1024) -> Starlette:
+    stats = ServerStats()
+    faults = dict(NO_FAULTS)
+    cache = PrefixCache(cache_min_tokens)
+
+    def take(kind: str) -> bool:
+        if faults[f"{kind}_next"] > 0:
+            faults[f"{kind}_next"] -= 1
+            return True
+        return random.random() < faults[f"{kind}_rate"]
+
+    async def chat_completions(request: Request) -> JSONResponse:
+        stats.requests += 1
+        stats.peers.add(tuple(request.scope.get("client") or ()))
+        body = await request.json()
+        stats.bodies = (stats.bodies + [body])[-KEEP_BODIES:]
+        if take("fail"):
+            status = int(faults["fail_status"])
+            return JSONResponse({"error": {"message": "injected fault", "type": "server_error", "code": status}},
+                                status_code=status)
+        slow = take("slow")
+        await asyncio.sleep(latency_s + (faults["slow_ms"] / 1000.0 if slow else 0.0))
+        messages = body.get("messages", [])
+        last_user = next((m.get("content") for m in reversed(messages) if m.get("role") == "user"), "")
+        text = f"Stand-in reply to: {str(last_user)[:80]}"
+        prompt_tokens, cached_tokens = cache.lookup_and_add(body)
+        stats.cached_tokens += cached_tokens
+        completion_tokens = len(text) // 4
+        return JSONResponse({
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stand-in"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        })
+
+    async def get_stats(request: Request) -> JSONResponse:
+        return JSONResponse(stats.snapshot())
+
+    async def reset_stats(request: Request) -> JSONResponse:
+        stats.requests = 0
+        stats.peers.clear()
+        stats.cached_tokens = 0
+        stats.bodies = []
+        cache.seen.clear()
+        return JSONResponse(stats.snapshot())
+
+    async def get_requests(request: Request) -> JSONResponse:
+        return JSONResponse(stats.bodies)
+
+    async def set_faults(request: Request) -> JSONResponse:
+        faults.clear()
+        faults.update(NO_FAULTS, **(await request.json()))
+        return JSONResponse(faults)
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/stats", get_stats, methods=["GET"]),
+        Route("/stats/reset", reset_stats, methods=["POST"]),
+        Route("/requests", get_requests, methods=["GET"]),
+        Route("/faults", set_faults, methods=["POST"]),
+    ])
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    uvicorn.run(build_app(args.latency_ms / 1000.0, args.cache_min_tokens),
+                host=args.host, port=args.port, log_level="warning")
@@ -1,18 +1,36 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage
+import os
+
 from langgraph.graph import StateGraph, START, END, MessagesState
 from langgraph.prebuilt import tools_condition
 from langgraph.prebuilt.tool_node import ToolNode
+from langgraph.utils.runnable import RunnableCallable
 
 from config import OPENAI_API_KEY
-from prompt import REACT_SYSTEM_PROMPT
-from tools import query_course_schedule, get_tavily_tool
+from llm_factory import make_chat_model
+from model_router import DEFAULT, make_tier_llms, routed_graph_model, routing_enabled
+from prompt_profile import profiled_model
+from prompt_assembly import SYSTEM_MESSAGE, stable_tools
+from tools import query_course_schedule, get_tavily_tool, get_kb_tool, known_instructors
+from router import make_router_node
+from prefetch import Prefetcher, make_guess, make_prefetch_nodes, prefetch_enabled
+from tool_budget import budget_tool_node
 
 def _get_llm():
-    return ChatOpenAI(model="gpt-4o-mini", temperature=0.7, openai_api_key=OPENAI_API_KEY)
+    # Retries come from call_policy (routed_graph_model), so the SDK's own are off
+    return make_chat_model(model="gpt-4o-mini", temperature=0.7, api_key=OPENAI_API_KEY, max_retries=0)
 
-def build_graph():
-    llm = _get_llm()
+def build_graph(llm=None, fast_path=None, prefetch=None, tiers=None):
+    # llm can be injected (e.g. fake_llm.FakeChatModel for load tests);
+    # tiers maps "fast"/"strong" to models and turns on per-turn model routing
+    if tiers is None:
+        if llm is None and routing_enabled():
+            tiers = make_tier_llms(api_key=OPENAI_API_KEY)
+        else:
+            tiers = {DEFAULT: llm or _get_llm()}
+    if fast_path is None:
+        fast_path = os.getenv("SCHEDULE_FAST_PATH", "1") != "0"
+    if prefetch is None:
+        prefetch = prefetch_enabled()
 
     tools = []
     tavily = get_tavily_tool()
@@ -20,22 +38,53 @@ def build_graph():
         tools.append(tavily)
     if query_course_schedule:
         tools.append(query_course_schedule)
+    kb = get_kb_tool()
+    if kb:
+        # Program policy lookups from the local index instead of web search
+        tools.append(kb)
+    # Bound in name order so the tool-schema block of every prompt is identical
+    tools = stable_tools(tools)
 
-    llm_with_tools = llm.bind_tools(tools) if tools else llm
+    # Tier routing in model_router; retries, timeouts and search degradation in call_policy
+    # Each request's prompt size is recorded per session in prompt_profile.PROFILES
+    llm_with_tools = profiled_model(routed_graph_model(tiers, tools, search_tool=tavily), tools)
 
-    def chatbot(state: MessagesState):
+    def chatbot_sync(state: MessagesState):
         result = llm_with_tools.invoke(state["messages"])
         return {"messages": [result]}
 
+    async def chatbot_async(state: MessagesState):
+        result = await llm_with_tools.ainvoke(state["messages"])
+        return {"messages": [result]}
+
+    # Same node under GRAPH.invoke and GRAPH.ainvoke
+    chatbot = RunnableCallable(chatbot_sync, chatbot_async, name="chatbot")
+
+    tool_node = ToolNode(tools=tools) if tools else None
+    if prefetch and tools:
+        # Likely tool calls start alongside the first LLM call
+        prefetcher = Prefetcher(tools, make_guess(query_course_schedule, known_instructors, tavily))
+        chatbot, tool_node = make_prefetch_nodes(llm_with_tools, tool_node, prefetcher)
+    if tool_node is not None:
+        # Oversized tool results are trimmed before they join the conversation
+        tool_node = budget_tool_node(tool_node)
+
     g = StateGraph(MessagesState)
     g.add_node("chatbot", chatbot)
     if tools:
-        g.add_node("tools", ToolNode(tools=tools))
+        g.add_node("tools", tool_node)
         g.add_conditional_edges("chatbot", tools_condition)
         g.add_edge("tools", "chatbot")
-    g.add_edge(START, "chatbot")
+    if fast_path and query_course_schedule:
+        # Unambiguous schedule lookups skip the first LLM hop
+        g.add_node("router", budget_tool_node(make_router_node(query_course_schedule, known_instructors),
+                                              name="router"))
+        g.add_edge(START, "router")
+        g.add_edge("router", "chatbot")
+    else:
+        g.add_edge(START, "chatbot")
     g.add_edge("chatbot", END)
     return g.compile()
 
 GRAPH = build_graph()
-SYSTEM_MSG = SystemMessage(content=REACT_SYSTEM_PROMPT)
\ No newline at end of file
+SYSTEM_MSG = SYSTEM_MESSAGE
\ No newline at end of file
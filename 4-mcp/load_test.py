@@ -0,0 +1,130 @@
+"""
+End-to-end load test for discord_frontend.py against fake_discord_mcp.py
+and a fake LLM. Reports reply latency percentiles and throughput.
+
+Example:
+  python load_test.py --channels 8 --rate 2 --burst poisson --duration 30 --pool-size 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from fake_discord_mcp import channel_ids
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--channels", type=int, default=4)
+    p.add_argument("--rate", type=float, default=1.0, help="messages per second per channel")
+    p.add_argument("--burst", choices=["steady", "poisson", "burst"], default="steady")
+    p.add_argument("--burst-size", type=int, default=10)
+    p.add_argument("--duration", type=float, default=20.0, help="seconds of traffic")
+    p.add_argument("--drain", type=float, default=5.0, help="seconds to let queued replies finish")
+    p.add_argument("--pool-size", type=int, default=1)
+    p.add_argument("--llm-latency-ms", type=float, default=200.0)
+    p.add_argument("--server-latency-ms", type=float, default=0.0)
+    p.add_argument("--diag", metavar="FILE", help="turn on diagnostics.py, sampling every second into FILE")
+    p.add_argument("--out", help="write the JSON report here as well")
+    return p.parse_args()
+
+
+def configure_env(args: argparse.Namespace) -> None:
+    # Must happen before config/graph/discord_frontend are imported
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key-for-load-test")
+    os.environ.pop("TAVILY_API_KEY", None)  # keep the test offline
+    os.environ["DISCORD_MCP_CMD"] = (
+        f"{sys.executable} {os.path.join(here, 'fake_discord_mcp.py')}"
+        f" --channels {args.channels} --rate {args.rate} --burst {args.burst}"
+        f" --burst-size {args.burst_size} --latency-ms {args.server_latency_ms}"
+    )
+    os.environ["DISCORD_ALLOWED_CHANNELS"] = ",".join(channel_ids(args.channels))
+    os.environ["DISCORD_MCP_POOL_SIZE"] = str(args.pool_size)
+    os.environ.setdefault("DISCORD_STATS_INTERVAL", "1e9")
+    if args.diag:
+        os.environ.update(DIAG="1", DIAG_FILE=args.diag, DIAG_INTERVAL_S="1")
+
+
+def diag_summary(path: str) -> dict:
+    with open(path) as f:
+        samples = [r for r in map(json.loads, f) if "rss_mb" in r]
+    if not samples:
+        return {"samples": 0}
+    return {
+        "samples": len(samples),
+        "rss_mb_first": samples[0]["rss_mb"],
+        "rss_mb_last": samples[-1]["rss_mb"],
+        "loop_lag_max_ms": max(s["loop_lag"].get("max_ms", 0.0) for s in samples),
+        "loop_lag_p99_ms_worst": max(s["loop_lag"].get("p99_ms", 0.0) for s in samples),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import discord_frontend
+    from fake_llm import FakeChatModel
+    from graph import build_graph
+    from metrics import summarize
+
+    discord_frontend.GRAPH = build_graph(llm=FakeChatModel(latency_s=args.llm_latency_ms / 1000.0))
+
+    pool = discord_frontend.make_pool()
+    controller = discord_frontend.make_admission()
+    await pool.start()
+    try:
+        bot = asyncio.create_task(discord_frontend.run_bot(pool, controller))
+        await asyncio.sleep(args.duration)
+        # Stop new traffic, then give in-flight replies time to land
+        await asyncio.gather(*(c.call_tool_text("stop_traffic", {}) for c in pool.clients))
+        await asyncio.sleep(args.drain)
+        bot.cancel()
+        try:
+            await bot
+        except asyncio.CancelledError:
+            pass
+
+        per_session = [json.loads(raw) for raw in await asyncio.gather(
+            *(c.call_tool_text("get_load_stats", {}) for c in pool.clients)
+        )]
+        latencies = [x for s in per_session for x in s["latencies"]]
+        answered = sum(s["answered"] for s in per_session)
+        report = {
+            "config": vars(args),
+            "generated": sum(s["generated"] for s in per_session),
+            "answered": answered,
+            "unanswered": sum(s["pending"] for s in per_session),
+            # Discord reads don't consume, so the frontend must skip what it has seen
+            "reads": sum(s["reads"] for s in per_session),
+            "redelivered": sum(s["redelivered"] for s in per_session),
+            "duplicate_replies": sum(s["duplicate_replies"] for s in per_session),
+            "throughput_rps": round(answered / (args.duration + args.drain), 3),
+            # Includes canned busy replies; see admission.shed for how many
+            "reply_latency": summarize(latencies),
+            "admission": controller.stats(),
+            "answer_cache": discord_frontend.ANSWER_CACHE.stats(),
+            "prefetch": discord_frontend.PREFETCH_STATS.snapshot(),
+            "tool_budget": discord_frontend.BUDGET_STATS.snapshot(),
+            "mcp": pool.stats(),
+            "histories": discord_frontend.history_stats(),
+        }
+        if args.diag:
+            report["diagnostics"] = diag_summary(args.diag)
+        return report
+    finally:
+        await pool.stop()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_env(args)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
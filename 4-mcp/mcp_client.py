@@ -1,45 +1,386 @@
+import asyncio
+import contextlib
 import json
-from typing import Dict, List, Optional
-from contextlib import AsyncExitStack
+import random
+import re
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set
 
+import anyio
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+from call_policy import clamp_timeout
+from metrics import summarize
+from tracing import args_hash, span
+
+# JSON Schema type name -> Python type(s) used for local payload validation
+_JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "object": dict,
+    "array": list,
+    "null": type(None),
+}
+
+
+def _is_connection_error(e: BaseException) -> bool:
+    # Raised when the server subprocess exits or its pipes close
+    if isinstance(e, McpError):
+        return e.error.code == CONNECTION_CLOSED
+    return isinstance(e, (anyio.ClosedResourceError, anyio.BrokenResourceError,
+                          anyio.EndOfStream, EOFError, ConnectionError))
+
+
+def _norm_key(key: str) -> str:
+    # channelId, channel_id and ChannelID all normalize to "channelid"
+    return re.sub(r"[^a-z0-9]", "", key.lower())
+
+
+def _type_ok(value: Any, json_type: Any) -> bool:
+    if json_type is None:
+        return True
+    types = json_type if isinstance(json_type, list) else [json_type]
+    for t in types:
+        py = _JSON_TYPES.get(t)
+        if py is None:
+            return True
+        # bool is an int subclass, but JSON keeps them apart
+        if isinstance(value, bool) and t in ("integer", "number"):
+            continue
+        if isinstance(value, py):
+            return True
+    return False
+
+
+def validate_args(schema: Dict[str, Any], args: Dict[str, Any]) -> List[str]:
+    """
+    Check args against a tool's inputSchema without a round trip.
+    Returns a list of problems; empty means the payload is acceptable.
+    Undeclared keys are only rejected under "additionalProperties": false,
+    as in JSON Schema; a mismatched naming convention still shows up as a
+    missing required key.
+    """
+    errors: List[str] = []
+    props = schema.get("properties") or {}
+    closed = schema.get("additionalProperties") is False
+    for key in schema.get("required") or []:
+        if key not in args:
+            errors.append(f"missing required '{key}'")
+    for key, value in args.items():
+        if closed and key not in props:
+            errors.append(f"unknown key '{key}'")
+            continue
+        if key in props and not _type_ok(value, props[key].get("type")):
+            errors.append(f"'{key}' should be {props[key].get('type')}")
+    return errors
+
+
+def adapt_args(schema: Dict[str, Any], args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rename keys to the schema's spelling (camelCase vs snake_case), coerce
+    scalars to the declared type where that is lossless, and drop optional
+    keys the schema does not declare (e.g. a cursor the server doesn't take).
+    """
+    props = schema.get("properties") or {}
+    required = set(schema.get("required") or [])
+    keep_extra = not props or bool(schema.get("additionalProperties"))
+    by_norm = {_norm_key(k): k for k in props}
+    out: Dict[str, Any] = {}
+    for key, value in args.items():
+        target = key if key in props else by_norm.get(_norm_key(key), key)
+        if target not in props and target not in required and not keep_extra:
+            continue
+        json_type = (props.get(target) or {}).get("type")
+        if json_type == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        elif json_type == "integer" and isinstance(value, str) and value.isdigit():
+            value = int(value)
+        out[target] = value
+    return out
+
 
 class MCPClient:
-    def __init__(self, cmd_argv: List[str]):
+    """
+    One stdio session to an MCP server subprocess.
+
+    The session is owned by a background task so it can be torn down and
+    restarted from any caller. Calls may run concurrently (up to
+    max_in_flight) and each has a deadline. When the server dies or stops
+    answering pings, the subprocess is restarted with exponential backoff,
+    and calls to tools listed in idempotent_tools are replayed once.
+    """
+
+    def __init__(self,
+                 cmd_argv: List[str],
+                 call_timeout: float = 30.0,
+                 startup_timeout: float = 60.0,
+                 max_in_flight: int = 16,
+                 idempotent_tools: Optional[Iterable[str]] = None,
+                 health_interval: float = 15.0,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0,
+                 max_reconnect_attempts: int = 8):
         self.cmd_argv = cmd_argv
-        self.exit_stack: Optional[AsyncExitStack] = None
+        self.call_timeout = call_timeout
+        self.startup_timeout = startup_timeout
+        self.idempotent_tools: Set[str] = set(idempotent_tools or [])
+        self.health_interval = health_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_reconnect_attempts = max_reconnect_attempts
         self.session: Optional[ClientSession] = None
-        self._stdio = None
-        self._write = None
+        # Tool name -> inputSchema, fetched once per (re)connect
+        self.tool_schemas: Dict[str, Dict[str, Any]] = {}
+        # Tool name -> index of the payload variant that last succeeded
+        self._preferred_variant: Dict[str, int] = {}
+
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._reconnect_lock = asyncio.Lock()
+        self._runner: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._generation = 0
+
+        # Exposed counters
+        self.reconnects = 0
+        self.replays = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=2048))
 
     async def start(self) -> None:
-        self.exit_stack = AsyncExitStack()
-        stdio = await self.exit_stack.enter_async_context(
-            stdio_client(StdioServerParameters(command=self.cmd_argv[0], args=self.cmd_argv[1:]))
-        )
-        self._stdio, self._write = stdio
-        self.session = await self.exit_stack.enter_async_context(
-            ClientSession(self._stdio, self._write)
-        )
-        await self.session.initialize()
+        await self._connect()
+        if self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
 
     async def stop(self) -> None:
-        if self.exit_stack:
-            await self.exit_stack.aclose()
-        self.exit_stack = None
+        if self._health_task:
+            self._health_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._health_task
+        self._health_task = None
+        await self._disconnect()
+
+    async def _run_session(self, ready: asyncio.Event, closing: asyncio.Event) -> None:
+        params = StdioServerParameters(command=self.cmd_argv[0], args=self.cmd_argv[1:])
+        async with stdio_client(params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                self.session = session
+                ready.set()
+                await closing.wait()
+
+    async def _connect(self) -> None:
+        ready, closing = asyncio.Event(), asyncio.Event()
+        runner = asyncio.create_task(self._run_session(ready, closing))
+        waiter = asyncio.create_task(ready.wait())
+        done, _ = await asyncio.wait({runner, waiter}, timeout=self.startup_timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if waiter not in done:
+            waiter.cancel()
+            closing.set()
+            runner.cancel()
+            with contextlib.suppress(BaseException):
+                await runner
+            if runner in done and runner.exception():
+                raise runner.exception()
+            raise TimeoutError(f"MCP server did not start within {self.startup_timeout}s: {self.cmd_argv}")
+        self._runner, self._closing = runner, closing
+        self._generation += 1
+        await self.refresh_tool_schemas()
+
+    async def _disconnect(self) -> None:
+        runner, closing = self._runner, self._closing
+        self._runner = self._closing = None
         self.session = None
-        self._stdio = None
-        self._write = None
+        if closing:
+            closing.set()
+        if runner:
+            try:
+                await asyncio.wait_for(runner, timeout=10)
+            except Exception:
+                # A dead or wedged subprocess may fail its own teardown
+                runner.cancel()
 
-    async def list_tool_names(self) -> List[str]:
-        assert self.session is not None
-        reply = await self.session.list_tools()
-        return [t.name for t in (reply.tools or [])]
+    async def _reconnect(self, seen_generation: int) -> None:
+        async with self._reconnect_lock:
+            if self._generation != seen_generation:
+                return  # someone else already restarted the server
+            await self._disconnect()
+            attempt = 0
+            while True:
+                try:
+                    await self._connect()
+                    self.reconnects += 1
+                    print(f"[mcp] reconnected to {self.cmd_argv[0]} (total {self.reconnects})", flush=True)
+                    return
+                except Exception as e:
+                    attempt += 1
+                    if attempt >= self.max_reconnect_attempts:
+                        raise ConnectionError(f"MCP server restart failed after {attempt} attempts") from e
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def ping(self, timeout: float = 5.0) -> bool:
+        session = self.session
+        if session is None:
+            return False
+        try:
+            await asyncio.wait_for(session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            generation = self._generation
+            if not await self.ping():
+                print("[mcp] health check failed, restarting server", flush=True)
+                with contextlib.suppress(Exception):
+                    await self._reconnect(generation)
+
+    @staticmethod
+    def _left(end: Optional[float]) -> Optional[float]:
+        """Seconds until end, capped by the turn deadline; TimeoutError when none is left."""
+        left = clamp_timeout(None if end is None else end - time.monotonic())
+        if left is not None and left <= 0:
+            raise asyncio.TimeoutError()
+        return left
+
+    async def _request(self, label: str, fn: Callable[[ClientSession], Awaitable[Any]],
+                       idempotent: bool, timeout: Optional[float]) -> Any:
+        """
+        Run fn(session) with a deadline, restarting the server on connection
+        loss. Idempotent requests are retried once on the new session. The
+        slot wait, the call and any replay all share the one deadline.
+        """
+        # A chat turn's overall deadline (call_policy.turn_deadline) caps the call too
+        budget = clamp_timeout(self.call_timeout if timeout is None else timeout)
+        end = None if budget is None else time.monotonic() + budget
+        attempts = 2 if idempotent else 1
+        for attempt in range(attempts):
+            generation = self._generation
+            session = self.session
+            queued = True
+            try:
+                if session is None:
+                    raise anyio.ClosedResourceError()
+                await asyncio.wait_for(self._slots.acquire(), self._left(end))
+                try:
+                    left = self._left(end)
+                    queued = False
+                    self.in_flight += 1
+                    t0 = time.perf_counter()
+                    try:
+                        result = await asyncio.wait_for(fn(session), left)
+                    finally:
+                        self.in_flight -= 1
+                finally:
+                    self._slots.release()
+                self.latencies[label].append(time.perf_counter() - t0)
+                return result
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                # Out of budget before the call started, or a stalled call while
+                # the server still answers: nothing to restart
+                if queued or await self.ping():
+                    raise
+                await self._reconnect(generation)
+                if attempt + 1 >= attempts:
+                    raise
+            except Exception as e:
+                if not _is_connection_error(e):
+                    raise
+                await self._reconnect(generation)
+                if attempt + 1 >= attempts:
+                    raise
+            self.replays += 1
+        raise AssertionError("unreachable")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "reconnects": self.reconnects,
+            "replays": self.replays,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "latency": {name: summarize(v) for name, v in self.latencies.items()},
+        }
 
-    async def call_tool_text(self, tool_name: str, args: Dict) -> str:
+    async def refresh_tool_schemas(self) -> Dict[str, Dict[str, Any]]:
         assert self.session is not None
-        resp = await self.session.call_tool(tool_name, args)
+        reply = await asyncio.wait_for(self.session.list_tools(), self.call_timeout)
+        self.tool_schemas = {t.name: (t.inputSchema or {}) for t in (reply.tools or [])}
+        self._preferred_variant.clear()
+        return self.tool_schemas
+
+    async def list_tool_names(self) -> List[str]:
+        if self.tool_schemas:
+            return list(self.tool_schemas)
+        await self.refresh_tool_schemas()
+        return list(self.tool_schemas)
+
+    def select_payload(self, tool_name: str, variants: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Pick the argument shape for tool_name from the cached schema.
+        Order of preference: the variant that succeeded last time, the first
+        variant that validates as-is, then the first one that validates after
+        adapt_args. The chosen payload always goes through adapt_args, so keys
+        the schema doesn't declare are left out. Raises ValueError if nothing
+        fits, so no round trip is spent.
+        """
+        if not variants:
+            raise ValueError(f"No payload variants given for '{tool_name}'")
+        schema = self.tool_schemas.get(tool_name)
+        if not schema:
+            return variants[self._preferred_variant.get(tool_name, 0)]
+
+        preferred = self._preferred_variant.get(tool_name)
+        if preferred is not None and preferred < len(variants):
+            payload = adapt_args(schema, variants[preferred])
+            if not validate_args(schema, payload):
+                return payload
+
+        for i, payload in enumerate(variants):
+            if not validate_args(schema, payload):
+                self._preferred_variant[tool_name] = i
+                return adapt_args(schema, payload)
+
+        problems = []
+        for i, variant in enumerate(variants):
+            payload = adapt_args(schema, variant)
+            errors = validate_args(schema, payload)
+            if not errors:
+                self._preferred_variant[tool_name] = i
+                return payload
+            problems.append(f"variant {i}: {'; '.join(errors)}")
+        raise ValueError(f"No payload fits the schema of '{tool_name}': " + " | ".join(problems))
+
+    async def call_tool_variants(self, tool_name: str, variants: List[Dict[str, Any]],
+                                 timeout: Optional[float] = None) -> str:
+        """Send exactly one call_tool using the payload chosen by select_payload."""
+        payload = self.select_payload(tool_name, variants)
+        try:
+            return await self.call_tool_text(tool_name, payload, timeout=timeout)
+        except Exception:
+            # Re-select next time instead of trusting a shape that just failed
+            self._preferred_variant.pop(tool_name, None)
+            raise
+
+    async def call_tool_text(self, tool_name: str, args: Dict, timeout: Optional[float] = None) -> str:
+        with span("mcp.call_tool", kind="client", **{"tool.name": tool_name, "tool.args_hash": args_hash(args)}):
+            resp = await self._request(
+                tool_name,
+                lambda session: session.call_tool(tool_name, args),
+                idempotent=tool_name in self.idempotent_tools,
+                timeout=timeout,
+            )
         items = resp.content or []
         for it in items:
             if getattr(it, "type", None) == "text":
@@ -47,4 +388,4 @@ class MCPClient:
         return json.dumps(
             [getattr(i, "model_dump", lambda: {"type": getattr(i, "type", None)})() for i in items],
             ensure_ascii=False
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from call_policy import CallPolicy
+from mcp_client import MCPClient
+
+
+class MCPPool:
+    """
+    N MCPClient sessions (one server subprocess each) behind the same call
+    interface as MCPClient.
+
+    Calls without a key go to the session with the fewest outstanding
+    requests. Calls with a key (a channel id) stick to the session first
+    chosen for that key and are serialized per key, so reads and sends for
+    one channel keep their order while different channels run in parallel.
+
+    With a policy, calls to idempotent tools get its attempt timeout,
+    retries and hedging. Unkeyed attempts each pick the least loaded
+    session, so a hedge lands on a different session than the slow one;
+    keyed calls run the policy inside the key's lock, on the key's session.
+    """
+
+    def __init__(self, cmd_argv: List[str], size: int = 1, policy: Optional[CallPolicy] = None,
+                 **client_kwargs: Any):
+        if size < 1:
+            raise ValueError("MCP pool size must be at least 1")
+        self.clients = [MCPClient(cmd_argv, **client_kwargs) for _ in range(size)]
+        self.policy = policy
+        self._outstanding = [0] * size
+        self._affinity: Dict[str, int] = {}
+        self._key_locks: Dict[str, asyncio.Lock] = {}
+
+    async def start(self) -> None:
+        await asyncio.gather(*(c.start() for c in self.clients))
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(c.stop() for c in self.clients), return_exceptions=True)
+
+    @property
+    def tool_schemas(self) -> Dict[str, Dict[str, Any]]:
+        # Every session runs the same server image, so the first one is representative
+        return self.clients[0].tool_schemas
+
+    async def list_tool_names(self) -> List[str]:
+        return await self.clients[0].list_tool_names()
+
+    def _least_outstanding(self) -> int:
+        keys_per_client = [0] * len(self.clients)
+        for idx in self._affinity.values():
+            keys_per_client[idx] += 1
+        return min(range(len(self.clients)),
+                   key=lambda i: (self._outstanding[i], keys_per_client[i]))
+
+    def _index_for(self, key: Optional[str]) -> int:
+        if key is None:
+            return self._least_outstanding()
+        if key not in self._affinity:
+            self._affinity[key] = self._least_outstanding()
+            self._key_locks[key] = asyncio.Lock()
+        return self._affinity[key]
+
+    async def _call(self, idx: int, method: str, *args: Any, **kwargs: Any) -> str:
+        self._outstanding[idx] += 1
+        try:
+            return await getattr(self.clients[idx], method)(*args, **kwargs)
+        finally:
+            self._outstanding[idx] -= 1
+
+    async def _dispatch(self, key: Optional[str], method: str, tool_name: str,
+                        *args: Any, **kwargs: Any) -> str:
+        guarded = self.policy is not None and tool_name in self.clients[0].idempotent_tools
+        if key is None:
+            call = lambda: self._call(self._least_outstanding(), method, tool_name, *args, **kwargs)
+            return await (self.policy.acall(call) if guarded else call())
+        idx = self._index_for(key)
+        client = self.clients[idx]
+        # Waiting behind the key's lock counts as load on its session
+        self._outstanding[idx] += 1
+        try:
+            async with self._key_locks[key]:
+                call = lambda: getattr(client, method)(tool_name, *args, **kwargs)
+                return await (self.policy.acall(call) if guarded else call())
+        finally:
+            self._outstanding[idx] -= 1
+
+    async def call_tool_text(self, tool_name: str, args: Dict, timeout: Optional[float] = None,
+                             key: Optional[str] = None) -> str:
+        return await self._dispatch(key, "call_tool_text", tool_name, args, timeout=timeout)
+
+    async def call_tool_variants(self, tool_name: str, variants: List[Dict[str, Any]],
+                                 timeout: Optional[float] = None, key: Optional[str] = None) -> str:
+        return await self._dispatch(key, "call_tool_variants", tool_name, variants, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self.clients),
+            "outstanding": list(self._outstanding),
+            "keys_per_session": [sum(1 for i in self._affinity.values() if i == n)
+                                 for n in range(len(self.clients))],
+            "sessions": [c.stats() for c in self.clients],
+            "policy": self.policy.stats() if self.policy is not None else None,
+        }
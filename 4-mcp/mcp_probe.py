@@ -1,7 +1,9 @@
-import asyncio, os, shlex, json, sys
+import argparse, asyncio, os, platform, shlex, json, sys, time
+from datetime import datetime, timezone
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 import config
+from metrics import summarize
 
 DISCORD_MCP_CMD = os.getenv("DISCORD_MCP_CMD")
 TEST_CHANNEL_NAME = os.getenv("TEST_CHANNEL_NAME", "mcp-testing")
@@ -33,6 +35,32 @@ async def call_tool(session, name, args):
         print(f"{name} failed:", e)
         return None
 
+def extract_channel_id(fc):
+    """Try to extract a channel id robustly from find_channel's content items."""
+    channel_id = None
+    for c in (getattr(fc, "content", []) or []):
+        # Prefer structured meta first
+        if hasattr(c, "model_dump"):
+            d = c.model_dump() or {}
+            meta = d.get("meta") or {}
+            channel_id = meta.get("channelId") or channel_id
+            if not channel_id and isinstance(d.get("text"), str):
+                # Sometimes the tool returns a JSON string in text
+                try:
+                    obj = json.loads(d["text"])
+                    channel_id = obj.get("id") or obj.get("channelId") or channel_id
+                except Exception:
+                    pass
+        # Fallback if it’s a simple text content
+        if not channel_id and hasattr(c, "text") and isinstance(c.text, str):
+            try:
+                obj = json.loads(c.text)
+                channel_id = obj.get("id") or obj.get("channelId") or channel_id
+            except Exception:
+                # If the tool just returned a name, ignore
+                pass
+    return channel_id
+
 async def main():
     if not DISCORD_MCP_CMD:
         raise RuntimeError("Set DISCORD_MCP_CMD to your docker run command in DISCORD_MCP_CMD")
@@ -68,30 +96,7 @@ async def main():
                 print(f"find_channel('{TEST_CHANNEL_NAME}') failed.")
                 return
 
-            # Try to extract a channel id robustly from the returned content items
-            channel_id = None
-            for c in (getattr(fc, "content", []) or []):
-                # Prefer structured meta first
-                if hasattr(c, "model_dump"):
-                    d = c.model_dump() or {}
-                    meta = d.get("meta") or {}
-                    channel_id = meta.get("channelId") or channel_id
-                    if not channel_id and isinstance(d.get("text"), str):
-                        # Sometimes the tool returns a JSON string in text
-                        try:
-                            obj = json.loads(d["text"])
-                            channel_id = obj.get("id") or obj.get("channelId") or channel_id
-                        except Exception:
-                            pass
-                # Fallback if it’s a simple text content
-                if not channel_id and hasattr(c, "text") and isinstance(c.text, str):
-                    try:
-                        obj = json.loads(c.text)
-                        channel_id = obj.get("id") or obj.get("channelId") or channel_id
-                    except Exception:
-                        # If the tool just returned a name, ignore
-                        pass
-
+            channel_id = extract_channel_id(fc)
             channel_id = channel_id or os.getenv("TEST_CHANNEL_ID")
             if not channel_id:
                 print("No channelId resolved. Set TEST_CHANNEL_ID explicitly or adjust parsing to your server’s response.")
@@ -99,8 +104,156 @@ async def main():
 
             await call_tool(session, "read_messages", {"channelId": channel_id, "limit": 1})
 
+def _text_of(resp):
+    for c in (getattr(resp, "content", []) or []):
+        if getattr(c, "type", None) == "text":
+            return c.text
+    return ""
+
+async def timed_session(argv):
+    """Open a session and return (session_cm stack, startup_s, list_tools_s)."""
+    t0 = time.perf_counter()
+    client_cm = stdio_client(StdioServerParameters(command=argv[0], args=argv[1:]))
+    read, write = await client_cm.__aenter__()
+    session_cm = ClientSession(read, write)
+    session = await session_cm.__aenter__()
+    await session.initialize()
+    startup_s = time.perf_counter() - t0
+    t1 = time.perf_counter()
+    await session.list_tools()
+    return (client_cm, session_cm, session), startup_s, time.perf_counter() - t1
+
+async def close_session(handles):
+    client_cm, session_cm, _ = handles
+    await session_cm.__aexit__(None, None, None)
+    await client_cm.__aexit__(None, None, None)
+
+async def timed_calls(session, name, args, total, concurrency):
+    """Run `total` calls with `concurrency` workers; return latencies, errors, wall time."""
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            t0 = time.perf_counter()
+            try:
+                resp = await session.call_tool(name, args)
+                if getattr(resp, "isError", False):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - t0
+
+def _series(latencies, errors, wall_s):
+    out = summarize(latencies)
+    out["errors"] = errors
+    out["throughput_rps"] = round(len(latencies) / wall_s, 3) if wall_s else 0.0
+    return out
+
+async def bench(args):
+    """
+    Measure session startup (the first launch includes docker cold start),
+    list_tools, per-tool latency, a concurrency sweep and a payload-size sweep.
+    """
+    if not DISCORD_MCP_CMD:
+        raise RuntimeError("Set DISCORD_MCP_CMD to your docker run command in DISCORD_MCP_CMD")
+    argv = shlex.split(DISCORD_MCP_CMD)
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "cmd": argv,
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "iterations": args.iterations,
+        },
+    }
+
+    startups, list_tools_times = [], []
+    for i in range(args.launches):
+        handles, startup_s, list_tools_s = await timed_session(argv)
+        startups.append(startup_s)
+        list_tools_times.append(list_tools_s)
+        if i < args.launches - 1:
+            await close_session(handles)
+    results["startup"] = {"cold_s": round(startups[0], 4), "warm": summarize(startups[1:])}
+    results["list_tools"] = summarize(list_tools_times)
+
+    session = handles[2]
+    try:
+        fc = await session.call_tool("find_channel", {"channelName": TEST_CHANNEL_NAME})
+        channel_id = extract_channel_id(fc) or os.getenv("TEST_CHANNEL_ID")
+        if not channel_id:
+            raise RuntimeError("No channelId resolved. Set TEST_CHANNEL_ID explicitly.")
+
+        probes = {
+            "get_server_info": {},
+            "list_channels": {},
+            "find_channel": {"channelName": TEST_CHANNEL_NAME},
+            "read_messages": {"channelId": channel_id, "limit": 1},
+        }
+        results["tools"] = {}
+        for name, tool_args in probes.items():
+            lat, err, wall = await timed_calls(session, name, tool_args, args.iterations, 1)
+            results["tools"][name] = _series(lat, err, wall)
+            print(f"[bench] {name}: {results['tools'][name]}", flush=True)
+
+        results["concurrency"] = []
+        for level in args.concurrency:
+            lat, err, wall = await timed_calls(
+                session, "read_messages", {"channelId": channel_id, "limit": 1},
+                max(args.iterations, level), level,
+            )
+            row = {"tool": "read_messages", "concurrency": level, **_series(lat, err, wall)}
+            results["concurrency"].append(row)
+            print(f"[bench] concurrency {level}: {row}", flush=True)
+
+        # Response size scales with read_messages(limit); request size with
+        # send_message(content), which posts real messages so it is opt-in.
+        results["payload"] = []
+        for limit in args.read_limits:
+            lat, err, wall = await timed_calls(
+                session, "read_messages", {"channelId": channel_id, "limit": limit}, args.iterations, 1,
+            )
+            results["payload"].append({"tool": "read_messages", "limit": limit, **_series(lat, err, wall)})
+        if args.allow_send:
+            for size in args.payload_sizes:
+                content = "x" * size
+                lat, err, wall = await timed_calls(
+                    session, "send_message", {"channelId": channel_id, "content": content}, args.iterations, 1,
+                )
+                results["payload"].append({"tool": "send_message", "bytes": size, **_series(lat, err, wall)})
+    finally:
+        await close_session(handles)
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[bench] wrote {args.out}", flush=True)
+    return results
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Discord MCP connectivity probe and latency benchmark")
+    p.add_argument("--bench", action="store_true", help="run the latency/concurrency benchmark")
+    p.add_argument("--iterations", type=int, default=50, help="calls per measurement")
+    p.add_argument("--launches", type=int, default=3, help="server launches for startup timing")
+    p.add_argument("--concurrency", type=_int_list, default=[1, 4, 16, 64])
+    p.add_argument("--read-limits", type=_int_list, default=[1, 10, 50])
+    p.add_argument("--payload-sizes", type=_int_list, default=[16, 256, 1900])
+    p.add_argument("--allow-send", action="store_true",
+                   help="include the send_message payload sweep (posts to TEST_CHANNEL_NAME)")
+    p.add_argument("--out", default="mcp_bench.json", help="where to write JSON results")
+    return p.parse_args(argv)
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(bench(args) if args.bench else main())
     except KeyboardInterrupt:
         sys.exit(130)
\ No newline at end of file
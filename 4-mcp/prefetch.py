@@ -0,0 +1,266 @@
+"""
+Speculative tool prefetch.
+
+When a new question arrives, likely tool calls are guessed from the text
+(course codes, instructor names, optionally the question itself as a web
+search) and started in a thread pool while the first LLM call is running.
+If the model then asks for one of them, the tools node serves the
+prefetched result instead of running the tool again. Guesses the model
+did not ask for are cancelled after the first tools hop or when the model
+answers directly.
+"""
+import asyncio
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.utils.runnable import RunnableCallable
+
+from router import COURSE_CODE
+
+MAX_GUESSES = 4
+
+
+def _norm_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return re.sub(r"[\s\-]+", "", value).lower()
+    return value
+
+
+def call_key(name: str, args: Dict[str, Any]) -> Tuple:
+    """Match key for a tool call; case, spacing and unset args are ignored."""
+    return (name,) + tuple(sorted((k, _norm_value(v)) for k, v in args.items() if v not in (None, "")))
+
+
+def schedule_guesses(text: str, instructors: Iterable[str], tool_name: str = "query_course_schedule"):
+    """query_course_schedule calls a model would plausibly make for text."""
+    calls = []
+    for dept, num in COURSE_CODE.findall(text):
+        calls.append((tool_name, {"course": f"{dept.upper()}{num}"}))
+    lowered = text.lower()
+    for name in instructors:
+        if re.search(rf"\b{re.escape(name.lower())}\b", lowered):
+            calls.append((tool_name, {"instructor": name}))
+    return calls
+
+
+class PrefetchStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Counter = Counter()
+        self.saved_s = 0.0
+
+    def add(self, key: str, n: int = 1, saved_s: float = 0.0) -> None:
+        with self._lock:
+            self.counters[key] += n
+            self.saved_s += saved_s
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self.counters)
+            issued = self.counters["issued"]
+            out["hit_rate"] = round(self.counters["hits"] / issued, 3) if issued else 0.0
+            out["saved_ms"] = round(self.saved_s * 1000, 1)
+            return out
+
+
+# Shared by every graph in the process, like the search cache
+STATS = PrefetchStats()
+
+
+class _Prefetch:
+    __slots__ = ("future", "started")
+
+    def __init__(self, future: Future, started: float):
+        self.future = future
+        self.started = started
+
+
+class Prefetcher:
+    """
+    guess(text) returns [(tool_name, args), ...]. Prefetches are grouped by
+    turn, the id of the HumanMessage that started them.
+    """
+
+    def __init__(self, tools: List[Any], guess: Callable[[str], List[Tuple[str, Dict]]],
+                 max_workers: int = 4, stats: PrefetchStats = STATS):
+        self.tools = {t.name: t for t in tools}
+        self.guess = guess
+        self.stats = stats
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._turns: Dict[str, Dict[Tuple, _Prefetch]] = {}
+        self._lock = threading.Lock()
+
+    def _run(self, name: str, args: Dict[str, Any]) -> Tuple[Any, float]:
+        result = self.tools[name].invoke({"type": "tool_call", "name": name, "args": args, "id": "prefetch"})
+        return result, time.perf_counter()
+
+    def start(self, turn: str, text: str) -> None:
+        if not turn:
+            return
+        pending: Dict[Tuple, _Prefetch] = {}
+        for name, args in self.guess(text)[:MAX_GUESSES]:
+            key = call_key(name, args)
+            if name not in self.tools or key in pending:
+                continue
+            # Carry the turn's deadline and trace span into the worker thread, as tools.py does
+            future = self._executor.submit(contextvars.copy_context().run, self._run, name, args)
+            pending[key] = _Prefetch(future, time.perf_counter())
+        if pending:
+            self.stats.add("issued", len(pending))
+            with self._lock:
+                self._turns[turn] = pending
+
+    def _pop(self, turn: str, call: Dict[str, Any]) -> Optional[_Prefetch]:
+        with self._lock:
+            return self._turns.get(turn, {}).pop(call_key(call["name"], call.get("args") or {}), None)
+
+    def take(self, turn: str, call: Dict[str, Any]) -> Optional[ToolMessage]:
+        """Prefetched result for a model tool call, or None if it must run now."""
+        entry = self._pop(turn, call)
+        if entry is None:
+            return None
+        waited_from = time.perf_counter()
+        try:
+            result, finished = entry.future.result()
+        except Exception:
+            self.stats.add("failed")
+            return None
+        return self._served(entry, call, result, finished, waited_from)
+
+    async def atake(self, turn: str, call: Dict[str, Any]) -> Optional[ToolMessage]:
+        entry = self._pop(turn, call)
+        if entry is None:
+            return None
+        waited_from = time.perf_counter()
+        try:
+            result, finished = await asyncio.wrap_future(entry.future)
+        except Exception:
+            self.stats.add("failed")
+            return None
+        return self._served(entry, call, result, finished, waited_from)
+
+    def _served(self, entry: _Prefetch, call: Dict[str, Any], result: Any,
+                finished: float, waited_from: float) -> Optional[ToolMessage]:
+        if not isinstance(result, ToolMessage) or result.status == "error":
+            self.stats.add("failed")
+            return None
+        # Time the tool would have taken had it started only now
+        ran = finished - entry.started
+        waited = time.perf_counter() - waited_from
+        self.stats.add("hits", saved_s=max(0.0, ran - waited))
+        return result.model_copy(update={"tool_call_id": call["id"], "id": None})
+
+    def finish(self, turn: str) -> None:
+        """Cancel whatever the model did not ask for."""
+        with self._lock:
+            leftover = self._turns.pop(turn, {})
+        if leftover:
+            self.stats.add("unused", len(leftover))
+            self.stats.add("cancelled", sum(1 for e in leftover.values() if e.future.cancel()))
+
+
+def prefetch_enabled() -> bool:
+    return os.getenv("SCHEDULE_PREFETCH", "1") != "0"
+
+
+def make_guess(schedule_tool, instructors: Callable[[], List[str]], search_tool=None):
+    """Guesses for build_graph; web search guesses only with PREFETCH_SEARCH=1."""
+    with_search = search_tool is not None and os.getenv("PREFETCH_SEARCH", "0") == "1"
+
+    def guess(text: str) -> List[Tuple[str, Dict]]:
+        calls = schedule_guesses(text, instructors(), schedule_tool.name) if schedule_tool else []
+        if with_search:
+            calls.append((search_tool.name, {"query": text}))
+        return calls
+
+    return guess
+
+
+def current_turn(messages: List[Any]) -> str:
+    for m in reversed(messages):
+        if isinstance(m, HumanMessage):
+            return m.id or ""
+    return ""
+
+
+def make_prefetch_nodes(llm_with_tools, tool_node, prefetcher: Prefetcher):
+    """
+    chatbot and tools graph nodes that prefetch on the first hop of each
+    turn. Both run under graph.invoke and graph.ainvoke.
+    """
+
+    def before_llm(messages: List[Any]) -> str:
+        turn = current_turn(messages)
+        if messages and isinstance(messages[-1], HumanMessage):
+            prefetcher.start(turn, str(messages[-1].content))
+        return turn
+
+    async def abefore_llm(messages: List[Any]) -> str:
+        if messages and isinstance(messages[-1], HumanMessage):
+            # Guessing may parse the schedule spreadsheet; keep it off the event loop
+            return await asyncio.to_thread(before_llm, messages)
+        return current_turn(messages)
+
+    def after_llm(turn: str, result: Any) -> Dict:
+        if not getattr(result, "tool_calls", None):
+            prefetcher.finish(turn)
+        return {"messages": [result]}
+
+    def chatbot(state) -> Dict:
+        turn = before_llm(state["messages"])
+        try:
+            result = llm_with_tools.invoke(state["messages"])
+        except BaseException:
+            # Timeouts, give-ups and deadlines would otherwise leave the turn's prefetches behind
+            prefetcher.finish(turn)
+            raise
+        return after_llm(turn, result)
+
+    async def achatbot(state) -> Dict:
+        turn = await abefore_llm(state["messages"])
+        try:
+            result = await llm_with_tools.ainvoke(state["messages"])
+        except BaseException:
+            prefetcher.finish(turn)
+            raise
+        return after_llm(turn, result)
+
+    def in_order(ai: AIMessage, served: Dict[str, ToolMessage], ran: List[ToolMessage]) -> Dict:
+        for m in ran:
+            served[m.tool_call_id] = m
+        return {"messages": [served[c["id"]] for c in ai.tool_calls if c["id"] in served]}
+
+    def tools(state) -> Dict:
+        turn = current_turn(state["messages"])
+        ai: AIMessage = state["messages"][-1]
+        served = {c["id"]: m for c in ai.tool_calls if (m := prefetcher.take(turn, c)) is not None}
+        prefetcher.finish(turn)
+        remaining = [c for c in ai.tool_calls if c["id"] not in served]
+        ran = []
+        if remaining:
+            rest = ai.model_copy(update={"tool_calls": remaining})
+            ran = tool_node.invoke({"messages": [rest]})["messages"]
+        return in_order(ai, served, ran)
+
+    async def atools(state) -> Dict:
+        turn = current_turn(state["messages"])
+        ai: AIMessage = state["messages"][-1]
+        hits = await asyncio.gather(*(prefetcher.atake(turn, c) for c in ai.tool_calls))
+        served = {c["id"]: m for c, m in zip(ai.tool_calls, hits) if m is not None}
+        prefetcher.finish(turn)
+        remaining = [c for c in ai.tool_calls if c["id"] not in served]
+        ran = []
+        if remaining:
+            rest = ai.model_copy(update={"tool_calls": remaining})
+            ran = (await tool_node.ainvoke({"messages": [rest]}))["messages"]
+        return in_order(ai, served, ran)
+
+    return (RunnableCallable(chatbot, achatbot, name="chatbot"),
+            RunnableCallable(tools, atools, name="tools"))
@@ -0,0 +1,110 @@
+"""
+Deterministic fast path for pure course-schedule lookups.
+
+A message like "Who teaches CMSC 691?" or "What classes does Damevski teach?"
+is parsed locally; if it names exactly one course code or one known
+instructor and asks nothing else, the router node runs query_course_schedule
+itself and appends the call and its result to the conversation. The chatbot
+then only has to phrase the answer, which saves the first LLM hop of the
+ReAct loop. Anything ambiguous falls through to the normal loop unchanged.
+"""
+import asyncio
+import re
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.prebuilt.tool_node import ToolNode
+from langgraph.utils.runnable import RunnableCallable
+
+COURSE_CODE = re.compile(r"\b([A-Za-z]{4})\s*-?\s*(\d{3})\b")
+
+# Phrases that mark a schedule lookup
+LOOKUP_CUES = (
+    "who teaches", "who is teaching", "who's teaching", "instructor", "professor", "taught by",
+    "teach", "when does", "when is", "what time", "where is", "where does", "meet", "schedule",
+    "section", "crn", "room", "building", "modality", "online", "enrollment", "seats",
+    "what courses", "which courses", "what classes", "which classes",
+)
+
+# Phrases that need judgment beyond the lookup; these go through the full loop
+NEEDS_REASONING = (
+    "should", "recommend", "better", "compare", "versus", " vs", "prereq", "require",
+    "why", "help me", "plan", "substitute", "transfer", "deadline", "apply", "email",
+    "graduate", "gpa", "funding",
+)
+
+MAX_WORDS = 25
+
+
+def parse_schedule_lookup(text: str, instructors: Iterable[str]) -> Optional[Dict[str, str]]:
+    """Return query_course_schedule args for an unambiguous lookup, else None."""
+    lowered = " ".join(text.lower().split())
+    if not lowered or len(lowered.split()) > MAX_WORDS:
+        return None
+    if not any(cue in lowered for cue in LOOKUP_CUES):
+        return None
+    if any(marker in text.lower() for marker in NEEDS_REASONING):
+        return None
+
+    codes = {f"{dept.upper()}{num}" for dept, num in COURSE_CODE.findall(text)}
+    names = {name for name in instructors
+             if re.search(rf"\b{re.escape(name.lower())}\b", lowered)}
+
+    if len(codes) == 1 and not names:
+        return {"course": codes.pop()}
+    if len(names) == 1 and not codes:
+        return {"instructor": names.pop()}
+    return None
+
+
+def make_router_node(schedule_tool, instructors: Callable[[], List[str]]):
+    """
+    Build the "router" graph node. instructors is called per turn so the list
+    follows the cached schedule when the spreadsheet changes; it may parse the
+    spreadsheet, so the async node calls it in a worker thread. The node runs
+    under both graph.invoke and graph.ainvoke.
+    """
+    tool_node = ToolNode(tools=[schedule_tool])
+
+    def question(state) -> Optional[str]:
+        messages = state["messages"]
+        if not messages or not isinstance(messages[-1], HumanMessage):
+            return None
+        return str(messages[-1].content)
+
+    def fast_path_call(text: Optional[str], names: List[str]) -> Optional[AIMessage]:
+        if text is None:
+            return None
+        args = parse_schedule_lookup(text, names)
+        if args is None:
+            return None
+        return AIMessage(
+            content="",
+            tool_calls=[{
+                "name": schedule_tool.name,
+                "args": args,
+                "id": f"call_fastpath_{uuid.uuid4().hex[:12]}",
+                "type": "tool_call",
+            }],
+        )
+
+    def router(state) -> Dict:
+        text = question(state)
+        call = fast_path_call(text, instructors() if text is not None else [])
+        if call is None:
+            return {"messages": []}
+        result = tool_node.invoke({"messages": [call]})
+        return {"messages": [call] + result["messages"]}
+
+    async def arouter(state) -> Dict:
+        text = question(state)
+        # A cold schedule cache means a read_excel; keep it off the event loop
+        names = await asyncio.to_thread(instructors) if text is not None else []
+        call = fast_path_call(text, names)
+        if call is None:
+            return {"messages": []}
+        result = await tool_node.ainvoke({"messages": [call]})
+        return {"messages": [call] + result["messages"]}
+
+    return RunnableCallable(router, arouter, name="router")
@@ -0,0 +1,272 @@
+"""
+TTL cache for web search tool results (e.g. TavilySearchResults).
+
+- Keys are normalized queries, prefixed with the tool name and max_results.
+- The in-memory tier is an LRU bounded by max_entries with a TTL per entry.
+- Concurrent identical queries are coalesced into one upstream call
+  (single flight), separately for threads and for asyncio tasks.
+- An optional SQLite tier (SEARCH_CACHE_PATH) is shared across processes.
+  Expired rows are purged every PURGE_EVERY stores, and the oldest rows
+  beyond max_rows (SEARCH_CACHE_MAX_ROWS) are dropped with them.
+- A cancelled caller doesn't cancel the upstream call for the others
+  waiting on it; the call is cancelled once nobody is waiting.
+- Error results (Tavily returns (repr(e), {})) are never cached.
+"""
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+
+
+def normalize_query(query: str) -> str:
+    query = re.sub(r"\s+", " ", str(query).lower()).strip()
+    return query.rstrip("?.! ")
+
+
+def _cacheable(value: Any) -> bool:
+    if isinstance(value, tuple) and len(value) == 2:
+        # content_and_artifact tools: an empty artifact marks a failed call
+        return bool(value[1])
+    return bool(value)
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _AsyncFlight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+PURGE_EVERY = 100
+
+
+class SearchCache:
+    def __init__(self, ttl_s: float = 3600.0, max_entries: int = 1024, path: Optional[str] = None,
+                 max_rows: int = 20000):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[Tuple[int, str], _AsyncFlight] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS search_cache_expires ON search_cache (expires)")
+        self.counters: Counter = Counter()
+        if self._db is not None:
+            self._purge_locked()
+
+    # --- storage tiers -------------------------------------------------
+
+    def _get_locked(self, key: str) -> Tuple[bool, Any]:
+        now = time.time()
+        item = self._mem.get(key)
+        if item is not None:
+            expires, value = item
+            if expires > now:
+                self._mem.move_to_end(key)
+                self.counters["hits"] += 1
+                return True, value
+            del self._mem[key]
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[1] > now:
+                stored = json.loads(row[0])
+                value = tuple(stored["v"]) if stored.get("tuple") else stored["v"]
+                self._put_mem_locked(key, value, row[1])
+                self.counters["persistent_hits"] += 1
+                return True, value
+        return False, None
+
+    def _put_mem_locked(self, key: str, value: Any, expires: float) -> None:
+        self._mem[key] = (expires, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _put_locked(self, key: str, value: Any) -> None:
+        expires = time.time() + self.ttl_s
+        self._put_mem_locked(key, value, expires)
+        self.counters["stores"] += 1
+        if self._db is not None:
+            blob = json.dumps({"v": value, "tuple": isinstance(value, tuple)}, default=str)
+            self._db.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, blob, expires),
+            )
+            if self.counters["stores"] % PURGE_EVERY == 0:
+                self._purge_locked()
+
+    def _purge_locked(self) -> None:
+        """Drop expired rows, then the soonest-expiring rows beyond max_rows."""
+        expired = self._db.execute("DELETE FROM search_cache WHERE expires <= ?", (time.time(),)).rowcount
+        over = self._db.execute(
+            "DELETE FROM search_cache WHERE key IN "
+            "(SELECT key FROM search_cache ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        ).rowcount
+        self.counters["purged"] += max(expired, 0) + max(over, 0)
+
+    # --- single-flight lookups ------------------------------------------
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            found, value = self._get_locked(key)
+            if found:
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.counters["misses"] += 1
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = compute()
+            if _cacheable(flight.value):
+                with self._lock:
+                    self._put_locked(key, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        fkey = (id(loop), key)
+        with self._lock:
+            found, value = self._get_locked(key)
+            if found:
+                return value
+            flight = self._async_flights.get(fkey)
+            if flight is None:
+                # The upstream call is its own task, so the caller that started
+                # it can be cancelled without cancelling it for everyone else
+                flight = self._async_flights[fkey] = _AsyncFlight(loop.create_task(self._afill(fkey, key, compute)))
+                self.counters["misses"] += 1
+            else:
+                self.counters["coalesced"] += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+                with self._lock:
+                    if self._async_flights.get(fkey) is flight:
+                        del self._async_flights[fkey]
+
+    async def _afill(self, fkey: Tuple[int, str], key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+            if _cacheable(value):
+                with self._lock:
+                    self._put_locked(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._async_flights.pop(fkey, None)
+
+    def clear_memory(self) -> int:
+        """Empty the in-memory tier (the persistent one is kept); returns entries dropped."""
+        with self._lock:
+            n = len(self._mem)
+            self._mem.clear()
+            return n
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["hits"] + self.counters["persistent_hits"]
+        lookups = hits + self.counters["misses"] + self.counters["coalesced"]
+        out: Dict[str, Any] = dict(self.counters)
+        out["entries"] = len(self._mem)
+        out["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        return out
+
+
+_SHARED: Optional[SearchCache] = None
+_SHARED_LOCK = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Process-wide cache configured from SEARCH_CACHE_TTL_S / _SIZE / _PATH / _MAX_ROWS."""
+    global _SHARED
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            _SHARED = SearchCache(
+                ttl_s=float(os.getenv("SEARCH_CACHE_TTL_S", "3600")),
+                max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+                path=os.getenv("SEARCH_CACHE_PATH") or None,
+                max_rows=int(os.getenv("SEARCH_CACHE_MAX_ROWS", "20000")),
+            )
+        return _SHARED
+
+
+class CachedSearchTool(BaseTool):
+    """Wraps a search tool; same name, schema and response format as the inner tool."""
+
+    inner: BaseTool
+    cache: Any = None
+
+    def __init__(self, inner: BaseTool, cache: Optional[SearchCache] = None, **kwargs: Any):
+        super().__init__(
+            inner=inner,
+            cache=cache or get_search_cache(),
+            name=inner.name,
+            description=inner.description,
+            args_schema=inner.args_schema,
+            response_format=inner.response_format,
+            **kwargs,
+        )
+
+    def _key(self, query: str) -> str:
+        # Look through wrappers (e.g. call_policy.GuardedTool) for the search tool's settings
+        tool = self.inner
+        while not hasattr(tool, "max_results") and hasattr(tool, "inner"):
+            tool = tool.inner
+        return f"{self.inner.name}:{getattr(tool, 'max_results', '')}:{normalize_query(query)}"
+
+    def _run(self, query: str, run_manager: Any = None) -> Any:
+        return self.cache.get_or_compute(self._key(query), lambda: self.inner._run(query=query))
+
+    async def _arun(self, query: str, run_manager: Any = None) -> Any:
+        return await self.cache.aget_or_compute(self._key(query), lambda: self.inner._arun(query=query))
+
+
+def cached_search_tool(tool: Optional[BaseTool]) -> Optional[BaseTool]:
+    return CachedSearchTool(tool) if tool is not None else None
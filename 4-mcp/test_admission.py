@@ -0,0 +1,58 @@
+from admission import AdmissionController, TokenBucket
+
+
+def make_controller(**kwargs):
+    params = dict(channel_rate=1.0, channel_burst=2, author_rate=0, author_burst=1,
+                  max_concurrency=1, max_backlog=10)
+    params.update(kwargs)
+    return AdmissionController(**params)
+
+
+def test_token_bucket_refills_at_rate_up_to_burst():
+    bucket = TokenBucket(rate=2.0, burst=3)
+    now = bucket.updated
+    assert [bucket.try_take(now) for _ in range(4)] == [True, True, True, False]
+    assert not bucket.try_take(now + 0.25)  # half a token
+    assert bucket.try_take(now + 0.5)
+    assert not bucket.is_full(now + 1.0)
+    assert bucket.is_full(now + 100)
+    assert bucket.tokens == 3
+
+
+def test_clock_read_before_bucket_creation_does_not_drain_it():
+    bucket = TokenBucket(rate=1.0, burst=1)
+    assert bucket.try_take(bucket.updated - 0.001)
+
+
+def test_channel_bucket_sheds_and_is_per_channel():
+    ctl = make_controller()
+    assert [ctl.offer("c1", "a", i) for i in range(3)] == [None, None, "channel_rate"]
+    assert ctl.offer("c2", "a", 3) is None
+    assert ctl.admitted == 3 and ctl.shed["channel_rate"] == 1
+
+
+def test_author_bucket_spans_channels():
+    ctl = make_controller(channel_rate=0, author_rate=1.0, author_burst=1)
+    assert ctl.offer("c1", "a", 0) is None
+    assert ctl.offer("c2", "a", 1) == "author_rate"
+    assert ctl.offer("c2", "b", 2) is None
+
+
+def test_full_backlog_sheds():
+    ctl = make_controller(channel_rate=0, max_backlog=2)
+    assert [ctl.offer("c", "a", i) for i in range(3)] == [None, None, "backlog_full"]
+    ctl.queue.get_nowait()
+    assert ctl.offer("c", "a", 3) is None
+    stats = ctl.stats()
+    assert stats["queue_depth"] == 2 and stats["shed"] == {"backlog_full": 1} and stats["admitted"] == 3
+
+
+def test_idle_buckets_are_pruned(monkeypatch):
+    monkeypatch.setattr(AdmissionController, "MAX_BUCKETS", 3)
+    ctl = make_controller(channel_rate=1000.0, channel_burst=1)
+    for c in ("c1", "c2", "c3"):
+        ctl.check(c, "a")
+    for b in ctl._channel_buckets.values():
+        b.updated -= 1  # long enough ago to have refilled
+    ctl.check("c4", "a")
+    assert list(ctl._channel_buckets) == ["c4"]
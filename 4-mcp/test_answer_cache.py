@@ -0,0 +1,35 @@
+import pytest
+
+from answer_cache import AnswerCache, _features, is_standalone, normalize
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(version="v1", threshold=0.85)
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("When does CMSC 691 meet?", "Where does CMSC 691 meet?"),
+    ("Where does CMSC 691 meet?", "When does CMSC 691 meet?"),
+    ("Why is CMSC 603 required?", "When is CMSC 603 required?"),
+    ("Who teaches CMSC 603 in the fall semester?", "What teaches CMSC 603 in the fall semester?"),
+])
+def test_question_word_changes_the_answer(stored, asked):
+    # Loose enough that every pair would match on similarity alone
+    cache = AnswerCache(version="v1", threshold=0.3)
+    assert is_standalone(stored) and is_standalone(asked)
+    cache.store(stored, "cached answer")
+    similarity = cache._cosine(_features(normalize(asked)), _features(normalize(stored)))
+    assert similarity >= cache.threshold
+    assert cache.lookup(asked) is None
+
+
+def test_rephrasing_with_same_question_word_hits(cache):
+    cache.store("When does CMSC 691 meet?", "Tuesdays")
+    assert cache.lookup("when does cmsc-691 meet") == "Tuesdays"
+    assert cache.lookup("What's the meeting time of CMSC 691?") is None
+
+
+def test_course_codes_must_match(cache):
+    cache.store("Who teaches CMSC 691?", "Prof. A")
+    assert cache.lookup("Who teaches CMSC 603?") is None
@@ -0,0 +1,193 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+from langchain_core.tools import BaseTool
+
+from call_policy import (
+    SEARCH_UNAVAILABLE,
+    AttemptTimeout,
+    CallPolicy,
+    CircuitBreaker,
+    DeadlineExceeded,
+    GuardedTool,
+    LLM_GIVE_UP,
+    give_up_on,
+    guarded_model,
+    turn_deadline,
+)
+from llm_factory import make_chat_model
+
+
+@pytest.fixture
+def llm(stand_in):
+    httpx.post(f"{stand_in}/faults", json={})
+    # SDK retries off, as for the graph models, so every retry below is the policy's
+    return make_chat_model(api_key="test", base_url=f"{stand_in}/v1", max_retries=0)
+
+
+def set_faults(base, **faults):
+    httpx.post(f"{base}/faults", json=faults)
+
+
+def test_retries_recover_from_server_errors(stand_in, llm):
+    set_faults(stand_in, fail_next=2, fail_status=503)
+    policy = CallPolicy("t", attempt_timeout_s=5, retries=2, backoff_base_s=0.01)
+    reply = policy.call(lambda: llm.invoke("hi"))
+    assert "Stand-in reply" in reply.content
+    assert policy.counters["retries"] == 2
+    assert policy.counters["errors"] == 2
+
+
+def test_rate_limits_are_retried(stand_in, llm):
+    set_faults(stand_in, fail_next=1, fail_status=429)
+    policy = CallPolicy("t", attempt_timeout_s=5, retries=3, backoff_base_s=0.01, give_up=LLM_GIVE_UP)
+    assert policy.call(lambda: llm.invoke("hi")).content
+    assert policy.counters["retries"] == 1
+
+
+def test_rate_limits_not_retried_where_caller_sheds(stand_in, llm):
+    set_faults(stand_in, fail_next=1, fail_status=429)
+    policy = CallPolicy("t", attempt_timeout_s=5, retries=3, backoff_base_s=0.01, give_up=LLM_GIVE_UP)
+    with pytest.raises(openai.RateLimitError), give_up_on(openai.RateLimitError):
+        policy.call(lambda: llm.invoke("hi"))
+    assert policy.counters["retries"] == 0
+
+
+def test_attempt_timeout_then_retry(stand_in, llm):
+    set_faults(stand_in, slow_next=1, slow_ms=3000)
+    policy = CallPolicy("t", attempt_timeout_s=0.5, retries=1, backoff_base_s=0.01)
+    t0 = time.monotonic()
+    reply = policy.call(lambda: llm.invoke("hi"))
+    assert reply.content
+    assert policy.counters["timeouts"] == 1
+    assert time.monotonic() - t0 < 2.0
+
+
+def test_turn_deadline_bounds_all_attempts(stand_in, llm):
+    set_faults(stand_in, slow_rate=1.0, slow_ms=3000)
+    policy = CallPolicy("t", attempt_timeout_s=0.4, retries=10, backoff_base_s=0.01)
+    t0 = time.monotonic()
+    with pytest.raises((DeadlineExceeded, AttemptTimeout)):
+        with turn_deadline(1.0):
+            policy.call(lambda: llm.invoke("hi"))
+    assert time.monotonic() - t0 < 1.6
+
+
+def test_hedge_wins_over_slow_request(stand_in, llm):
+    policy = CallPolicy("t", attempt_timeout_s=5, retries=0, hedge=True, hedge_min_samples=5)
+    for _ in range(5):
+        policy.call(lambda: llm.invoke("warm up"))
+    assert policy.hedge_delay() is not None
+    set_faults(stand_in, slow_next=1, slow_ms=3000)
+    t0 = time.monotonic()
+    assert policy.call(lambda: llm.invoke("hi")).content
+    assert time.monotonic() - t0 < 1.0
+    assert policy.counters["hedges"] == 1
+    assert policy.counters["hedge_wins"] == 1
+
+
+def test_async_hedge_and_retry(stand_in, llm):
+    async def run():
+        policy = CallPolicy("t", attempt_timeout_s=5, retries=1, hedge=True, hedge_min_samples=5,
+                            backoff_base_s=0.01)
+        for _ in range(5):
+            await policy.acall(lambda: llm.ainvoke("warm up"))
+        set_faults(stand_in, slow_next=1, slow_ms=3000)
+        t0 = time.monotonic()
+        assert (await policy.acall(lambda: llm.ainvoke("hi"))).content
+        hedged_s = time.monotonic() - t0
+        set_faults(stand_in, fail_next=1)
+        assert (await policy.acall(lambda: llm.ainvoke("hi"))).content
+        return policy, hedged_s
+
+    policy, hedged_s = asyncio.run(run())
+    assert hedged_s < 1.0
+    assert policy.counters["hedge_wins"] == 1
+    assert policy.counters["retries"] == 1
+
+
+class FlakySearch(BaseTool):
+    """Stand-in for TavilySearchResults that reports errors like Tavily does."""
+
+    name: str = "tavily_search_results_json"
+    description: str = "search"
+    response_format: str = "content_and_artifact"
+    calls: int = 0
+    failing: bool = True
+
+    def _run(self, query: str, run_manager=None):
+        self.calls += 1
+        if self.failing:
+            return repr(ConnectionError("injected")), {}
+        return f"results for {query}", {"results": [query]}
+
+
+def test_breaker_opens_and_degrades_search():
+    inner = FlakySearch()
+    breaker = CircuitBreaker("search", failure_threshold=2, reset_after_s=0.3)
+    tool = GuardedTool(inner, CallPolicy("search", attempt_timeout_s=2, retries=0), breaker)
+
+    for _ in range(2):
+        tool.invoke({"query": "vcu"})
+    assert breaker.state == "open"
+    calls = inner.calls
+    result = tool.invoke({"type": "tool_call", "name": tool.name, "args": {"query": "vcu"}, "id": "1"})
+    assert SEARCH_UNAVAILABLE in result.content
+    assert inner.calls == calls
+
+    # After reset_after_s one trial call goes through and closes the breaker
+    time.sleep(0.35)
+    inner.failing = False
+    assert "results for vcu" in tool.invoke({"query": "vcu"})
+    assert breaker.state == "closed"
+
+
+class SlowSearch(FlakySearch):
+    delay_s: float = 0.2
+
+    def _run(self, query: str, run_manager=None):
+        time.sleep(self.delay_s)
+        return super()._run(query)
+
+
+def test_trial_cut_short_by_deadline_releases_breaker():
+    inner = SlowSearch()
+    breaker = CircuitBreaker("search", failure_threshold=1, reset_after_s=0.05)
+    # The first attempt is clamped to the whole turn budget, so the retry finds none left
+    policy = CallPolicy("search", attempt_timeout_s=2, retries=1)
+    tool = GuardedTool(inner, policy, breaker)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+
+    with pytest.raises(DeadlineExceeded):
+        with turn_deadline(0.1):
+            tool.invoke({"query": "vcu"})
+    assert breaker.stats()["trials_abandoned"] == 1
+
+    # The next call goes through as a new trial instead of being rejected for good
+    inner.failing, inner.delay_s = False, 0.0
+    assert "results for vcu" in tool.invoke({"query": "vcu"})
+    assert breaker.state == "closed"
+
+
+def test_guarded_model_drops_search_while_breaker_open():
+    breaker = CircuitBreaker("search", failure_threshold=1)
+    offered = []
+
+    class Recorder:
+        def __init__(self, label):
+            self.label = label
+
+        def invoke(self, messages, config=None):
+            offered.append(self.label)
+            return self.label
+
+    model = guarded_model(Recorder("with_search"), CallPolicy("t"), degraded=Recorder("offline"), breaker=breaker)
+    model.invoke("hi")
+    breaker.record_failure()
+    model.invoke("hi")
+    assert offered == ["with_search", "offline"]
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import anyio
+import pytest
+
+from mcp_client import MCPClient, adapt_args, validate_args
+
+SCHEMA = {
+    "type": "object",
+    "properties": {"channelId": {"type": "string"}, "limit": {"type": "integer"}},
+    "required": ["channelId"],
+}
+
+
+class FakeSession:
+    async def send_ping(self):
+        return None
+
+
+def make_client(**kwargs):
+    client = MCPClient(["fake-server"], health_interval=0, **kwargs)
+    client.session = FakeSession()
+    return client
+
+
+def test_adapt_args_renames_and_coerces():
+    payload = adapt_args(SCHEMA, {"channel_id": 123, "LIMIT": "5"})
+    assert payload == {"channelId": "123", "limit": 5}
+    assert validate_args(SCHEMA, payload) == []
+
+
+def test_validate_args_reports_problems():
+    errors = validate_args(SCHEMA, {"channel_id": "1", "limit": True})
+    assert errors == ["missing required 'channelId'", "'limit' should be integer"]
+
+
+def test_undeclared_keys_only_rejected_by_closed_schema():
+    args = {"channelId": "1", "after": "42"}
+    assert validate_args(SCHEMA, args) == []
+    assert validate_args({**SCHEMA, "additionalProperties": False}, args) == ["unknown key 'after'"]
+    assert adapt_args({**SCHEMA, "additionalProperties": True}, args) == args
+
+
+def test_read_cursor_dropped_when_schema_leaves_it_out():
+    # The Discord frontend always offers an `after` cursor first
+    client = make_client()
+    client.tool_schemas["read"] = SCHEMA
+    variants = [{"channelId": "1", "limit": 5, "after": "42"}, {"channelId": "1", "limit": 5}]
+    assert client.select_payload("read", variants) == {"channelId": "1", "limit": 5}
+    client.tool_schemas["read"] = {**SCHEMA, "properties": {**SCHEMA["properties"], "after": {"type": "string"}}}
+    client._preferred_variant.clear()
+    assert client.select_payload("read", variants) == variants[0]
+
+
+def test_select_payload_prefers_valid_variant_then_adapts():
+    client = make_client()
+    client.tool_schemas["read"] = SCHEMA
+    variants = [{"channel": "1"}, {"channelId": "1", "limit": 5}]
+    assert client.select_payload("read", variants) == {"channelId": "1", "limit": 5}
+    client._preferred_variant.clear()
+    assert client.select_payload("read", [{"channel_id": 7}]) == {"channelId": "7"}
+    with pytest.raises(ValueError):
+        client.select_payload("read", [{"channel": "1"}])
+
+
+def test_slot_wait_counts_against_the_deadline():
+    client = make_client(max_in_flight=1)
+
+    async def slow(session):
+        await asyncio.sleep(0.5)
+        return "done"
+
+    async def main():
+        holder = asyncio.create_task(client._request("read", slow, idempotent=False, timeout=2))
+        await asyncio.sleep(0.01)
+        t0 = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await client._request("read", slow, idempotent=False, timeout=0.2)
+        elapsed = time.monotonic() - t0
+        assert await holder == "done"
+        return elapsed
+
+    assert asyncio.run(main()) < 0.4
+    assert client.reconnects == 0 and client.in_flight == 0
+
+
+def test_replay_gets_only_the_remaining_budget(monkeypatch):
+    client = make_client()
+    calls = []
+
+    async def reconnect(generation):
+        await asyncio.sleep(0.1)
+
+    monkeypatch.setattr(client, "_reconnect", reconnect)
+
+    async def flaky(session):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            await asyncio.sleep(0.15)
+            raise anyio.ClosedResourceError()
+        await asyncio.sleep(1)
+
+    async def main():
+        t0 = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await client._request("read", flaky, idempotent=True, timeout=0.4)
+        return time.monotonic() - t0
+
+    assert asyncio.run(main()) < 0.6
+    assert len(calls) == 2 and client.replays == 1
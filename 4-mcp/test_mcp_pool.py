@@ -0,0 +1,86 @@
+import asyncio
+
+from call_policy import CallPolicy
+from mcp_pool import MCPPool
+
+
+def make_pool(size, delay=0.05):
+    pool = MCPPool(["fake-server"], size=size, health_interval=0)
+    pool.seen = []  # (session index, channel, n, calls in flight for that channel)
+    active = {}
+
+    for idx, client in enumerate(pool.clients):
+        async def call_tool_text(tool_name, args, timeout=None, idx=idx):
+            key = args.get("channel")
+            active[key] = active.get(key, 0) + 1
+            pool.seen.append((idx, key, args.get("n"), active[key]))
+            await asyncio.sleep(delay)
+            active[key] -= 1
+            return f"{idx}"
+        client.call_tool_text = call_tool_text
+    return pool
+
+
+def test_unkeyed_calls_go_to_least_outstanding_session():
+    pool = make_pool(3)
+
+    async def main():
+        return await asyncio.gather(*(pool.call_tool_text("read", {"n": i}) for i in range(6)))
+
+    assert sorted(asyncio.run(main())) == ["0", "0", "1", "1", "2", "2"]
+    assert pool.stats()["outstanding"] == [0, 0, 0]
+
+
+def test_keyed_calls_stick_to_one_session_and_keep_order():
+    pool = make_pool(2)
+
+    async def main():
+        calls = [pool.call_tool_text("send", {"channel": c, "n": i}, key=c)
+                 for i in range(4) for c in ("a", "b")]
+        await asyncio.gather(*calls)
+
+    asyncio.run(main())
+    sessions = {c: {idx for idx, cc, _, _ in pool.seen if cc == c} for c in ("a", "b")}
+    assert sessions["a"] != sessions["b"] and len(sessions["a"]) == len(sessions["b"]) == 1
+    # Serialized per key: never two calls for one channel at once, in submission order
+    assert all(depth == 1 for *_, depth in pool.seen)
+    assert [n for _, c, n, _ in pool.seen if c == "a"] == [0, 1, 2, 3]
+    assert pool.stats()["keys_per_session"] == [1, 1]
+
+
+def test_new_keys_avoid_busy_sessions():
+    pool = make_pool(2, delay=0.1)
+
+    async def main():
+        busy = asyncio.create_task(pool.call_tool_text("read", {"n": 0}))
+        await asyncio.sleep(0.01)
+        reply = await pool.call_tool_text("send", {"channel": "a", "n": 1}, key="a")
+        await busy
+        return reply
+
+    assert asyncio.run(main()) == "1"
+
+
+def test_policy_applies_to_keyed_idempotent_calls():
+    policy = CallPolicy("t", attempt_timeout_s=0.1, retries=1, backoff_base_s=0.01)
+    pool = MCPPool(["fake-server"], size=2, policy=policy, health_interval=0,
+                   idempotent_tools=["read_messages"])
+    delays = {"read_messages": [1.0, 0.0], "send_message": [0.2]}
+    used = []
+
+    for idx, client in enumerate(pool.clients):
+        async def call_tool_text(tool_name, args, timeout=None, idx=idx):
+            used.append(idx)
+            await asyncio.sleep(delays[tool_name].pop(0))
+            return tool_name
+        client.call_tool_text = call_tool_text
+
+    async def main():
+        read = await pool.call_tool_text("read_messages", {}, key="a")
+        # Not idempotent: one attempt, no policy timeout
+        sent = await pool.call_tool_text("send_message", {}, key="a")
+        return read, sent
+
+    assert asyncio.run(main()) == ("read_messages", "send_message")
+    assert policy.counters["timeouts"] == 1 and policy.counters["retries"] == 1
+    assert len(set(used)) == 1  # every attempt on the key's session
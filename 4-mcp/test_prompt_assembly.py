@@ -0,0 +1,65 @@
+import os
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.pop("TAVILY_API_KEY", None)
+
+from graph import build_graph
+from llm_factory import make_chat_model
+from prompt_assembly import SYSTEM_MESSAGE, assemble_messages
+from prompt_profile import PROFILES
+
+QUESTIONS = [
+    "What are the admission requirements for the MS program?",
+    "Is the GRE required?",
+    "How long does the PhD usually take?",
+]
+
+
+@pytest.fixture
+def graph(stand_in):
+    httpx.post(f"{stand_in}/faults", json={})
+    httpx.post(f"{stand_in}/stats/reset")
+    llm = make_chat_model(api_key="test", base_url=f"{stand_in}/v1")
+    return build_graph(llm=llm, fast_path=False, prefetch=False)
+
+
+def run_turns(graph, session, build_input):
+    history = []
+    for q in QUESTIONS:
+        state = graph.invoke({"messages": build_input(history, q)}, config={"metadata": {"session": session}})
+        history += [HumanMessage(content=q), AIMessage(content=state["messages"][-1].content)]
+
+
+def test_question_already_in_history_is_sent_once():
+    history = [HumanMessage(content="Hi"), AIMessage(content="Hello!"), HumanMessage(content="Is the GRE required? ")]
+    messages = assemble_messages(history, "Is the GRE required?")
+    assert messages[0] is SYSTEM_MESSAGE
+    assert [m.content for m in messages[1:]] == ["Hi", "Hello!", "Is the GRE required?"]
+
+
+def test_prefix_stays_stable_across_turns(stand_in, graph):
+    run_turns(graph, "stable", assemble_messages)
+
+    bodies = httpx.get(f"{stand_in}/requests").json()
+    assert len(bodies) == len(QUESTIONS)
+    for prev, cur in zip(bodies, bodies[1:]):
+        assert cur["tools"] == prev["tools"]
+        assert cur["messages"][:len(prev["messages"])] == prev["messages"]
+
+    profile = PROFILES.session("stable")
+    assert profile["prefix_breaks"] == 0
+    assert profile["provider"]["cached"] > 0
+    assert profile["last"]["provider"]["cached"] > 0
+
+
+def test_duplicated_question_breaks_prefix(graph):
+    # The old 2-tools assembly: history already holds the question, then it is appended again
+    def duplicating(history, q):
+        return [SYSTEM_MESSAGE] + history + [HumanMessage(content=q), HumanMessage(content=q)]
+
+    run_turns(graph, "duplicated", duplicating)
+    assert PROFILES.session("duplicated")["prefix_breaks"] == len(QUESTIONS) - 1
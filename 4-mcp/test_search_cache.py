@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from search_cache import PURGE_EVERY, SearchCache
+
+
+def test_sync_single_flight_and_ttl():
+    cache = SearchCache(ttl_s=0.2)
+    calls = []
+    gate = threading.Event()
+
+    def compute():
+        calls.append(1)
+        gate.wait(2)
+        return ("results", {"results": [1]})
+
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(cache.get_or_compute("k", compute))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and len(out) == 5
+    assert cache.counters["coalesced"] == 4
+
+    assert cache.get_or_compute("k", compute) == out[0]
+    assert len(calls) == 1
+    time.sleep(0.25)
+    cache.get_or_compute("k", compute)
+    assert len(calls) == 2
+
+
+def test_errors_are_not_cached():
+    cache = SearchCache()
+    assert cache.get_or_compute("k", lambda: ("ConnectionError()", {})) == ("ConnectionError()", {})
+    assert cache.get_or_compute("k", lambda: ("ok", {"results": [1]})) == ("ok", {"results": [1]})
+    assert cache.counters["stores"] == 1
+
+
+def test_async_single_flight():
+    cache = SearchCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_compute("k", compute) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    cache = SearchCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "value"
+
+    async def main():
+        leader = asyncio.create_task(cache.aget_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(cache.aget_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "value"
+    assert len(calls) == 1
+
+
+def test_upstream_call_is_cancelled_when_nobody_waits():
+    cache = SearchCache()
+    finished = []
+
+    async def compute():
+        await asyncio.sleep(0.1)
+        finished.append(1)
+        return "value"
+
+    async def main():
+        task = asyncio.create_task(cache.aget_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.sleep(0.15)
+        # A later call starts a fresh flight instead of joining the cancelled one
+        return await cache.aget_or_compute("k", compute)
+
+    assert asyncio.run(main()) == "value"
+    assert finished == [1]
+
+
+def test_sqlite_tier_purges_expired_and_caps_rows(tmp_path):
+    path = str(tmp_path / "search.db")
+    cache = SearchCache(ttl_s=0.05, path=path, max_rows=30)
+    for i in range(PURGE_EVERY // 2):
+        cache.get_or_compute(f"old{i}", lambda: "v")
+    time.sleep(0.06)
+    cache.ttl_s = 60.0
+    for i in range(PURGE_EVERY // 2):
+        cache.get_or_compute(f"new{i}", lambda: "v")
+    rows = cache._db.execute("SELECT COUNT(*), SUM(key LIKE 'old%') FROM search_cache").fetchone()
+    assert rows == (30, 0)
+
+    # Another process sees the persisted rows
+    other = SearchCache(path=path, max_rows=30)
+    assert other.get_or_compute(f"new{PURGE_EVERY // 2 - 1}", lambda: "recomputed") == "v"
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from tool_budget import apply_budget, count_tokens, trim_content
+
+ROWS = [{"COURSE": f"CMSC {600 + i}", "TITLE": f"Graduate topic number {i}", "CRN": 40000 + i,
+         "PRIMARY  INSTRUCTOR LAST NAME": "Smith", "INTERNAL NOTES": "x" * 200, "SEATS": None}
+        for i in range(60)]
+
+
+@pytest.mark.parametrize("budget", [200, 500, 1500])
+def test_record_lists_stay_under_budget_with_marker(budget):
+    content, info = trim_content(json.dumps(ROWS), budget, "query_course_schedule")
+    assert count_tokens(content) <= budget and info["tokens"] <= budget
+    rows = json.loads(content)
+    marker = rows[-1]
+    total, kept = info["rows"]
+    assert total == 60 and 0 < kept < 60
+    assert marker["_more_available"] == total - kept and len(rows) == kept + 1
+    # Projected onto the tool's fields; whitespace in column names is ignored
+    assert set(rows[0]) == {"COURSE", "TITLE", "CRN", "PRIMARY  INSTRUCTOR LAST NAME"}
+    assert info["actions"][0] == "project" and "truncate_rows" in info["actions"]
+
+
+def test_small_results_are_untouched():
+    content = json.dumps(ROWS[:1])
+    assert trim_content(content, 1500, "query_course_schedule") == (
+        content, {"original_tokens": count_tokens(content), "tokens": count_tokens(content),
+                  "budget": 1500, "actions": []})
+
+
+def test_plain_text_is_clipped():
+    content, info = trim_content("word " * 2000, 100, "other")
+    assert count_tokens(content) <= 100 and content.endswith("...[clipped]")
+    assert info["actions"] == ["clip_text"]
+
+
+def test_turn_budget_is_shared_across_results(monkeypatch):
+    monkeypatch.setenv("TOOL_TURN_BUDGET_TOKENS", "1000")
+    history = [HumanMessage(content="q"),
+               ToolMessage(content="y " * 400, tool_call_id="0", name="other")]
+    new = [ToolMessage(content=json.dumps(ROWS), tool_call_id=str(i), name="query_course_schedule")
+           for i in (1, 2)]
+    out = apply_budget(history, new)
+    used = sum(m.response_metadata["tool_budget"]["tokens"] for m in out)
+    assert used <= 1000 - count_tokens("y " * 400)
+    assert all(m.response_metadata["tool_budget"]["rows"][1] < 60 for m in out)